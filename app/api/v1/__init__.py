@@ -2,8 +2,10 @@
 
 from fastapi import APIRouter
 
+from .cache_api import router as cache_router
 from .crawl_api import router as crawl_router
 
 router = APIRouter(prefix="/v1", tags=["v1"])
 
 router.include_router(crawl_router)
+router.include_router(cache_router)
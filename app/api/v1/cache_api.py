@@ -0,0 +1,57 @@
+"""Holds Cache api class"""
+
+from typing import Literal
+
+from fastapi import APIRouter, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi_restful.cbv import cbv
+
+from helper.redis_helper import RedisHelper
+
+from .crawl_api import STREAM_MEDIA_TYPES, format_records
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+
+@cbv(router)
+class CacheAPI:
+    """
+    Holds the cache api routes
+    """
+
+    def __init__(self):
+        self.redis_helper = RedisHelper()
+
+    @router.get("/stats")
+    async def stats(self):
+        """
+        Hit rates of the cached links of pages served by this pod
+        :return:
+        """
+        return self.redis_helper.cache_stats()
+
+    @router.get("/export")
+    async def export(
+        self,
+        url: str = Query("", description="only pages whose url starts with it"),
+        fmt: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+    ):
+        """
+        Stream the links of every page kept in the page store of this pod, one record
+        per page as of its latest fetch
+        :param url:
+        :param fmt:
+        :return:
+        """
+        if not self.redis_helper.page_store.is_open:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={
+                    "status": "failure",
+                    "errors": {"page_store": "Page store is not enabled"},
+                },
+            )
+        return StreamingResponse(
+            format_records(self.redis_helper.export_links(url), fmt),
+            media_type=STREAM_MEDIA_TYPES[fmt],
+        )
@@ -1,14 +1,27 @@
 """Holds Crawler api class"""
 
-from fastapi import APIRouter, status
-from fastapi.responses import JSONResponse
+import json
+import logging
+from typing import AsyncIterator, Literal, Tuple
+
+from fastapi import APIRouter, Query, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi_restful.cbv import cbv
+from pydantic import ValidationError
 
+from controllers.batch_controller import BatchController
 from controllers.crawl_controller import CrawlController
-from schemas.crawl_request import CrawlRequest
+from controllers.distributed_crawl_controller import DistributedCrawlController
+from controllers.job_controller import JobController
+from helper.response_encoder import FastJSONResponse, compact_sitemap, dumps
+from schemas.crawl_request import BatchCrawlRequest, CrawlRequest, LocalCrawlRequest
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/crawl", tags=["crawl"])
 
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
 
 @cbv(router)
 class CrawlAPI:
@@ -18,27 +31,278 @@ class CrawlAPI:
 
     def __init__(self):
         self.crawl_controller = CrawlController()
+        self.job_controller = JobController(self.crawl_controller)
+        self.distributed_crawl_controller = DistributedCrawlController(
+            self.crawl_controller
+        )
+        self.batch_controller = BatchController(self.crawl_controller)
 
     @router.post("/")
-    async def crawl(self, request: CrawlRequest):
+    async def crawl(
+        self,
+        request: CrawlRequest,
+        fmt: Literal["json", "compact"] = Query("json", alias="format"),
+    ):
         """
-        Generate a compressed site_map
+        Generate a compressed site_map, "compact" sends it as a table of urls with the
+        links of every page as indexes into it
         :param request:
+        :param fmt:
         :return:
         """
-        sitemap, errors = await self.crawl_controller.crawl(request.url)
-        if errors:
-            if sitemap:
-                return JSONResponse(
+        crawl_controller = (
+            self.distributed_crawl_controller
+            if request.distributed
+            else self.crawl_controller
+        )
+        sitemap, errors, truncated = await crawl_controller.crawl(
+            request.url,
+            refresh=request.refresh,
+            seed_sitemaps=request.seed_sitemaps,
+            respect_robots=request.respect_robots,
+            budget=request.budget(),
+        )
+        # the status is decided on the pages, a compact sitemap is never empty
+        partial = bool(sitemap)
+        if fmt == "compact":
+            sitemap = compact_sitemap(sitemap)
+        # the sitemap only holds strings, it is not walked by jsonable_encoder
+        if errors or truncated:
+            if partial:
+                return FastJSONResponse(
                     status_code=status.HTTP_207_MULTI_STATUS,
                     content={
                         "status": "partial_success",
                         "sitemap": sitemap,
                         "errors": errors,
+                        "truncated": truncated,
                     },
                 )
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                content={"status": "failure", "errors": errors},
+                content={"status": "failure", "errors": errors, "truncated": truncated},
             )
-        return sitemap
+        return FastJSONResponse(content=sitemap)
+
+    @router.post("/stream")
+    async def stream(
+        self,
+        request: LocalCrawlRequest,
+        fmt: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+    ):
+        """
+        Stream the sitemap as NDJSON or server-sent events, one record per crawled page
+        :param request:
+        :param fmt:
+        :return:
+        """
+        records = self.stream_records(request)
+        return StreamingResponse(
+            format_records(records, fmt), media_type=STREAM_MEDIA_TYPES[fmt]
+        )
+
+    async def stream_records(self, request: LocalCrawlRequest) -> AsyncIterator[dict]:
+        """
+        Records of the crawl followed by a summary record
+        :param request:
+        :return:
+        """
+        pages = errors = 0
+        truncated = None
+        try:
+            async for record in self.crawl_controller.stream(
+                request.url,
+                refresh=request.refresh,
+                seed_sitemaps=request.seed_sitemaps,
+                respect_robots=request.respect_robots,
+                budget=request.budget(),
+            ):
+                if "truncated" in record:
+                    truncated = record["truncated"]
+                    continue
+                if "error" in record:
+                    errors += 1
+                else:
+                    pages += 1
+                yield record
+        except Exception as e:
+            # headers are already sent, the failure is reported as the last record
+            logger.error(f"Streaming crawl of {request.url} failed: {e}")
+            yield {"status": "failed", "error": str(e)}
+            return
+        yield {
+            "status": "completed",
+            "pages": pages,
+            "errors": errors,
+            "truncated": truncated,
+        }
+
+    @router.post(
+        "/batch",
+        openapi_extra={
+            "requestBody": {
+                "content": {
+                    "application/x-ndjson": {
+                        "schema": BatchCrawlRequest.model_json_schema()
+                    }
+                },
+                "description": "one crawl request per line",
+            }
+        },
+    )
+    async def batch(
+        self,
+        http_request: Request,
+        fmt: Literal["ndjson", "sse"] = Query("ndjson", alias="format"),
+    ):
+        """
+        Crawl every root of a JSONL body of crawl requests on a shared pool of workers,
+        streaming records tagged with the request_id of their root (or its line number)
+        and a summary record per root, then one for the batch
+        :param http_request:
+        :param fmt:
+        :return:
+        """
+        # read up front, a streaming response receives the messages of the request
+        # itself to notice the client disconnecting
+        body = await http_request.body()
+        records = self.batch_controller.stream(read_batch_requests(body))
+        return StreamingResponse(
+            format_records(records, fmt), media_type=STREAM_MEDIA_TYPES[fmt]
+        )
+
+    @router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+    async def create_job(self, request: LocalCrawlRequest):
+        """
+        Start crawling in the background, the sitemap is collected with the job id
+        :param request:
+        :return:
+        """
+        job_id = await self.job_controller.create_job(request)
+        return {"job_id": job_id, "status": "queued"}
+
+    @router.get("/jobs/{job_id}")
+    async def get_job(self, job_id: str):
+        """
+        Status of a crawl job
+        :param job_id:
+        :return:
+        """
+        job = await self.job_controller.get_job(job_id)
+        if job is None:
+            return job_not_found(job_id)
+        return job
+
+    @router.post("/jobs/{job_id}/resume", status_code=status.HTTP_202_ACCEPTED)
+    async def resume_job(self, job_id: str):
+        """
+        Resume a job interrupted by a restart of its pod or which failed, from its last
+        checkpoint
+        :param job_id:
+        :return:
+        """
+        job_status = await self.job_controller.resume_job(job_id)
+        if job_status is None:
+            return job_not_found(job_id)
+        if job_status != "queued":
+            return JSONResponse(
+                status_code=status.HTTP_409_CONFLICT,
+                content={
+                    "status": "failure",
+                    "errors": {job_id: f"Job is {job_status}, it can not be resumed"},
+                },
+            )
+        return {"job_id": job_id, "status": job_status}
+
+    @router.get("/jobs/{job_id}/results")
+    async def get_job_results(
+        self,
+        job_id: str,
+        kind: Literal["pages", "errors"] = "pages",
+        offset: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=1000),
+    ):
+        """
+        Crawled pages or errors of a job, available while the job is still running
+        :param job_id:
+        :param kind:
+        :param offset:
+        :param limit:
+        :return:
+        """
+        results = await self.job_controller.get_results(job_id, kind, offset, limit)
+        if results is None:
+            return job_not_found(job_id)
+        return results
+
+
+async def read_batch_requests(
+    body: bytes,
+) -> AsyncIterator[Tuple[str, BatchCrawlRequest | str]]:
+    """
+    Crawl requests of a JSONL body
+    :param body:
+    :return: ids of the roots with their request, or the reason it is invalid
+    """
+    for line_number, line in enumerate(body.splitlines(), 1):
+        if line.strip():
+            yield parse_batch_request(line, line_number)
+
+
+def parse_batch_request(
+    line: bytes, line_number: int
+) -> Tuple[str, BatchCrawlRequest | str]:
+    """
+    :param line: a line of a batch
+    :param line_number: counted from 1
+    :return: the id of the root with its request, or the reason it is invalid
+    """
+    root_id = str(line_number)
+    try:
+        fields = json.loads(line)
+        if isinstance(fields, dict):
+            if fields.get("request_id") is not None:
+                root_id = str(fields["request_id"])
+            fields = {**fields, "request_id": root_id}
+        request = BatchCrawlRequest.model_validate(fields)
+    except json.JSONDecodeError as e:
+        return root_id, f"Invalid JSON: {e}"
+    except ValidationError as e:
+        return root_id, "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+            for error in e.errors()
+        )
+    return root_id, request
+
+
+async def format_records(
+    records: AsyncIterator[dict], fmt: str
+) -> AsyncIterator[bytes]:
+    """
+    Serialize records as NDJSON lines or server-sent events
+    :param records:
+    :param fmt: "ndjson" or "sse"
+    :return:
+    """
+    async for record in records:
+        data = dumps(record)
+        if fmt == "sse":
+            event = "page_error" if "error" in record else "page"
+            if "status" in record:
+                # roots of a batch end with a summary of their own
+                event = "root_done" if "root" in record else "done"
+            yield b"event: %s\ndata: %s\n\n" % (event.encode(), data)
+        else:
+            yield data + b"\n"
+
+
+def job_not_found(job_id: str) -> JSONResponse:
+    """
+    Response for an unknown or expired job
+    :param job_id:
+    :return:
+    """
+    return JSONResponse(
+        status_code=status.HTTP_404_NOT_FOUND,
+        content={"status": "failure", "errors": {job_id: "Job not found"}},
+    )
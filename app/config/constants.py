@@ -3,7 +3,168 @@
 OP_ID = "op_id"
 OP_PATH = "op_path"
 
-EXTENSIONS_TO_FILTER = (".png", ".css", ".xml", ".ico", ".woff2", ".asp")
+# links with these extensions are never crawled
+EXTENSIONS_TO_FILTER = (
+    ".png",
+    ".css",
+    ".xml",
+    ".ico",
+    ".woff2",
+    ".asp",
+    # scripts, documents and archives
+    ".js",
+    ".json",
+    ".pdf",
+    ".doc",
+    ".docx",
+    ".xls",
+    ".xlsx",
+    ".ppt",
+    ".pptx",
+    ".zip",
+    ".gz",
+    ".tar",
+    ".rar",
+    ".7z",
+    ".exe",
+    ".dmg",
+    ".apk",
+    # images, fonts and media
+    ".jpg",
+    ".jpeg",
+    ".gif",
+    ".webp",
+    ".svg",
+    ".bmp",
+    ".tif",
+    ".tiff",
+    ".woff",
+    ".ttf",
+    ".otf",
+    ".eot",
+    ".mp3",
+    ".wav",
+    ".ogg",
+    ".mp4",
+    ".webm",
+    ".avi",
+    ".mov",
+    ".mkv",
+)
+# when not empty links with an extension are only crawled if it is listed here
+ALLOWED_EXTENSIONS = ()
+# extensions served as HTML, other urls are checked with a HEAD request first when
+# CONTENT_TYPE_PREFLIGHT is on
+HTML_EXTENSIONS = ("", ".html", ".htm", ".xhtml", ".php", ".asp", ".aspx", ".jsp")
+CONTENT_TYPE_PREFLIGHT = False
+# responses are only parsed for these mime types, any type is parsed when empty
+ALLOWED_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# responses of mime types starting with these are never parsed
+DENIED_CONTENT_TYPES = ("image/", "video/", "audio/", "font/")
+
+# Url canonicalization config
+# "exact" crawls the host of the root only, "subdomain" also its subdomains and
+# "suffix" any host ending with it
+DOMAIN_MATCH_MODE = "subdomain"
+# links to the other of http/https are crawled on the scheme of the root
+UNIFY_SCHEME = True
+# "/docs/" and "/docs" are the same page, so are "/docs/index.html" and "/docs/"
+STRIP_TRAILING_SLASH = True
+INDEX_FILES = ("index.html", "index.htm", "index.php")
+# canonical forms of this many urls are kept in memory
+URL_CACHE_SIZE = 100_000
+
+# Crawl config
+# number of pages fetched in parallel for a single crawl
+CRAWL_CONCURRENCY = 10
+# visited pages of crawls not keeping their results (streams and jobs) are tracked with
+# an "exact" set or a "bloom" filter, which may wrongly skip BLOOM_ERROR_RATE of the pages
+VISITED_FILTER = "exact"
+BLOOM_CAPACITY = 1_000_000
+BLOOM_ERROR_RATE = 0.001
+# records a streaming client may lag behind before crawling pauses
+STREAM_BUFFER_SIZE = 100
+# batch crawls share a pool of workers over every root, pages of a domain beyond its
+# concurrency wait in the frontier rather than hold a worker
+BATCH_CONCURRENCY = 100
+BATCH_DOMAIN_CONCURRENCY = 10
+# roots of a batch crawled at once, the next ones start as these finish
+BATCH_MAX_ROOTS = 50
+# pages are parsed while downloading in chunks of this size
+PAGE_CHUNK_SIZE = 64 * 1024
+# rest of the page is not downloaded past this size
+MAX_PAGE_SIZE = 5 * 1024 * 1024
+
+# Parsing config
+# one of "inline", "thread" or "process". "process" sends whole pages to the workers, so
+# every page in flight is buffered up to MAX_PAGE_SIZE and parsing cannot stop early
+PARSE_EXECUTOR = "thread"
+# None sizes the pool to the number of cores
+PARSE_WORKERS = None
+# pages announcing a smaller content-length are parsed on the event loop
+INLINE_PARSE_MAX_SIZE = 64 * 1024
+
+# Response config
+# responses are compressed with the first of these the client accepts
+RESPONSE_ENCODINGS = ("zstd", "br", "gzip")
+# fast levels, the default ones of zstd and brotli cost more CPU than they save transfer
+COMPRESSION_LEVELS = {"zstd": 3, "br": 4, "gzip": 6}
+# smaller responses are sent as they are
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSIBLE_CONTENT_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+# HTTP client config
+# product token sent with every request and matched against robots.txt groups
+USER_AGENT = "webCrawler"
+HTTP_POOL_SIZE = 100
+HTTP_POOL_SIZE_PER_HOST = 10
+HTTP_KEEPALIVE_TIMEOUT = 30
+HTTP_TOTAL_TIMEOUT = 30
+HTTP_CONNECT_TIMEOUT = 10
+DNS_CACHE_TTL = 300
+
+# Politeness config, applied to every host separately
+# requests per second once the burst is spent
+HOST_RATE_LIMIT = 10
+HOST_BURST = 10
+# concurrent requests, grown while responses arrive within the latency target
+HOST_INITIAL_CONCURRENCY = 2
+HOST_MAX_CONCURRENCY = HTTP_POOL_SIZE_PER_HOST
+HOST_LATENCY_TARGET = 2
+# pacing and circuit breakers of this many hosts are kept, the least recently used idle
+# ones are forgotten
+HOST_CACHE_SIZE = 10_000
+# responses pausing the host, for their Retry-After or an exponential backoff
+THROTTLE_STATUSES = (429, 503)
+HOST_THROTTLE_BACKOFF = 1
+HOST_MAX_RETRY_AFTER = 60
+# times a throttled page is fetched again before it is recorded as an error
+THROTTLE_RETRIES = 3
+
+# Retry config, applied to every host separately
+# times a page failing transiently (timeout, connection error, server error) is fetched
+# again, after an exponential backoff with full jitter
+FETCH_RETRIES = 2
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 5
+RETRYABLE_STATUSES = (500, 502, 504)
+# every request earns this share of a retry, retries are saved up to the burst
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_BURST = 10
+# requests to a host fail fast after these many consecutive transient failures, until
+# a trial request succeeds once the reset timeout passed
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30
+
+# robots.txt and sitemap.xml config
+ROBOTS_MAX_SIZE = 512 * 1024
+# seeding stops past these many sitemap files or page urls
+SITEMAP_MAX_FILES = 100
+SITEMAP_MAX_URLS = 50_000
+# decompressed size of a single sitemap, the limit of the sitemap protocol
+SITEMAP_MAX_SIZE = 50 * 1024 * 1024
+# sitemap urls are added to the frontier in batches of this size
+SITEMAP_SEED_BATCH = 500
 
 # Redis config
 CACHE_EXPIRY = 3500
@@ -11,4 +172,62 @@ REDIS_HOST = "localhost"
 REDIS_PORT = 6379
 REDIS_PASSWORD = ""
 
+# links of a page are cached as a single compressed value, one of "zlib",
+# "msgpack-zstd" or "auto" for msgpack-zstd
+CACHE_CODEC = "auto"
+# also read links cached as lists by older versions, costs a round-trip for every batch
+# of uncached pages and can be turned off once CACHE_EXPIRY has passed since upgrading
+READ_LEGACY_LINKS = True
+# links of this many pages are also kept in memory, for at most LOCAL_CACHE_TTL seconds
+LOCAL_CACHE_SIZE = 50_000
+LOCAL_CACHE_TTL = 300
+# pods publish the pages they cache again on this channel so that the others drop their
+# copy, without it a copy is stale for up to LOCAL_CACHE_TTL
+LOCAL_CACHE_INVALIDATION = True
+LOCAL_CACHE_CHANNEL = "cache:invalidate"
+
+# whole crawl results of a root url, crawls with errors are not cached
+CRAWL_RESULT_EXPIRY = CACHE_EXPIRY
+# etag/last-modified of pages, kept longer than the cache to revalidate pages cheaply
+PAGE_VALIDATOR_EXPIRY = 7 * 24 * 3600
+# directory of a store on local disk also keeping links and validators of pages, past
+# their expiry in redis, None to disable it. Links found there are served for
+# CACHE_EXPIRY like cached ones while validators are used however old
+PAGE_STORE_PATH = None
+# slots of the index of the store, a power of two doubled past PAGE_STORE_MAX_LOAD
+PAGE_STORE_INDEX_CAPACITY = 1 << 16
+PAGE_STORE_MAX_LOAD = 0.7
+# every write appends a record, the segment is rewritten with the latest record of every
+# page once this share of its records is superseded
+PAGE_STORE_COMPACT_RATIO = 0.5
+PAGE_STORE_COMPACT_MIN_RECORDS = 10_000
+
+# crawl jobs with their results
+JOB_EXPIRY = 24 * 3600
+# results of a job are written to redis in batches of this size
+JOB_FLUSH_SIZE = 50
+# running jobs save their progress and renew their lease this often, a job whose lease
+# expired was interrupted (pod killed) and can be resumed by any pod
+JOB_HEARTBEAT_INTERVAL = 10
+JOB_LEASE_TIMEOUT = 60
+
+# distributed crawls, urls leased to a worker are handed to another one after the timeout
+FRONTIER_EXPIRY = 24 * 3600
+FRONTIER_LEASE_TIMEOUT = 120
+# coordinators of distributed crawls heartbeat every poll, a crawl whose coordinator did
+# not for this long is dropped and the workers of every pod stop
+FRONTIER_HEARTBEAT_TIMEOUT = 30
+# workers every pod runs for each distributed crawl
+DISTRIBUTED_WORKERS = 5
+# how often pods look for distributed crawls and check whether they finished
+DISTRIBUTED_POLL_INTERVAL = 1
+
+# parsed robots.txt rules, rules of an unreachable robots.txt are retried sooner
+ROBOTS_EXPIRY = 24 * 3600
+ROBOTS_ERROR_EXPIRY = 300
+
+# concurrent fetches of a page across pods wait for the pod holding the lock
+INFLIGHT_LOCK_TIMEOUT = 60
+INFLIGHT_POLL_INTERVAL = 0.2
+
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}"
@@ -0,0 +1,117 @@
+"""Holds the batch crawl controller class"""
+
+import asyncio
+import logging
+import traceback
+from typing import AsyncIterator, Tuple
+
+from config.constants import BATCH_CONCURRENCY, BATCH_MAX_ROOTS, STREAM_BUFFER_SIZE
+from controllers.crawl_controller import CrawlController
+from helper.shared_frontier import SharedFrontier
+from schemas.crawl_request import BatchCrawlRequest
+
+logger = logging.getLogger(__name__)
+
+
+class BatchController:
+    """
+    Holds the business logic for crawling many roots at once. Roots share a frontier
+    drained by a single pool of BATCH_CONCURRENCY workers, along with the connection
+    pool and the pacing of hosts, so that a slow root does not hold up the others.
+    """
+
+    def __init__(self, crawl_controller: CrawlController | None = None):
+        self.crawl_controller = crawl_controller or CrawlController()
+
+    async def stream(
+        self, requests: AsyncIterator[Tuple[str, BatchCrawlRequest | str]]
+    ) -> AsyncIterator[dict]:
+        """
+        Crawls the roots as they are read, BATCH_MAX_ROOTS at a time, yielding records
+        tagged with the id of their root as soon as they are known. Every root ends with
+        a summary record, crawling pauses while the consumer lags STREAM_BUFFER_SIZE
+        records behind.
+        :param requests: ids of the roots with their request, or the reason it is invalid
+        :return: an async iterator of records, ending with a summary of the batch
+        """
+        records = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+        done = object()
+        frontier = SharedFrontier()
+        workers = [
+            asyncio.create_task(self.crawl_controller.frontier_worker(frontier))
+            for _ in range(BATCH_CONCURRENCY)
+        ]
+        roots = asyncio.Semaphore(BATCH_MAX_ROOTS)
+        crawls = set()
+
+        async def produce():
+            try:
+                async for root_id, request in requests:
+                    if isinstance(request, str):
+                        await records.put(
+                            {"root": root_id, "status": "failed", "error": request}
+                        )
+                        continue
+                    await roots.acquire()
+                    crawl = asyncio.create_task(
+                        self.crawl_root(root_id, request, frontier, records.put)
+                    )
+                    crawls.add(crawl)
+                    crawl.add_done_callback(crawls.discard)
+                    crawl.add_done_callback(lambda _: roots.release())
+                await asyncio.gather(*crawls)
+            finally:
+                await records.put(done)
+
+        producer = asyncio.create_task(produce())
+        summary = {"status": "completed", "roots": 0, "pages": 0, "errors": 0}
+        try:
+            while (record := await records.get()) is not done:
+                if "status" in record:
+                    summary["roots"] += 1
+                    summary["pages"] += record.get("pages", 0)
+                    summary["errors"] += record.get("errors", 0)
+                yield record
+            # surface failures reading the requests
+            await producer
+        finally:
+            producer.cancel()
+            for task in [*crawls, *workers]:
+                task.cancel()
+            await asyncio.gather(producer, *crawls, *workers, return_exceptions=True)
+        yield summary
+
+    async def crawl_root(
+        self, root_id: str, request: BatchCrawlRequest, frontier: SharedFrontier, emit
+    ):
+        """
+        Crawls a root of the batch on the shared frontier
+        :param root_id:
+        :param request:
+        :param frontier: frontier of the batch
+        :param emit: awaited with every record of the root
+        :return:
+        """
+        counts = {"pages": 0, "errors": 0}
+
+        async def on_result(record: dict):
+            counts["errors" if "error" in record else "pages"] += 1
+            await emit({"root": root_id, **record})
+
+        try:
+            _, _, truncated = await self.crawl_controller.crawl(
+                request.url,
+                refresh=request.refresh,
+                on_result=on_result,
+                keep_results=False,
+                seed_sitemaps=request.seed_sitemaps,
+                respect_robots=request.respect_robots,
+                budget=request.budget(),
+                frontier=frontier,
+            )
+            summary = {"status": "completed", **counts, "truncated": truncated}
+        except Exception as e:
+            logger.error(f"Batch crawl of {request.url} failed: {e}")
+            logger.error(traceback.format_exc())
+            summary = {"status": "failed", **counts, "error": str(e)}
+        await emit({"root": root_id, "url": request.url, **summary})
@@ -1,14 +1,37 @@
 """Holds the crawl controller class"""
 
+import asyncio
+import json
 import logging
-import re
+import time
 import traceback
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
 from urllib.parse import urljoin, urlparse
 
-import aiohttp
-
-from config.constants import EXTENSIONS_TO_FILTER
+from config.constants import (
+    CONTENT_TYPE_PREFLIGHT,
+    CRAWL_CONCURRENCY,
+    CRAWL_RESULT_EXPIRY,
+    MAX_PAGE_SIZE,
+    PAGE_VALIDATOR_EXPIRY,
+    SITEMAP_SEED_BATCH,
+    STREAM_BUFFER_SIZE,
+    THROTTLE_RETRIES,
+    THROTTLE_STATUSES,
+)
+from helper.content_filter import is_allowed_content_type, mime_type, needs_preflight
+from helper.crawl_state import CrawlBudget, CrawlCheckpoint, CrawlState
+from helper.host_scheduler import HostScheduler
+from helper.http_helper import FetchError, HttpHelper, HttpStatusError
+from helper.link_extractor import extract_links, extract_links_from_response
+from helper.metrics import BYTES_DOWNLOADED, PAGES
 from helper.redis_helper import RedisHelper
+from helper.retry_policy import RetryPolicy
+from helper.robots_helper import RobotsHelper, RobotsRules
+from helper.shared_frontier import SharedFrontier
+from helper.single_flight import SingleFlight
+from helper.sitemap_reader import read_sitemap_urls
+from helper.url_normalizer import DomainMatcher, canonicalize
 
 logger = logging.getLogger(__name__)
 
@@ -16,91 +39,564 @@ logger = logging.getLogger(__name__)
 class CrawlController:
     """Holds the business logic for crawling websites"""
 
-    def __init__(self):
-        self.redis_helper = RedisHelper()
+    def __init__(
+        self,
+        redis_helper: RedisHelper | None = None,
+        http_helper: HttpHelper | None = None,
+    ):
+        self.redis_helper = redis_helper or RedisHelper()
+        self.http_helper = http_helper or HttpHelper()
+        self.single_flight = SingleFlight(self.redis_helper)
+        self.host_scheduler = HostScheduler()
+        self.retry_policy = RetryPolicy()
+        self.robots_helper = RobotsHelper(self.redis_helper, self.http_helper)
         logger.info(id(self.redis_helper))
 
-    async def crawl(self, url: str):
-        """Crawls a website"""
-        domain = urlparse(url).netloc
-        visited = set()
-        sitemap = {}
-        errors = {}
-        await self.crawl_page(url, visited, domain, sitemap, errors)
-        return sitemap, errors
-
-    async def crawl_page(
-        self, url: str, visited: set, domain: str, sitemap: dict, errors: dict
+    async def crawl(
+        self,
+        url: str,
+        refresh: bool = False,
+        on_result: Callable[[dict], Awaitable[None]] | None = None,
+        keep_results: bool = True,
+        seed_sitemaps: bool = False,
+        respect_robots: bool = False,
+        budget: CrawlBudget | None = None,
+        checkpoint: CrawlCheckpoint | None = None,
+        frontier: SharedFrontier | None = None,
     ):
-        """Recursively calling website using DFS in graph and using memoization technique"""
-        redis_key = f"sitemap:{url}"
-        if url in visited or domain not in urlparse(url).netloc:
-            # if page is already visited return
+        """
+        Crawls a website
+        :param url:
+        :param refresh: ignore cached results and revalidate every page with the origin
+        :param on_result: awaited with every page or error record as soon as it is known
+        :param keep_results: collect the sitemap and errors in memory, when False
+            results are only handed to on_result and empty dicts are returned
+        :param seed_sitemaps: also crawl the pages listed by the sitemaps of the site
+        :param respect_robots: skip the pages disallowed by robots.txt
+        :param budget: limits of the crawl, a partial result is returned once one is hit
+        :param checkpoint: progress of an interrupted crawl to resume from, the crawl
+            records the pages it discovers in it
+        :param frontier: frontier of a batch crawled by workers shared with other crawls,
+            see frontier_worker, otherwise the crawl runs CRAWL_CONCURRENCY workers
+        :return: sitemap, errors and the limit which truncated the crawl if any
+        """
+        url = canonicalize(url)
+        budget = budget or CrawlBudget()
+        crawl_key = f"crawl:{url}"
+        if seed_sitemaps or respect_robots:
+            # fragments are never part of crawled urls, options can not clash with one
+            crawl_key += f"#sitemaps={int(seed_sitemaps)}&robots={int(respect_robots)}"
+        resumed = checkpoint is not None and checkpoint.is_resumed
+        # a cached crawl is complete and may not fit the budget, nor skip what was resumed
+        if not refresh and not budget.is_limited and not resumed:
+            cached_crawl = await self.redis_helper.get_value_by_key(crawl_key)
+            if cached_crawl:
+                logger.debug(f"Using cached crawl for url: {url}")
+                cached_crawl = json.loads(cached_crawl)
+                if on_result:
+                    for page, links in cached_crawl["sitemap"].items():
+                        await on_result({"page": page, "links": links})
+                    for page, error in cached_crawl["errors"].items():
+                        await on_result({"page": page, "error": error})
+                return cached_crawl["sitemap"], cached_crawl["errors"], None
+        state = CrawlState(
+            url,
+            refresh=refresh,
+            on_result=on_result,
+            keep_results=keep_results,
+            # rules of every host are fetched as it is first linked to
+            robots={} if respect_robots else None,
+            budget=budget,
+            checkpoint=checkpoint,
+            frontier=frontier,
+        )
+        workers = []
+        if frontier is None:
+            workers = [
+                asyncio.create_task(self.crawl_worker(state))
+                for _ in range(CRAWL_CONCURRENCY)
+            ]
+        deadline = asyncio.timeout(budget.max_duration)
+        try:
+            async with deadline:
+                await self.expand_frontier([url], state)
+                if seed_sitemaps:
+                    robots = await self.robots_helper.get_rules(url)
+                    async for pages in self.sitemap_pages(url, robots):
+                        await self.expand_frontier(pages, state)
+                await self.wait_for_frontier(state)
+        except TimeoutError:
+            if not deadline.expired():
+                raise
+            logger.info(f"Crawl of {url} ran out of time")
+            state.truncate("max_duration", stop=True)
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            if frontier is not None:
+                # pages still queued on the shared frontier are skipped, those being
+                # crawled are not reported
+                state.stopped.set()
+                state.on_result = None
+        if not keep_results:
+            return {}, {}, state.truncated
+        sitemap, errors = state.sitemap, state.errors
+        if state.truncated:
+            return sitemap, errors, state.truncated
+        if errors:
+            # pages which failed are tried again by the next crawl instead of replayed
+            return sitemap, errors, None
+        await self.redis_helper.set_key_value(
+            crawl_key,
+            json.dumps(
+                {
+                    "crawled_at": time.time(),
+                    "sitemap": sitemap,
+                    "errors": errors,
+                },
+                separators=(",", ":"),
+            ),
+            CRAWL_RESULT_EXPIRY,
+        )
+        return sitemap, errors, None
+
+    async def stream(
+        self,
+        url: str,
+        refresh: bool = False,
+        seed_sitemaps: bool = False,
+        respect_robots: bool = False,
+        budget: CrawlBudget | None = None,
+    ) -> AsyncIterator[dict]:
+        """
+        Crawls a website yielding page and error records as soon as they are known.
+        Crawling pauses while the consumer lags STREAM_BUFFER_SIZE records behind.
+        :param url:
+        :param refresh: ignore cached results and revalidate every page with the origin
+        :param seed_sitemaps: also crawl the pages listed by the sitemaps of the site
+        :param respect_robots: skip the pages disallowed by robots.txt
+        :param budget: limits of the crawl
+        :return: an async iterator of records, ending with a {"truncated": limit} record
+            when a limit was hit
+        """
+        records = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+        done = object()
+
+        async def produce():
+            try:
+                _, _, truncated = await self.crawl(
+                    url,
+                    refresh=refresh,
+                    on_result=records.put,
+                    keep_results=False,
+                    seed_sitemaps=seed_sitemaps,
+                    respect_robots=respect_robots,
+                    budget=budget,
+                )
+                if truncated:
+                    await records.put({"truncated": truncated})
+            finally:
+                await records.put(done)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (record := await records.get()) is not done:
+                yield record
+            # surface failures of the crawl
+            await producer
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+    @staticmethod
+    async def wait_for_frontier(state: CrawlState):
+        """
+        Waits until every page of the frontier is crawled or the budget is spent
+        :param state:
+        :return:
+        """
+        waiters = [
+            asyncio.create_task(state.frontier.join()),
+            asyncio.create_task(state.stopped.wait()),
+        ]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+
+    async def sitemap_pages(
+        self, url: str, robots: RobotsRules
+    ) -> AsyncIterator[List[str]]:
+        """
+        Pages listed by the sitemaps of the site, from robots.txt or /sitemap.xml
+        :param url:
+        :param robots: robots.txt rules of the site
+        :return: an async iterator of batches of pages
+        """
+        sitemaps = robots.sitemaps or [urljoin(url, "/sitemap.xml")]
+        pages = []
+        async for page in read_sitemap_urls(sitemaps, self.http_helper):
+            pages.append(page.partition("#")[0])
+            if len(pages) >= SITEMAP_SEED_BATCH:
+                yield pages
+                pages = []
+        if pages:
+            yield pages
+
+    async def crawl_worker(self, state: CrawlState):
+        """Pulls pages from the frontier and pushes newly discovered links back to it"""
+        while True:
+            url, depth = await state.frontier.get()
+            try:
+                await self.crawl_and_expand(url, depth, state)
+            finally:
+                state.frontier.task_done()
+
+    async def frontier_worker(self, frontier: SharedFrontier):
+        """Crawls pages of any crawl of a batch from its shared frontier"""
+        while True:
+            state, url, depth = await frontier.get()
+            try:
+                if not state.stopped.is_set():
+                    await self.crawl_and_expand(url, depth, state)
+            finally:
+                frontier.task_done(state)
+
+    async def crawl_and_expand(self, url: str, depth: int, state: CrawlState):
+        """
+        Crawls a page of the frontier and pushes its unvisited links back to it
+        :param url:
+        :param depth: links followed from the root to reach the page
+        :param state:
+        :return:
+        """
+        try:
+            links = await self.crawl_page(url, state)
+            await self.expand_frontier(links, state, depth + 1)
+        except Exception as e:
+            logger.error(f"Failed to expand {url}: {e}")
+            logger.error(traceback.format_exc())
+
+    async def expand_frontier(
+        self, links: List[str], state: CrawlState, depth: int = 0
+    ):
+        """
+        Adds unvisited links to the frontier, resolving cached pages level by level.
+        Every level costs a single redis round-trip however many pages it holds.
+        :param links:
+        :param state:
+        :param depth: links followed from the root to reach the links
+        :return:
+        """
+        if state.robots is not None:
+            await self.load_robots(state.matcher.filter(links), state.robots)
+        level = self.unvisited_links(links, state, depth)
+        while level:
+            if state.refresh:
+                # every page has to be revalidated with the origin
+                cached_lists = [None for _ in level]
+            else:
+                cached_lists = await self.redis_helper.get_links_from_keys(
+                    [f"sitemap:{link}" for link in level], level
+                )
+            next_level = []
+            for link, cached_links in zip(level, cached_lists):
+                if cached_links is not None:
+                    logger.debug(f"Using cache for url: {link}")
+                    PAGES.labels(source="cache").inc()
+                    # is page is already scraped in another request and is present in cache use it
+                    await state.add_page(link, cached_links)
+                    if state.robots is not None:
+                        await self.load_robots(
+                            state.matcher.filter(cached_links), state.robots
+                        )
+                    next_level.extend(
+                        self.unvisited_links(cached_links, state, depth + 1)
+                    )
+                else:
+                    state.frontier.put_nowait((link, depth))
+            level = next_level
+            depth += 1
+
+    async def load_robots(self, urls: List[str], robots: Dict[str, RobotsRules]):
+        """
+        Fetches the robots.txt rules of the hosts not seen yet, their crawl-delay paces
+        the requests sent to them from then on
+        :param urls: canonical urls
+        :param robots: rules of the hosts seen so far by network location, the new ones
+            are added to it
+        :return:
+        """
+        new_hosts = {}
+        for url in urls:
+            host = urlparse(url).netloc
+            if host not in robots:
+                new_hosts.setdefault(host, url)
+        if not new_hosts:
             return
+        rules = await asyncio.gather(
+            *(self.robots_helper.get_rules(url) for url in new_hosts.values())
+        )
+        for (host, url), host_rules in zip(new_hosts.items(), rules):
+            robots[host] = host_rules
+            # also lifts the delay of a robots.txt which no longer asks for one
+            self.host_scheduler.limiter(url).set_crawl_delay(host_rules.crawl_delay)
+
+    @staticmethod
+    def unvisited_links(
+        links: List[str], state: CrawlState, depth: int = 0
+    ) -> List[str]:
+        """
+        Filters links already visited, outside the domain, disallowed by robots.txt or
+        beyond the budget and marks the rest as visited
+        :param links:
+        :param state:
+        :param depth: links followed from the root to reach the links
+        :return:
+        """
+        unvisited = []
+        for link in links:
+            link = state.resolve(link)
+            # admitted before it is marked visited, a link beyond the budget on this
+            # path may still be reached by a shorter one, then marked while enqueueing
+            # so no other worker picks it twice
+            if link and not state.is_visited(link) and state.admit(depth):
+                state.visit(link)
+                state.discover(link, depth)
+                unvisited.append(link)
+        return unvisited
+
+    async def crawl_page(self, url: str, state: CrawlState) -> List[str]:
+        """
+        Fetches a single page and records its links
+        :param url:
+        :param state:
+        :return: links of the page lying within the domain
+        """
         logger.debug(f"Crawling {url}")
-        visited.add(url)
-        if await self.redis_helper.get_list_from_key(redis_key):
-            logger.debug(f"Using cache for url: {url}")
-            # is page is already scraped in another request and is present in cache use it
-            sitemap[url] = await self.redis_helper.get_list_from_key(redis_key)
-            for link in sitemap[url]:
-                # recursively scraping pages reachable from the sitemap
-                await self.crawl_page(link, visited, domain, sitemap, errors)
-            # no need to continue further as the page is already scraped
-            return
+        max_size = min(state.budget.max_page_bytes or MAX_PAGE_SIZE, MAX_PAGE_SIZE)
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        # broken link saving error for partial result
-                        logger.error(f"Failed to crawl {url}: status {response.status}")
-                        errors[url] = f"Failed with status code {response.status}"
-                        return
-                    sitemap[url] = []
-                    html = await response.text()
-                    links = self.extract_links(html, url)
-                    for full_url in links:
-                        # check domain is a subset or original one
-                        # if exact match is needed can be replaced with ==
-                        if domain in urlparse(full_url).netloc:
-                            sitemap[url].append(full_url)
-                            await self.crawl_page(
-                                full_url, visited, domain, sitemap, errors
-                            )
-                    if sitemap[url]:
-                        await self.redis_helper.push_list_to_key(
-                            redis_key, sitemap[url]
-                        )
+            links, size = await self.fetch_domain_links(url, state.matcher, max_size)
         except Exception as e:
+            # broken link saving error for partial result
             logger.error(f"Failed to crawl {url}: {e}")
-            logger.error(traceback.format_exc())
-            errors[url] = f"Failed with exception {str(e)}"
+            if not isinstance(e, FetchError):
+                logger.error(traceback.format_exc())
+            await state.add_error(url, self.error_message(e))
+            return []
+        state.add_bytes(size)
+        await state.add_page(url, links)
+        return links
 
-    def extract_links(self, html, base_url):
+    async def resolve_domain_links(
+        self, url: str, matcher: DomainMatcher, refresh: bool = False
+    ) -> List[str]:
+        """
+        Links of a page lying within the domain, from cache if the page was crawled recently
+        :param url:
+        :param matcher: domain of the crawl
+        :param refresh: ignore the cache and revalidate the page with the origin
+        :return:
+        """
+        if not refresh:
+            cached_links = await self.redis_helper.get_links(f"sitemap:{url}", url)
+            if cached_links is not None:
+                logger.debug(f"Using cache for url: {url}")
+                PAGES.labels(source="cache").inc()
+                return matcher.filter(cached_links)
+        links, _ = await self.fetch_domain_links(url, matcher)
+        return links
+
+    async def fetch_domain_links(
+        self, url: str, matcher: DomainMatcher, max_size: int = MAX_PAGE_SIZE
+    ) -> tuple[List[str], int]:
+        """
+        Fetches a page and caches its links lying within the domain
+        :param url:
+        :param matcher: domain of the crawl
+        :param max_size: the page is not downloaded past these many bytes
+        :return: canonical links and the bytes downloaded
+        """
+        try:
+            links, size = await self.fetch_links(url, max_size)
+        except Exception:
+            PAGES.labels(source="error").inc()
+            raise
+        PAGES.labels(source="origin").inc()
+        links = matcher.filter(links)
+        if not self.is_cut_short(size, max_size):
+            await self.redis_helper.set_links(f"sitemap:{url}", url, links)
+        return links, size
+
+    @staticmethod
+    def is_cut_short(size: int, max_size: int) -> bool:
+        """
+        Whether a page was truncated by a limit lower than MAX_PAGE_SIZE, its links
+        are then missing from the cache which other crawls read
+        :param size:
+        :param max_size:
+        :return:
+        """
+        return max_size < MAX_PAGE_SIZE and size >= max_size
+
+    @staticmethod
+    def error_message(error: Exception) -> str:
+        """
+        Error recorded for a page which could not be crawled
+        :param error:
+        :return:
+        """
+        if isinstance(error, FetchError):
+            return str(error)
+        return f"Failed with exception {str(error)}"
+
+    async def fetch_links(
+        self, url: str, max_size: int = MAX_PAGE_SIZE
+    ) -> tuple[List[str], int]:
+        """
+        Fetches a page and extracts all of its links. Concurrent fetches of the same page,
+        from this or another pod, wait for the first one instead of fetching it again.
+        :param url:
+        :param max_size: the page is not downloaded past these many bytes
+        :return: every link of the page and the bytes downloaded
+        """
+        key = url if max_size == MAX_PAGE_SIZE else f"{url}#max_size={max_size}"
+        links, size = await self.single_flight.run(
+            key, lambda: self.download_links(url, max_size)
+        )
+        return links, size
+
+    async def download_links(
+        self, url: str, max_size: int = MAX_PAGE_SIZE
+    ) -> tuple[List[str], int]:
+        """
+        Downloads a page and extracts all of its links. The page is revalidated with a
+        conditional request when validators of an earlier fetch are known.
+        Requests are paced per host and throttled pages are fetched again once the host
+        resumes, up to THROTTLE_RETRIES times. Transient failures are retried with a
+        backoff and hosts which are down fail fast, see RetryPolicy. Bodies of content
+        types which are not parsed are never read, and such urls are not requested again.
+        :param url:
+        :param max_size: the page is not downloaded past these many bytes
+        :return: every link of the page and the bytes downloaded
+        """
+        validators_key = f"page:{url}"
+        validators = json.loads(
+            await self.redis_helper.get_value_by_key(validators_key, persist=True)
+            or "{}"
+        )
+        content_type = validators.get("content_type")
+        if (
+            content_type is None
+            and "links" not in validators
+            and CONTENT_TYPE_PREFLIGHT
+            and needs_preflight(url)
+        ):
+            content_type = await self.preflight_content_type(url)
+        if not is_allowed_content_type(content_type):
+            logger.debug(f"Skipping {url} of content type {content_type}")
+            if "content_type" not in validators:
+                validators = {"content_type": mime_type(content_type)}
+                await self.redis_helper.set_key_value(
+                    validators_key,
+                    json.dumps(validators, separators=(",", ":")),
+                    PAGE_VALIDATOR_EXPIRY,
+                    persist=True,
+                )
+            return [], 0
+        links, size, validators = await self.retry_policy.run(
+            url, lambda: self.request_links(url, validators, max_size)
+        )
+        validators = {name: value for name, value in validators.items() if value}
+        if validators and not self.is_cut_short(size, max_size):
+            validators["links"] = links
+            await self.redis_helper.set_key_value(
+                validators_key,
+                json.dumps(validators, separators=(",", ":")),
+                PAGE_VALIDATOR_EXPIRY,
+                persist=True,
+            )
+        return links, size
+
+    async def request_links(
+        self, url: str, validators: dict, max_size: int = MAX_PAGE_SIZE
+    ) -> tuple[List[str], int, dict]:
+        """
+        Requests a page once, conditionally when validators are known, and extracts all
+        of its links. Throttled requests are sent again once the host resumes, up to
+        THROTTLE_RETRIES times.
+        :param url:
+        :param validators: validators and links of an earlier fetch
+        :param max_size: the page is not downloaded past these many bytes
+        :return: every link of the page, the bytes downloaded and the validators to store
+        """
+        headers = {}
+        if "etag" in validators:
+            headers["If-None-Match"] = validators["etag"]
+        if "last_modified" in validators:
+            headers["If-Modified-Since"] = validators["last_modified"]
+        for attempt in range(THROTTLE_RETRIES + 1):
+            async with self.host_scheduler.slot(url) as slot, self.http_helper.get(
+                url, headers=headers
+            ) as response:
+                delay = slot.observe(
+                    response.status, response.headers.get("Retry-After")
+                )
+                if response.status in THROTTLE_STATUSES and attempt < THROTTLE_RETRIES:
+                    # the host is paused, the next slot is granted once it resumes
+                    logger.info(f"Throttled on {url}, retrying in {delay:.1f}s")
+                    continue
+                if response.status == 304 and "links" in validators:
+                    logger.debug(f"Page not modified: {url}")
+                    # validators are still stored, nothing to store again
+                    return validators["links"], 0, {}
+                if response.status != 200:
+                    raise HttpStatusError(response.status)
+                content_type = response.headers.get("Content-Type")
+                if not is_allowed_content_type(content_type):
+                    # leave the body unread, the connection is closed instead
+                    logger.debug(f"Skipping {url} of content type {content_type}")
+                    return [], 0, {"content_type": mime_type(content_type)}
+                # links are relative to the page redirected to, "/docs" may be "/docs/"
+                links = await extract_links_from_response(
+                    response, str(response.url), max_size
+                )
+                size = response.content.total_bytes
+                BYTES_DOWNLOADED.inc(size)
+                validators = {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                }
+                return links, size, validators
+
+    async def preflight_content_type(self, url: str) -> str | None:
+        """
+        Content type of a url, checked with a HEAD request
+        :param url:
+        :return: the content type or None if it is unknown
+        """
+        try:
+            async with self.host_scheduler.slot(url) as slot, self.http_helper.head(
+                url, allow_redirects=True
+            ) as response:
+                slot.observe(response.status, response.headers.get("Retry-After"))
+                if response.status != 200:
+                    return None
+                return response.headers.get("Content-Type")
+        except Exception as e:
+            # the page is fetched anyway, its content type is checked then
+            logger.debug(f"HEAD request of {url} failed: {e}")
+            return None
+
+    @staticmethod
+    def extract_links(html, base_url):
         """
         Extracts links from HTML
         :param html:
         :param base_url:
         :return:
         """
-        # Regex to find all href attributes in the HTML
-        links = re.findall(r'href=["\'](.*?)["\']', html)
-        # Remove fragment identifiers and query params
-        cleaned_urls = [
-            urlparse(url)
-            ._replace(
-                query="",
-                fragment="",
-            )
-            .geturl()
-            for url in links
-        ]
-        # Resolve relative URLs to absolute URLs
-        full_urls = []
-        for link in cleaned_urls:
-            # generate absolute urls
-            cleaned_complete_link = urljoin(base_url, link)
-            # remove links to images,css etc.
-            if not cleaned_complete_link.endswith(EXTENSIONS_TO_FILTER):
-                full_urls.append(cleaned_complete_link)
-        return full_urls
+        return extract_links(html, base_url)
@@ -0,0 +1,194 @@
+"""Holds the distributed crawl controller class"""
+
+import asyncio
+import logging
+import traceback
+from typing import Dict, List
+from uuid import uuid4
+
+from config.constants import DISTRIBUTED_POLL_INTERVAL, DISTRIBUTED_WORKERS
+from controllers.crawl_controller import CrawlController
+from helper.crawl_state import CrawlBudget
+from helper.http_helper import FetchError
+from helper.redis_frontier import RedisFrontier
+from helper.redis_helper import RedisHelper
+from helper.robots_helper import RobotsRules, allowed_by_host
+from helper.url_normalizer import DomainMatcher, canonicalize
+
+logger = logging.getLogger(__name__)
+
+
+class DistributedCrawlController:
+    """Holds the business logic for crawls shared by the workers of every pod"""
+
+    # worker tasks of this pod for every distributed crawl it takes part in
+    _local_workers: Dict[str, List[asyncio.Task]] = {}
+
+    def __init__(
+        self,
+        crawl_controller: CrawlController | None = None,
+        redis_helper: RedisHelper | None = None,
+    ):
+        self.crawl_controller = crawl_controller or CrawlController()
+        self.redis_helper = redis_helper or RedisHelper()
+
+    async def crawl(
+        self,
+        url: str,
+        refresh: bool = False,
+        seed_sitemaps: bool = False,
+        respect_robots: bool = False,
+        budget: CrawlBudget | None = None,
+    ):
+        """
+        Crawls a website with the workers of every pod, waiting for the crawl to finish
+        :param url:
+        :param refresh: ignore cached results and revalidate every page with the origin
+        :param seed_sitemaps: also crawl the pages listed by the sitemaps of the site
+        :param respect_robots: skip the pages disallowed by robots.txt
+        :param budget: limits of the crawl, only max_duration applies to distributed crawls
+        :return: sitemap, errors and the limit which truncated the crawl if any
+        """
+        budget = budget or CrawlBudget()
+        truncated = None
+        url = canonicalize(url)
+        frontier = RedisFrontier(uuid4().hex, self.redis_helper)
+        await frontier.start(
+            url,
+            {
+                "url": url,
+                "refresh": str(int(refresh)),
+                "robots": str(int(respect_robots)),
+            },
+        )
+        deadline = asyncio.timeout(budget.max_duration)
+        try:
+            async with deadline:
+                # start crawling right away instead of waiting for the next poll
+                self.join(frontier.crawl_id)
+                if seed_sitemaps:
+                    await self.seed_frontier(frontier, url, respect_robots)
+                while await frontier.pending():
+                    await frontier.heartbeat()
+                    await asyncio.sleep(DISTRIBUTED_POLL_INTERVAL)
+        except TimeoutError:
+            if not deadline.expired():
+                raise
+            logger.info(f"Distributed crawl of {url} ran out of time")
+            truncated = "max_duration"
+        finally:
+            # workers of every pod stop once the crawl is no longer active
+            await frontier.stop()
+        # pages completed once the crawl stopped are not recorded
+        sitemap, errors = await frontier.results()
+        await frontier.clear()
+        return sitemap, errors, truncated
+
+    async def seed_frontier(
+        self, frontier: RedisFrontier, url: str, respect_robots: bool
+    ):
+        """
+        Adds the pages listed by the sitemaps of the site to the frontier
+        :param frontier:
+        :param url:
+        :param respect_robots: skip the pages disallowed by robots.txt
+        :return:
+        """
+        matcher = DomainMatcher(url)
+        robots = await self.crawl_controller.robots_helper.get_rules(url)
+        host_robots: Dict[str, RobotsRules] = {}
+        async for pages in self.crawl_controller.sitemap_pages(url, robots):
+            # seeding large sitemaps may outlast the heartbeat timeout
+            await frontier.heartbeat()
+            pages = matcher.filter(pages)
+            if respect_robots:
+                pages = await self.allowed_links(pages, host_robots)
+            await frontier.add(pages)
+
+    async def allowed_links(
+        self, links: List[str], robots: Dict[str, RobotsRules]
+    ) -> List[str]:
+        """
+        Links allowed by the robots.txt rules of their host
+        :param links: canonical links
+        :param robots: rules of the hosts seen so far by network location, the new ones
+            are added to it
+        :return:
+        """
+        await self.crawl_controller.load_robots(links, robots)
+        return [link for link in links if allowed_by_host(robots, link)]
+
+    async def serve(self):
+        """
+        Joins the distributed crawls started by any pod, runs for the lifetime of the app
+        :return:
+        """
+        while True:
+            try:
+                for crawl_id in await RedisFrontier.active_crawl_ids(self.redis_helper):
+                    self.join(crawl_id)
+            except Exception as e:
+                logger.error(f"Failed to look up distributed crawls: {e}")
+            await asyncio.sleep(DISTRIBUTED_POLL_INTERVAL)
+
+    def join(self, crawl_id: str):
+        """
+        Starts the workers of this pod for the crawl unless they are already running
+        :param crawl_id:
+        :return:
+        """
+        if crawl_id in self._local_workers:
+            return
+        workers = [
+            asyncio.create_task(self.crawl_worker(crawl_id))
+            for _ in range(DISTRIBUTED_WORKERS)
+        ]
+        self._local_workers[crawl_id] = workers
+
+        def forget(_task):
+            if all(worker.done() for worker in workers):
+                self._local_workers.pop(crawl_id, None)
+
+        for worker in workers:
+            worker.add_done_callback(forget)
+
+    async def crawl_worker(self, crawl_id: str):
+        """
+        Pulls urls of the crawl from redis until none is left
+        :param crawl_id:
+        :return:
+        """
+        frontier = RedisFrontier(crawl_id, self.redis_helper)
+        meta = await frontier.get_meta()
+        if not meta:
+            # crawl expired, its coordinator is gone
+            await frontier.stop()
+            return
+        matcher, refresh = DomainMatcher(meta["url"]), meta["refresh"] == "1"
+        # rules of every host are fetched as it is first linked to
+        robots: Dict[str, RobotsRules] | None = (
+            {} if meta.get("robots") == "1" else None
+        )
+        while await frontier.is_active():
+            url = await frontier.claim()
+            if url is None:
+                if not await frontier.pending():
+                    return
+                # other workers are still crawling and may discover more urls
+                await asyncio.sleep(DISTRIBUTED_POLL_INTERVAL)
+                continue
+            links, error = None, None
+            try:
+                links = await self.crawl_controller.resolve_domain_links(
+                    url, matcher, refresh
+                )
+                allowed = links
+                if robots is not None:
+                    allowed = await self.allowed_links(links, robots)
+                await frontier.add(allowed)
+            except Exception as e:
+                logger.error(f"Failed to crawl {url}: {e}")
+                if not isinstance(e, FetchError):
+                    logger.error(traceback.format_exc())
+                error = self.crawl_controller.error_message(e)
+            await frontier.complete(url, links, error)
@@ -0,0 +1,405 @@
+"""Holds the job controller class"""
+
+import asyncio
+import json
+import logging
+import time
+import traceback
+from typing import List, Set, Tuple
+from uuid import uuid4
+
+from config.constants import (
+    JOB_EXPIRY,
+    JOB_FLUSH_SIZE,
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_LEASE_TIMEOUT,
+)
+from controllers.crawl_controller import CrawlController
+from helper.crawl_state import CrawlCheckpoint
+from helper.redis_helper import RedisHelper
+from schemas.crawl_request import CrawlRequest
+
+logger = logging.getLogger(__name__)
+
+# KEYS: lease | ARGV: token, ttl
+# renew the lease unless another pod took the job over since it expired
+RENEW_LEASE_SCRIPT = """
+local owner = redis.call('GET', KEYS[1])
+if owner and owner ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+# KEYS: lease | ARGV: token
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class JobResultWriter:
+    """
+    Buffers page and error records of a job and writes them to redis in batches, along
+    with the pages discovered by the crawl so that it can be resumed from there
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        redis_helper: RedisHelper,
+        checkpoint: CrawlCheckpoint | None = None,
+    ):
+        self.job_id = job_id
+        self.redis_helper = redis_helper
+        self.checkpoint = checkpoint or CrawlCheckpoint()
+        self.pages: List[str] = []
+        self.errors: List[str] = []
+        self._flushed_bytes = self.checkpoint.total_bytes
+        # batches are written in order
+        self._lock = asyncio.Lock()
+
+    async def add(self, record: dict):
+        """
+        Buffers a record, flushing the buffer first once it is full. The links of a page
+        are discovered right after its record is added without suspending, so a page is
+        always written in the same batch as the pages it discovered.
+        :param record:
+        :return:
+        """
+        if len(self.pages) + len(self.errors) >= JOB_FLUSH_SIZE:
+            await self.flush()
+        if "error" in record:
+            self.errors.append(json.dumps(record, separators=(",", ":")))
+        else:
+            self.pages.append(json.dumps(record, separators=(",", ":")))
+
+    async def flush(self):
+        """
+        Appends the buffered records to the job results and saves the checkpoint. A
+        batch taken from the buffers is written even if the job is cancelled meanwhile.
+        :return:
+        """
+        await asyncio.shield(self._flush())
+
+    async def _flush(self):
+        async with self._lock:
+            pages, errors = self.pages, self.errors
+            self.pages, self.errors = [], []
+            discovered = [f"{depth} {url}" for url, depth in self.checkpoint.drain()]
+            total_bytes = self.checkpoint.total_bytes
+            if not pages and not errors and not discovered:
+                return
+            await self.redis_helper.push_lists_to_keys(
+                {
+                    f"job:{self.job_id}:pages": pages,
+                    f"job:{self.job_id}:errors": errors,
+                    f"job:{self.job_id}:discovered": discovered,
+                },
+                JOB_EXPIRY,
+            )
+            await self.redis_helper.increment_hash_fields(
+                f"job:{self.job_id}",
+                {
+                    "pages": len(pages),
+                    "errors": len(errors),
+                    "bytes": total_bytes - self._flushed_bytes,
+                },
+                JOB_EXPIRY,
+            )
+            self._flushed_bytes = total_bytes
+
+
+class JobController:
+    """Holds the business logic for running crawls in the background as jobs"""
+
+    # asyncio keeps weak references to tasks only, running jobs must not be garbage collected
+    _running_jobs: Set[asyncio.Task] = set()
+
+    def __init__(
+        self,
+        crawl_controller: CrawlController | None = None,
+        redis_helper: RedisHelper | None = None,
+    ):
+        self.crawl_controller = crawl_controller or CrawlController()
+        self.redis_helper = redis_helper or RedisHelper()
+
+    async def create_job(self, request: CrawlRequest) -> str:
+        """
+        Registers a crawl job and starts it in the background
+        :param request:
+        :return: id of the job
+        """
+        job_id = uuid4().hex
+        await self.redis_helper.set_hash(
+            f"job:{job_id}",
+            {
+                "status": "queued",
+                "url": request.url,
+                "request": request.model_dump_json(),
+                "created_at": str(time.time()),
+                "pages": "0",
+                "errors": "0",
+                "bytes": "0",
+            },
+            JOB_EXPIRY,
+        )
+        token = await self.acquire_lease(job_id)
+        self.start_job(job_id, request, token)
+        return job_id
+
+    def start_job(
+        self,
+        job_id: str,
+        request: CrawlRequest,
+        token: str,
+        checkpoint: CrawlCheckpoint | None = None,
+    ):
+        """
+        Runs the job in the background
+        :param job_id:
+        :param request:
+        :param token: lease of the job held by this pod
+        :param checkpoint: progress to resume the job from
+        :return:
+        """
+        task = asyncio.create_task(self.run_job(job_id, request, token, checkpoint))
+        self._running_jobs.add(task)
+        task.add_done_callback(self._running_jobs.discard)
+
+    async def run_job(
+        self,
+        job_id: str,
+        request: CrawlRequest,
+        token: str,
+        checkpoint: CrawlCheckpoint | None = None,
+    ):
+        """
+        Runs the crawl of a job, storing its results and progress as they are discovered.
+        A job cancelled while the pod shuts down is left interrupted, to be resumed.
+        :param job_id:
+        :param request:
+        :param token: lease of the job held by this pod
+        :param checkpoint: progress to resume the job from
+        :return:
+        """
+        job_key = f"job:{job_id}"
+        checkpoint = checkpoint or CrawlCheckpoint()
+        writer = JobResultWriter(job_id, self.redis_helper, checkpoint)
+        heartbeat = asyncio.create_task(
+            self.heartbeat(job_id, token, writer, asyncio.current_task())
+        )
+        interrupted = False
+        try:
+            started = "resumed_at" if checkpoint.is_resumed else "started_at"
+            await self.redis_helper.set_hash(
+                job_key, {"status": "running", started: str(time.time())}, JOB_EXPIRY
+            )
+            _, _, truncated = await self.crawl_controller.crawl(
+                request.url,
+                refresh=request.refresh,
+                on_result=writer.add,
+                keep_results=False,
+                seed_sitemaps=request.seed_sitemaps,
+                respect_robots=request.respect_robots,
+                budget=request.budget(),
+                checkpoint=checkpoint,
+            )
+            await writer.flush()
+            status = {"status": "completed", "finished_at": str(time.time())}
+            if truncated:
+                status["truncated"] = truncated
+        except asyncio.CancelledError:
+            if heartbeat.done():
+                # the lease was lost, the pod which took the job over records it now
+                logger.warning(f"Job {job_id} was taken over by another pod")
+                return
+            interrupted = True
+            status = {"status": "interrupted", "interrupted_at": str(time.time())}
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            logger.error(traceback.format_exc())
+            status = {
+                "status": "failed",
+                "error": str(e),
+                "finished_at": str(time.time()),
+            }
+        finally:
+            heartbeat.cancel()
+        try:
+            if interrupted:
+                await writer.flush()
+            await self.redis_helper.set_hash(job_key, status, JOB_EXPIRY)
+            await self.release_lease(job_id, token)
+        except Exception as e:
+            logger.error(f"Failed to store status of job {job_id}: {e}")
+        if interrupted:
+            raise asyncio.CancelledError
+
+    async def heartbeat(
+        self, job_id: str, token: str, writer: JobResultWriter, job: asyncio.Task
+    ):
+        """
+        Saves the progress of a running job and renews its lease until the job ends. The
+        job is stopped once another pod took it over.
+        :param job_id:
+        :param token: lease of the job held by this pod
+        :param writer: results and checkpoint of the job
+        :param job: the task running the job
+        :return:
+        """
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+            try:
+                if not await self.redis_helper.run_script(
+                    RENEW_LEASE_SCRIPT,
+                    [f"job:{job_id}:lease"],
+                    [token, JOB_LEASE_TIMEOUT],
+                ):
+                    job.cancel()
+                    return
+                await writer.flush()
+                await self.redis_helper.set_hash(
+                    f"job:{job_id}", {"heartbeat_at": str(time.time())}, JOB_EXPIRY
+                )
+            except Exception as e:
+                logger.error(f"Heartbeat of job {job_id} failed: {e}")
+
+    async def acquire_lease(self, job_id: str) -> str | None:
+        """
+        Takes the lease of a job, only the pod holding it runs the job
+        :param job_id:
+        :return: token of the lease or None if another pod holds it
+        """
+        token = uuid4().hex
+        owner = await self.redis_helper.set_key_if_absent(
+            f"job:{job_id}:lease", token, JOB_LEASE_TIMEOUT
+        )
+        return token if owner == token else None
+
+    async def release_lease(self, job_id: str, token: str):
+        """
+        Gives the lease of a job up unless it was taken over
+        :param job_id:
+        :param token: lease of the job held by this pod
+        :return:
+        """
+        await self.redis_helper.run_script(
+            RELEASE_LEASE_SCRIPT, [f"job:{job_id}:lease"], [token]
+        )
+
+    async def resume_job(self, job_id: str) -> str | None:
+        """
+        Resumes a job which was interrupted or failed from its last checkpoint, pages it
+        already crawled are not crawled again
+        :param job_id:
+        :return: "queued" once resumed, the status of a job which can not be resumed
+            or None if the job does not exist
+        """
+        job_key = f"job:{job_id}"
+        if not await self.redis_helper.exists(job_key):
+            return None
+        token = await self.acquire_lease(job_id)
+        if token is None:
+            return "running"
+        job = await self.redis_helper.get_hash(job_key)
+        if not job or job["status"] == "completed":
+            await self.release_lease(job_id, token)
+            return job.get("status") if job else None
+        checkpoint, pages, errors = await self.load_checkpoint(job_id)
+        await self.redis_helper.remove_hash_fields(
+            job_key, ["error", "finished_at", "interrupted_at"]
+        )
+        await self.redis_helper.set_hash(
+            job_key,
+            {"status": "queued", "pages": str(pages), "errors": str(errors)},
+            JOB_EXPIRY,
+        )
+        logger.info(
+            f"Resuming job {job_id} with {len(checkpoint.pending)} pending pages"
+        )
+        self.start_job(
+            job_id, CrawlRequest.model_validate_json(job["request"]), token, checkpoint
+        )
+        return "queued"
+
+    async def load_checkpoint(self, job_id: str) -> Tuple[CrawlCheckpoint, int, int]:
+        """
+        Progress of a job, pages discovered but without a result are pending
+        :param job_id:
+        :return: the checkpoint and the number of pages and errors recorded
+        """
+        job = await self.redis_helper.get_hash(f"job:{job_id}")
+        discovered = await self.redis_helper.get_list_from_key(
+            f"job:{job_id}:discovered"
+        )
+        pages = await self.redis_helper.get_list_from_key(f"job:{job_id}:pages")
+        errors = await self.redis_helper.get_list_from_key(f"job:{job_id}:errors")
+        done = {json.loads(record)["page"] for record in pages + errors}
+        visited, pending = [], []
+        for entry in discovered:
+            depth, _, url = entry.partition(" ")
+            visited.append(url)
+            if url not in done:
+                pending.append((url, int(depth)))
+        checkpoint = CrawlCheckpoint(visited, pending, int(job.get("bytes", 0)))
+        return checkpoint, len(pages), len(errors)
+
+    @classmethod
+    async def interrupt_jobs(cls):
+        """
+        Stops the jobs running on this pod, they are left to be resumed
+        :return:
+        """
+        jobs = list(cls._running_jobs)
+        for job in jobs:
+            job.cancel()
+        await asyncio.gather(*jobs, return_exceptions=True)
+
+    async def get_job(self, job_id: str) -> dict | None:
+        """
+        Retrieves the status of a job, from whichever pod it runs on
+        :param job_id:
+        :return: the job or None if it does not exist
+        """
+        job = await self.redis_helper.get_hash(f"job:{job_id}")
+        if not job:
+            return None
+        job.pop("request", None)
+        if job["status"] in (
+            "queued",
+            "running",
+        ) and not await self.redis_helper.exists(f"job:{job_id}:lease"):
+            # the pod running it died without a chance to record it
+            job["status"] = "interrupted"
+        return {"job_id": job_id, **job}
+
+    async def get_results(
+        self, job_id: str, kind: str, offset: int, limit: int
+    ) -> dict | None:
+        """
+        Retrieves a page of the results of a job
+        :param job_id:
+        :param kind: "pages" or "errors"
+        :param offset:
+        :param limit:
+        :return: the results or None if the job does not exist
+        """
+        job = await self.get_job(job_id)
+        if job is None:
+            return None
+        results_key = f"job:{job_id}:{kind}"
+        records = await self.redis_helper.get_list_from_key(
+            results_key, offset, offset + limit - 1
+        )
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "offset": offset,
+            "limit": limit,
+            "total": await self.redis_helper.get_list_length(results_key),
+            kind: [json.loads(record) for record in records],
+        }
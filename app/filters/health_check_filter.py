@@ -7,12 +7,13 @@ from config.constants import OP_PATH
 
 class HealthCheckFilter(logging.Filter):
     # pylint: disable=too-few-public-methods
-    """Remove health apis logs"""
+    """Remove health and metrics apis logs"""
 
     def filter(self, record):
         """
-        ignore health api logging
+        ignore health and metrics api logging, both are polled
         :param record:
         :return:
         """
-        return record.__dict__.get(OP_PATH).find("health") == -1
+        op_path = record.__dict__.get(OP_PATH)
+        return op_path.find("health") == -1 and not op_path.endswith("/metrics")
@@ -0,0 +1,50 @@
+"""
+Module holding a bloom filter, a compact probabilistic set.
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Set membership in a fixed bit array. Added values are always reported as members,
+    other values are wrongly reported as members with the configured error rate.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        :param capacity: The number of values expected to be added.
+        :param error_rate: The false positive rate once capacity values are added.
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8]), int.from_bytes(digest[8:]) | 1
+        # double hashing derives every position from two hashes
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, value: str) -> bool:
+        """
+        Add the value to the set.
+
+        :param value: The value.
+        :return: False if the value was (probably) already a member.
+        """
+        added = False
+        for position in self._positions(value):
+            byte, bit = divmod(position, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                added = True
+        return added
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(value)
+        )
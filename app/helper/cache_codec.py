@@ -0,0 +1,135 @@
+"""
+Module to encode the cached links of a page into a compact binary value.
+Links sharing the origin of the page are stored as paths, the list is then serialized
+and compressed. The first byte of a value names its codec so that values written with
+any codec can be read back.
+"""
+
+import json
+import logging
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+import msgpack
+import zstandard
+
+from config.constants import CACHE_CODEC
+
+logger = logging.getLogger(__name__)
+
+
+class LinksCodec(ABC):
+    """
+    Serializes and compresses a list of strings.
+    """
+
+    name = ""
+    tag = b""
+
+    @abstractmethod
+    def dumps(self, values: List[str]) -> bytes:
+        """
+        :param values: The values.
+        :return: The encoded values.
+        """
+
+    @abstractmethod
+    def loads(self, data: bytes) -> List[str]:
+        """
+        :param data: The encoded values.
+        :return: The values.
+        """
+
+
+class ZlibJsonCodec(LinksCodec):
+    """
+    JSON compressed with zlib, values written before msgpack-zstd stay readable.
+    """
+
+    name = "zlib"
+    tag = b"z"
+
+    def dumps(self, values: List[str]) -> bytes:
+        return zlib.compress(json.dumps(values, separators=(",", ":")).encode("utf-8"))
+
+    def loads(self, data: bytes) -> List[str]:
+        return json.loads(zlib.decompress(data))
+
+
+class MsgpackZstdCodec(LinksCodec):
+    """
+    Msgpack compressed with zstd, smaller and faster than zlib.
+    """
+
+    name = "msgpack-zstd"
+    tag = b"m"
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor()
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, values: List[str]) -> bytes:
+        return self._compressor.compress(msgpack.packb(values))
+
+    def loads(self, data: bytes) -> List[str]:
+        return msgpack.unpackb(self._decompressor.decompress(data))
+
+
+CODECS: Dict[bytes, LinksCodec] = {
+    codec.tag: codec for codec in (ZlibJsonCodec(), MsgpackZstdCodec())
+}
+
+
+def get_codec(name: str = CACHE_CODEC) -> LinksCodec:
+    """
+    :param name: "zlib", "msgpack-zstd" or "auto" for the best one.
+    :return: The codec used to write values.
+    """
+    codecs = {codec.name: codec for codec in CODECS.values()}
+    if name == "auto":
+        return codecs[MsgpackZstdCodec.name]
+    if name not in codecs:
+        logger.warning(f"Cache codec {name} is not available, using zlib")
+        return codecs[ZlibJsonCodec.name]
+    return codecs[name]
+
+
+def page_origin(page_url: str) -> str:
+    """
+    :param page_url: The url of the page.
+    :return: The scheme and network location of the url.
+    """
+    scheme, _, rest = page_url.partition("://")
+    return f"{scheme}://{rest.partition('/')[0]}"
+
+
+def encode_links(page_url: str, links: List[str], codec: LinksCodec) -> bytes:
+    """
+    :param page_url: The url of the page.
+    :param links: The links of the page.
+    :param codec: The codec to write the value with.
+    :return: The encoded links.
+    """
+    origin = page_origin(page_url)
+    prefix = f"{origin}/"
+    size = len(origin)
+    relative = [link[size:] if link.startswith(prefix) else link for link in links]
+    return codec.tag + codec.dumps(relative)
+
+
+def decode_links(page_url: str, data: bytes) -> List[str]:
+    """
+    :param page_url: The url of the page.
+    :param data: The encoded links.
+    :return: The links of the page.
+    :raises ValueError: If the value was written by an unknown codec.
+    """
+    codec = CODECS.get(data[:1])
+    if codec is None:
+        raise ValueError(f"Unknown cache codec {data[:1]!r}")
+    origin = page_origin(page_url)
+    return [
+        origin + link if link.startswith("/") else link
+        for link in codec.loads(data[1:])
+    ]
@@ -0,0 +1,69 @@
+"""
+Module deciding which urls and responses are worth parsing for links, by extension and
+content type.
+"""
+
+import posixpath
+from urllib.parse import urlparse
+
+from config.constants import (
+    ALLOWED_CONTENT_TYPES,
+    ALLOWED_EXTENSIONS,
+    DENIED_CONTENT_TYPES,
+    EXTENSIONS_TO_FILTER,
+    HTML_EXTENSIONS,
+)
+
+
+def url_extension(url: str) -> str:
+    """
+    :param url: The url.
+    :return: The lower-cased extension of the last path segment, empty if it has none.
+    """
+    return posixpath.splitext(urlparse(url).path)[1].lower()
+
+
+def is_allowed_extension(url: str) -> bool:
+    """
+    Urls without an extension are always allowed, they are usually pages.
+
+    :param url: The url.
+    :return: Whether the url may be crawled judging by its extension.
+    """
+    extension = url_extension(url)
+    if not extension:
+        return True
+    if extension in EXTENSIONS_TO_FILTER:
+        return False
+    return not ALLOWED_EXTENSIONS or extension in ALLOWED_EXTENSIONS
+
+
+def mime_type(content_type: str | None) -> str:
+    """
+    :param content_type: The Content-Type header.
+    :return: The lower-cased mime type without its parameters, empty if unknown.
+    """
+    return (content_type or "").partition(";")[0].strip().lower()
+
+
+def is_allowed_content_type(content_type: str | None) -> bool:
+    """
+    A response without a content type is parsed, it is most likely HTML.
+
+    :param content_type: The Content-Type header or the mime type.
+    :return: Whether the response may be parsed for links.
+    """
+    mime = mime_type(content_type)
+    if not mime:
+        return True
+    if mime.startswith(DENIED_CONTENT_TYPES):
+        return False
+    return not ALLOWED_CONTENT_TYPES or mime in ALLOWED_CONTENT_TYPES
+
+
+def needs_preflight(url: str) -> bool:
+    """
+    :param url: The url.
+    :return: Whether the extension of the url leaves its content type in doubt.
+    """
+    return url_extension(url) not in HTML_EXTENSIONS
@@ -0,0 +1,307 @@
+"""
+Module holding the in-memory state of a crawl, compact enough for very large sites.
+"""
+
+import asyncio
+from array import array
+from dataclasses import astuple, dataclass
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from config.constants import BLOOM_CAPACITY, BLOOM_ERROR_RATE, VISITED_FILTER
+from helper.bloom_filter import BloomFilter
+from helper.robots_helper import RobotsRules, allowed_by_host
+from helper.shared_frontier import SharedFrontier
+from helper.url_normalizer import DomainMatcher
+
+
+@dataclass
+class CrawlBudget:
+    """
+    Limits of a single crawl, None leaves a limit out.
+    """
+
+    # links followed from the root, the root is at depth 0
+    max_depth: int | None = None
+    # pages crawled or read from cache, failed ones included
+    max_pages: int | None = None
+    # bytes downloaded over every page
+    max_total_bytes: int | None = None
+    # bytes downloaded of a single page, the rest of the page is not read
+    max_page_bytes: int | None = None
+    # seconds the crawl may take
+    max_duration: float | None = None
+
+    @property
+    def is_limited(self) -> bool:
+        """
+        :return: whether any limit is set
+        """
+        return any(limit is not None for limit in astuple(self))
+
+
+class CrawlCheckpoint:
+    """
+    Progress of a crawl which outlives the process running it. Pages admitted to the
+    frontier are recorded as they are discovered, and whoever saves the checkpoint takes
+    them with drain(). A crawl started from a saved checkpoint skips the pages visited
+    and crawls the pending ones first.
+    """
+
+    def __init__(
+        self,
+        visited: List[str] | None = None,
+        pending: List[Tuple[str, int]] | None = None,
+        total_bytes: int = 0,
+    ):
+        """
+        :param visited: The pages admitted by the crawl so far.
+        :param pending: The pages admitted but not crawled yet, with their depth.
+        :param total_bytes: The bytes downloaded so far.
+        """
+        self.visited = visited or []
+        self.pending = pending or []
+        self.admitted = len(self.visited)
+        self.total_bytes = total_bytes
+        self.is_resumed = bool(self.visited)
+        self._discovered: List[Tuple[str, int]] = []
+
+    def discover(self, url: str, depth: int):
+        """
+        Records a page admitted to the frontier
+        :param url:
+        :param depth: links followed from the root to reach the page
+        :return:
+        """
+        self._discovered.append((url, depth))
+        self.admitted += 1
+
+    def drain(self) -> List[Tuple[str, int]]:
+        """
+        :return: the pages discovered since the last call, with their depth
+        """
+        discovered, self._discovered = self._discovered, []
+        return discovered
+
+
+class CrawlState:
+    # pylint: disable=too-many-instance-attributes
+    """
+    State of a single crawl shared by all of its workers.
+    Every url is stored once and referred to by an integer id, links of a page are kept
+    as an array of ids. The sitemap is expanded back into urls only when it is read.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        refresh: bool = False,
+        on_result: Callable[[dict], Awaitable[None]] | None = None,
+        keep_results: bool = True,
+        robots: Dict[str, RobotsRules] | None = None,
+        budget: CrawlBudget | None = None,
+        checkpoint: CrawlCheckpoint | None = None,
+        frontier: SharedFrontier | None = None,
+    ):
+        """
+        :param url: The root url, pages outside its domain are not crawled.
+        :param refresh: Revalidate every page instead of trusting cached results.
+        :param on_result: Awaited with every page or error record as soon as it is known.
+        :param keep_results: Records only handed to on_result are not kept in memory.
+        :param robots: Pages disallowed by the robots.txt rules of their host are not
+            crawled, rules are added by network location as hosts are seen.
+        :param budget: Limits of the crawl, the crawl is truncated once one is hit.
+        :param checkpoint: Progress the crawl resumes from and records its own to.
+        :param frontier: Frontier of a batch the pages are queued on, the crawl then
+            runs no workers of its own.
+        """
+        self.matcher = DomainMatcher(url)
+        self.domain = self.matcher.domain
+        self.refresh = refresh
+        self.on_result = on_result
+        self.keep_results = keep_results
+        self.robots = robots
+        self.budget = budget or CrawlBudget()
+        # reason of the first limit hit, None while the crawl is complete
+        self.truncated: str | None = None
+        # set once pages in flight or still queued are to be dropped
+        self.stopped = asyncio.Event()
+        self._admitted = 0
+        self._total_bytes = 0
+        # (url, depth) of pages discovered but not crawled yet, consumed by a pool of workers
+        self.frontier = asyncio.Queue() if frontier is None else frontier.attach(self)
+        self._ids: Dict[str, int] = {}
+        self._urls: List[str] = []
+        self._links: Dict[int, array] = {}
+        self._errors: Dict[int, str] = {}
+        # one flag per interned url, links are interned before they are visited
+        self._visited_flags = bytearray()
+        # without results the url table is not needed, a plain or probabilistic set is enough
+        self._visited = None
+        if not keep_results:
+            self._visited = (
+                BloomFilter(BLOOM_CAPACITY, BLOOM_ERROR_RATE)
+                if VISITED_FILTER == "bloom"
+                else set()
+            )
+        self.checkpoint = checkpoint
+        if checkpoint is not None:
+            self._restore(checkpoint)
+
+    def _restore(self, checkpoint: CrawlCheckpoint):
+        for url in checkpoint.visited:
+            self.visit(url)
+        for url, depth in checkpoint.pending:
+            self.frontier.put_nowait((url, depth))
+        self._admitted = checkpoint.admitted
+        self._total_bytes = checkpoint.total_bytes
+        # the state holds them from now on
+        checkpoint.visited, checkpoint.pending = [], []
+
+    def _intern(self, url: str) -> int:
+        url_id = self._ids.get(url)
+        if url_id is None:
+            url_id = self._ids[url] = len(self._urls)
+            self._urls.append(url)
+            self._visited_flags.append(0)
+        return url_id
+
+    def resolve(self, url: str) -> str | None:
+        """
+        :param url:
+        :return: the canonical url or None if it lies outside the domain or robots.txt
+            disallows it
+        """
+        url = self.matcher.resolve(url)
+        if url is None or (
+            self.robots is not None and not allowed_by_host(self.robots, url)
+        ):
+            return None
+        return url
+
+    def is_visited(self, url: str) -> bool:
+        """
+        :param url:
+        :return: True if the url was already visited
+        """
+        if self._visited is None:
+            url_id = self._ids.get(url)
+            return url_id is not None and bool(self._visited_flags[url_id])
+        return url in self._visited
+
+    def visit(self, url: str) -> bool:
+        """
+        Marks the url as visited
+        :param url:
+        :return: False if the url was already visited
+        """
+        if self._visited is None:
+            url_id = self._intern(url)
+            if self._visited_flags[url_id]:
+                return False
+            self._visited_flags[url_id] = 1
+            return True
+        if isinstance(self._visited, BloomFilter):
+            return self._visited.add(url)
+        if url in self._visited:
+            return False
+        self._visited.add(url)
+        return True
+
+    def truncate(self, reason: str, stop: bool = False):
+        """
+        Records that a limit was hit
+        :param reason: the limit
+        :param stop: drop the pages in flight or still queued
+        :return:
+        """
+        if self.truncated is None:
+            self.truncated = reason
+        if stop:
+            self.stopped.set()
+
+    def admit(self, depth: int) -> bool:
+        """
+        Counts a page against the budget
+        :param depth: links followed from the root to reach the page
+        :return: False if crawling the page would exceed the budget
+        """
+        if self.stopped.is_set():
+            return False
+        if self.budget.max_depth is not None and depth > self.budget.max_depth:
+            self.truncate("max_depth")
+            return False
+        if (
+            self.budget.max_pages is not None
+            and self._admitted >= self.budget.max_pages
+        ):
+            self.truncate("max_pages")
+            return False
+        self._admitted += 1
+        return True
+
+    def discover(self, url: str, depth: int):
+        """
+        Records a page admitted to the frontier in the checkpoint
+        :param url:
+        :param depth: links followed from the root to reach the page
+        :return:
+        """
+        if self.checkpoint is not None:
+            self.checkpoint.discover(url, depth)
+
+    def add_bytes(self, size: int):
+        """
+        Counts downloaded bytes against the budget
+        :param size:
+        :return:
+        """
+        self._total_bytes += size
+        if self.checkpoint is not None:
+            self.checkpoint.total_bytes = self._total_bytes
+        max_total_bytes = self.budget.max_total_bytes
+        if max_total_bytes is not None and self._total_bytes >= max_total_bytes:
+            self.truncate("max_total_bytes", stop=True)
+
+    async def add_page(self, url: str, links: List[str]):
+        """
+        Records the links of a crawled page
+        :param url:
+        :param links:
+        :return:
+        """
+        if self.keep_results:
+            self._links[self._intern(url)] = array(
+                "I", [self._intern(link) for link in links]
+            )
+        if self.on_result:
+            await self.on_result({"page": url, "links": links})
+
+    async def add_error(self, url: str, error: str):
+        """
+        Records the error of a page which could not be crawled
+        :param url:
+        :param error:
+        :return:
+        """
+        if self.keep_results:
+            self._errors[self._intern(url)] = error
+        if self.on_result:
+            await self.on_result({"page": url, "error": error})
+
+    @property
+    def sitemap(self) -> Dict[str, List[str]]:
+        """
+        :return: links of every crawled page
+        """
+        urls = self._urls
+        return {
+            urls[page]: [urls[link] for link in links]
+            for page, links in self._links.items()
+        }
+
+    @property
+    def errors(self) -> Dict[str, str]:
+        """
+        :return: error of every page which could not be crawled
+        """
+        return {self._urls[page]: error for page, error in self._errors.items()}
@@ -0,0 +1,248 @@
+"""
+Module to keep crawling polite, pacing and limiting the requests sent to every host.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator
+from urllib.parse import urlparse
+
+from config.constants import (
+    HOST_BURST,
+    HOST_CACHE_SIZE,
+    HOST_INITIAL_CONCURRENCY,
+    HOST_LATENCY_TARGET,
+    HOST_MAX_CONCURRENCY,
+    HOST_MAX_RETRY_AFTER,
+    HOST_RATE_LIMIT,
+    HOST_THROTTLE_BACKOFF,
+    ROBOTS_EXPIRY,
+    THROTTLE_STATUSES,
+)
+from helper.metrics import IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header, given either in seconds or as an HTTP date.
+
+    :param value: The header value.
+    :return: The seconds to wait or None if the header is missing or invalid.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HostLimiter:
+    """
+    Pacing of a single host. Requests are paced by a token bucket and capped by a
+    concurrency limit which grows additively while responses stay fast and is halved
+    on slow or throttled ones (AIMD). A throttled host is paused for its Retry-After.
+    """
+
+    def __init__(self):
+        self.rate = float(HOST_RATE_LIMIT)
+        self.burst = float(HOST_BURST)
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.limit = float(HOST_INITIAL_CONCURRENCY)
+        self.active = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        # the pacing of robots.txt holds as long as its rules are cached
+        self.crawl_delay_until: float | None = None
+        self.waiting = 0
+        self.changed = asyncio.Condition()
+
+    @property
+    def is_idle(self) -> bool:
+        """
+        :return: True if no request is sent or waiting and the host is not paused.
+        """
+        return (
+            not self.active
+            and not self.waiting
+            and self.paused_until <= time.monotonic()
+        )
+
+    def _refill(self, now: float):
+        elapsed = now - self.refilled_at
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.refilled_at = now
+
+    async def acquire(self):
+        """
+        Wait until the host may be sent another request.
+        """
+        async with self.changed:
+            self.waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    if (
+                        self.crawl_delay_until is not None
+                        and now >= self.crawl_delay_until
+                    ):
+                        self.set_crawl_delay(None)
+                    self._refill(now)
+                    wait = None
+                    if self.active < int(self.limit):
+                        wait = max(
+                            self.paused_until - now,
+                            (1 - self.tokens) / self.rate,
+                        )
+                        if wait <= 0:
+                            self.tokens -= 1
+                            self.active += 1
+                            return
+                    # woken up early when a request completes or the limit changes
+                    try:
+                        async with asyncio.timeout(wait):
+                            await self.changed.wait()
+                    except TimeoutError:
+                        pass
+            finally:
+                self.waiting -= 1
+
+    def set_crawl_delay(self, delay: float | None, ttl: float = ROBOTS_EXPIRY):
+        """
+        Space requests at least the delay apart, as asked by robots.txt.
+
+        :param delay: The seconds between two requests, None to pace the host as usual.
+        :param ttl: The seconds the delay holds for, until robots.txt is fetched again.
+        """
+        if delay is None:
+            self.rate = float(HOST_RATE_LIMIT)
+            self.burst = float(HOST_BURST)
+            self.crawl_delay_until = None
+            return
+        self.rate = min(float(HOST_RATE_LIMIT), 1 / delay)
+        self.burst = 1.0
+        self.tokens = min(self.tokens, self.burst)
+        self.crawl_delay_until = time.monotonic() + ttl
+
+    async def release(self):
+        """
+        Free the slot of a completed request.
+        """
+        async with self.changed:
+            self.active -= 1
+            self.changed.notify_all()
+
+    def observe(self, status: int, latency: float, retry_after: str | None) -> float:
+        """
+        Adapt the pacing of the host to a response.
+
+        :param status: The status code of the response.
+        :param latency: The seconds the response took to arrive.
+        :param retry_after: The Retry-After header of the response.
+        :return: The seconds the host is paused for, 0 if it was not throttled.
+        """
+        if status in THROTTLE_STATUSES:
+            self.throttled += 1
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = HOST_THROTTLE_BACKOFF * 2 ** (self.throttled - 1)
+            delay = min(delay, HOST_MAX_RETRY_AFTER)
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.limit = max(1.0, self.limit / 2)
+            return delay
+        self.throttled = 0
+        if latency > HOST_LATENCY_TARGET:
+            self.limit = max(1.0, self.limit / 2)
+        else:
+            # a whole slot is added once every slot saw a fast response
+            self.limit = min(HOST_MAX_CONCURRENCY, self.limit + 1 / self.limit)
+        return 0.0
+
+
+class HostSlot:
+    """
+    A request admitted by the scheduler, its response is fed back to the host pacing.
+    """
+
+    def __init__(self, limiter: HostLimiter):
+        self.limiter = limiter
+        self.started_at = time.monotonic()
+
+    def observe(self, status: int, retry_after: str | None = None) -> float:
+        """
+        :param status: The status code of the response.
+        :param retry_after: The Retry-After header of the response.
+        :return: The seconds the host is paused for, 0 if it was not throttled.
+        """
+        latency = time.monotonic() - self.started_at
+        return self.limiter.observe(status, latency, retry_after)
+
+
+class HostScheduler:
+    """
+    Admits requests to every host according to its own pacing, shared by every crawl
+    of the process. Past HOST_CACHE_SIZE hosts the least recently used idle ones are
+    forgotten.
+    """
+
+    # pacing of the hosts recently seen by this process, shared by every instance
+    _hosts: OrderedDict[str, HostLimiter] = OrderedDict()
+
+    def limiter(self, url: str) -> HostLimiter:
+        """
+        :param url: The url about to be fetched.
+        :return: The pacing of its host.
+        """
+        host = urlparse(url).netloc
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = HostLimiter()
+            self._evict()
+        else:
+            self._hosts.move_to_end(host)
+        return limiter
+
+    def _evict(self):
+        """
+        Forget idle hosts, least recently used first, while there are too many.
+        """
+        excess = len(self._hosts) - HOST_CACHE_SIZE
+        if excess <= 0:
+            return
+        now = time.monotonic()
+        idle = []
+        for host, limiter in self._hosts.items():
+            if len(idle) == excess:
+                break
+            # a crawl delay is forgotten once robots.txt would be fetched again
+            if limiter.is_idle and (limiter.crawl_delay_until or 0) <= now:
+                idle.append(host)
+        for host in idle:
+            del self._hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[HostSlot]:
+        """
+        Wait for the host of the url to accept another request and hold its slot.
+
+        :param url: The url about to be fetched.
+        :return: The slot, its observe method is called with the response.
+        """
+        limiter = self.limiter(url)
+        await limiter.acquire()
+        try:
+            with IN_FLIGHT.labels(kind="fetch").track_inprogress():
+                yield HostSlot(limiter)
+        finally:
+            await limiter.release()
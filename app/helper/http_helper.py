@@ -0,0 +1,111 @@
+"""
+Module to manage the shared HTTP client session used for crawling.
+"""
+
+import logging
+
+import aiohttp
+
+from config.constants import (
+    DNS_CACHE_TTL,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_SIZE_PER_HOST,
+    HTTP_TOTAL_TIMEOUT,
+    USER_AGENT,
+)
+from helper.metrics import trace_config
+
+logger = logging.getLogger(__name__)
+
+
+class FetchError(Exception):
+    """Raised when a page can not be fetched"""
+
+
+class HttpStatusError(FetchError):
+    """Raised when a page is answered with an unexpected status code"""
+
+    def __init__(self, status: int):
+        super().__init__(f"Failed with status code {status}")
+        self.status = status
+
+
+class HttpHelper:
+    """
+    Helper class holding a pooled aiohttp session for the lifetime of the app.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        """
+        Initialize the HTTP session holder.
+        """
+        if not hasattr(self, "session"):
+            self.session = None
+
+    async def connect(self):
+        """
+        Create the pooled client session, connections are kept alive and reused across crawls.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_SIZE,
+            limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+            use_dns_cache=True,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=HTTP_TOTAL_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"User-Agent": USER_AGENT},
+            trace_configs=[trace_config()],
+        )
+        logger.info("HTTP session created successfully.")
+
+    async def __aenter__(self):
+        if self.session is None or self.session.closed:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Close the session along with its pooled connections.
+        """
+        if self.session:
+            await self.session.close()
+            self.session = None
+            logger.info("HTTP session closed.")
+
+    def get(self, url: str, **kwargs):
+        """
+        Issue a GET request through the shared session.
+
+        :param url: The URL to fetch.
+        :param kwargs: Extra arguments forwarded to aiohttp.
+        :return: The request context manager.
+        """
+        return self.session.get(url, **kwargs)
+
+    def head(self, url: str, **kwargs):
+        """
+        Issue a HEAD request through the shared session.
+
+        :param url: The URL to check.
+        :param kwargs: Extra arguments forwarded to aiohttp.
+        :return: The request context manager.
+        """
+        return self.session.head(url, **kwargs)
@@ -0,0 +1,174 @@
+"""
+Module to extract links from HTML incrementally, as the page is being downloaded.
+"""
+
+import codecs
+import logging
+import time
+from html.parser import HTMLParser
+from typing import List
+from urllib.parse import urljoin
+
+from config.constants import (
+    INLINE_PARSE_MAX_SIZE,
+    MAX_PAGE_SIZE,
+    PAGE_CHUNK_SIZE,
+)
+from helper.content_filter import is_allowed_extension
+from helper.metrics import STAGE_SECONDS
+from helper.parse_executor import ParseExecutor
+from helper.url_normalizer import canonicalize
+
+logger = logging.getLogger(__name__)
+
+
+class LinkExtractor(HTMLParser):
+    """
+    Incremental HTML parser collecting the absolute links of every href attribute.
+    Content of <script>/<style> and comments never produce links.
+    """
+
+    def __init__(self, base_url: str):
+        """
+        :param base_url: The URL of the page, links are resolved against it.
+        """
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.links: List[str] = []
+        self._base_seen = False
+
+    def handle_starttag(self, tag, attrs):
+        """
+        Collects the href of the tag, the first <base href> changes how links are resolved.
+        :param tag:
+        :param attrs:
+        :return:
+        """
+        for name, value in attrs:
+            if name != "href" or value is None:
+                continue
+            if tag == "base" and not self._base_seen:
+                self._base_seen = True
+                self.base_url = urljoin(self.base_url, value.strip())
+            self.add_link(value.strip())
+
+    def add_link(self, link: str):
+        """
+        Resolves the link into an absolute URL without query params and fragment identifier.
+        :param link:
+        :return:
+        """
+        full_url = urljoin(self.base_url, link)
+        full_url = canonicalize(full_url.partition("#")[0].partition("?")[0])
+        # remove links to images,css etc.
+        if is_allowed_extension(full_url):
+            self.links.append(full_url)
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """
+    Extracts links from a complete HTML document
+
+    :param html: The HTML document.
+    :param base_url: The URL of the page.
+    :return: The absolute links of the page.
+    """
+    extractor = LinkExtractor(base_url)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.links
+
+
+def extract_links_from_bytes(body: bytes, base_url: str, charset: str) -> List[str]:
+    """
+    Extracts links from a complete undecoded HTML document, used by process pools
+
+    :param body: The HTML document.
+    :param base_url: The URL of the page.
+    :param charset: The encoding of the document.
+    :return: The absolute links of the page.
+    """
+    return extract_links(body.decode(charset, errors="replace"), base_url)
+
+
+async def extract_links_from_response(
+    response, base_url: str, max_size: int = MAX_PAGE_SIZE
+) -> List[str]:
+    """
+    Extracts links while the body is streamed, without holding the whole page in memory.
+    Small pages are parsed on the event loop, bigger ones on the parse executor.
+
+    :param response: The aiohttp response.
+    :param base_url: The URL of the page.
+    :param max_size: The body is not read any further past these many bytes.
+    :return: The absolute links of the page.
+    """
+    charset = response.charset or "utf-8"
+    try:
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    except LookupError:
+        charset = "utf-8"
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    executor = ParseExecutor()
+    is_small = (
+        response.content_length is not None
+        and response.content_length <= INLINE_PARSE_MAX_SIZE
+    )
+    started = time.perf_counter()
+    if not is_small and executor.is_process_pool:
+        # state of the parser can not be shared with another process, hand over the whole page
+        body = bytearray()
+        async for chunk in read_chunks(response, base_url, max_size):
+            body.extend(chunk)
+        parse_started = time.perf_counter()
+        links = await executor.run(
+            extract_links_from_bytes, bytes(body), base_url, charset
+        )
+        observe_body_stages(started, time.perf_counter() - parse_started)
+        return links
+    extractor = LinkExtractor(base_url)
+    parse_seconds = 0.0
+    async for chunk in read_chunks(response, base_url, max_size):
+        parse_started = time.perf_counter()
+        if is_small:
+            extractor.feed(decoder.decode(chunk))
+        else:
+            await executor.run(extractor.feed, decoder.decode(chunk))
+        parse_seconds += time.perf_counter() - parse_started
+    extractor.feed(decoder.decode(b"", final=True))
+    extractor.close()
+    observe_body_stages(started, parse_seconds)
+    return extractor.links
+
+
+def observe_body_stages(started: float, parse_seconds: float):
+    """
+    Records the time spent downloading and parsing the body, which are interleaved.
+
+    :param started: The time the body started to be read at.
+    :param parse_seconds: The time spent parsing it.
+    """
+    STAGE_SECONDS.labels(stage="parse").observe(parse_seconds)
+    STAGE_SECONDS.labels(stage="download").observe(
+        time.perf_counter() - started - parse_seconds
+    )
+
+
+async def read_chunks(response, base_url: str, max_size: int):
+    """
+    Streams the body of the response in chunks, stopping past the max size.
+
+    :param response: The aiohttp response.
+    :param base_url: The URL of the page.
+    :param max_size: The body is not read any further past these many bytes.
+    :return: An async iterator of chunks.
+    """
+    size = 0
+    async for chunk in response.content.iter_chunked(PAGE_CHUNK_SIZE):
+        size += len(chunk)
+        yield chunk
+        if size >= max_size:
+            logger.warning(
+                f"Page {base_url} is larger than {max_size} bytes, truncated"
+            )
+            break
@@ -0,0 +1,120 @@
+"""
+Module holding an in-process cache kept in front of Redis for hot values.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable
+
+
+class LocalCache:
+    # pylint: disable=too-many-instance-attributes
+    """
+    Size-bounded LRU cache whose entries expire after a TTL. Reading a value refreshes
+    its position but not its expiry. Every invalidation bumps a generation, a value read
+    from Redis is not stored if its key was invalidated since the read started.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: The number of values kept, least recently used ones are evicted.
+        :param ttl: Seconds a value is served for.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        # bumped by every invalidation, read before a value is fetched from Redis
+        self.generation = 0
+        # generation of the latest invalidation of the recently invalidated keys
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        # latest generation no longer tracked per key, every key counts as invalidated
+        self._forgotten = 0
+
+    def get(self, key: str) -> Any | None:
+        """
+        :param key: The key.
+        :return: The value, or None if it is missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: float | None = None,
+        generation: int | None = None,
+    ) -> None:
+        """
+        :param key: The key.
+        :param value: The value.
+        :param ttl: Seconds the value is served for, capped by the TTL of the cache.
+        :param generation: The generation when the value was read, it is not stored if
+            the key was invalidated since.
+        """
+        if self.max_size <= 0:
+            return
+        if generation is not None and self.is_invalidated(key, generation):
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def is_invalidated(self, key: str, generation: int) -> bool:
+        """
+        :param key: The key.
+        :param generation: The generation when a read of the key started.
+        :return: True if the key may have been invalidated since.
+        """
+        return max(self._forgotten, self._invalidated.get(key, 0)) > generation
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        """
+        :param keys: The keys to drop.
+        """
+        self.generation += 1
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+            self._invalidated[key] = self.generation
+            self._invalidated.move_to_end(key)
+        while len(self._invalidated) > max(self.max_size, 0):
+            _, generation = self._invalidated.popitem(last=False)
+            self._forgotten = max(self._forgotten, generation)
+
+    def clear(self) -> None:
+        """
+        Drop every value.
+        """
+        self.generation += 1
+        self._forgotten = self.generation
+        self._invalidated.clear()
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int | float]:
+        """
+        :return: The size of the cache and its hit rate since the process started.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,161 @@
+"""
+Module holding the Prometheus metrics of the crawler along with the hooks recording them.
+Processes of a multi-worker server share their metrics through PROMETHEUS_MULTIPROC_DIR.
+"""
+
+import functools
+import os
+import time
+from types import SimpleNamespace
+
+import aiohttp
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# seconds, from a cached redis read to a slow page
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+)
+
+STAGE_SECONDS = Histogram(
+    "webcrawler_stage_duration_seconds",
+    "Time spent in each stage of fetching a page: dns, connect, first_byte, download "
+    "and parse",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+REDIS_SECONDS = Histogram(
+    "webcrawler_redis_duration_seconds",
+    "Latency of redis operations",
+    ["op"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "webcrawler_request_duration_seconds",
+    "Latency of the api requests served",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "webcrawler_in_flight",
+    "Api requests being served and pages being fetched",
+    ["kind"],
+    multiprocess_mode="livesum",
+)
+PAGES = Counter(
+    "webcrawler_pages",
+    "Pages crawled, by where their links came from",
+    ["source"],
+)
+BYTES_DOWNLOADED = Counter(
+    "webcrawler_downloaded_bytes",
+    "Bytes of page bodies downloaded",
+)
+RETRIES = Counter(
+    "webcrawler_fetch_retries",
+    "Fetches sent again after a transient failure",
+)
+CIRCUIT_REJECTIONS = Counter(
+    "webcrawler_circuit_rejections",
+    "Fetches failed fast because their host is down",
+)
+CACHE_LOOKUPS = Counter(
+    "webcrawler_cache_lookups",
+    "Lookups of the links of pages, by cache tier and result",
+    ["tier", "result"],
+)
+
+
+def observe_redis(func):
+    """
+    Decorator recording the latency of a RedisHelper method under its name.
+
+    :param func: The coroutine function.
+    :return: The wrapped coroutine function.
+    """
+    histogram = REDIS_SECONDS.labels(op=func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with histogram.time():
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+def _elapsed(context: SimpleNamespace, name: str) -> float:
+    return time.perf_counter() - getattr(context, name)
+
+
+async def _on_dns_start(_session, context, _params):
+    context.dns_started = time.perf_counter()
+
+
+async def _on_dns_end(_session, context, _params):
+    STAGE_SECONDS.labels(stage="dns").observe(_elapsed(context, "dns_started"))
+
+
+async def _on_connect_start(_session, context, _params):
+    context.connect_started = time.perf_counter()
+
+
+async def _on_connect_end(_session, context, _params):
+    STAGE_SECONDS.labels(stage="connect").observe(_elapsed(context, "connect_started"))
+
+
+async def _on_request_start(_session, context, _params):
+    context.request_started = time.perf_counter()
+
+
+async def _on_request_end(_session, context, _params):
+    # fired once the headers of the response are received
+    STAGE_SECONDS.labels(stage="first_byte").observe(
+        _elapsed(context, "request_started")
+    )
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """
+    :return: Hooks of an aiohttp session timing dns, connect and first byte.
+    """
+    config = aiohttp.TraceConfig()
+    config.on_dns_resolvehost_start.append(_on_dns_start)
+    config.on_dns_resolvehost_end.append(_on_dns_end)
+    config.on_connection_create_start.append(_on_connect_start)
+    config.on_connection_create_end.append(_on_connect_end)
+    config.on_request_start.append(_on_request_start)
+    config.on_request_end.append(_on_request_end)
+    return config
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    :return: The metrics of every worker process in the text format, with its media type.
+    """
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,529 @@
+"""
+Module holding a persistent store of values on local disk, outliving the expiry of redis.
+Values are appended to a segment file and found through a hash index on url hashes kept
+in a memory-mapped file, so that a lookup costs a probe in memory and a single read.
+Worker processes of a pod share the store, writes are serialized by a file lock. Files
+are read and written on a thread of the store, off the event loop.
+"""
+
+import asyncio
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from hashlib import blake2b
+from typing import Any, Callable, Iterator, List, Tuple
+
+from config.constants import (
+    PAGE_STORE_COMPACT_MIN_RECORDS,
+    PAGE_STORE_COMPACT_RATIO,
+    PAGE_STORE_INDEX_CAPACITY,
+    PAGE_STORE_MAX_LOAD,
+    PAGE_STORE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+# id of the segment, the index is rebuilt when it was written for another segment
+SEGMENT_HEADER = struct.Struct("<8s8s")
+SEGMENT_MAGIC = b"WCPSEG01"
+# crc of the rest of the record, hash, key size, value size and the time it was stored
+RECORD_HEADER = struct.Struct("<IQIId")
+# segment indexed, slots, keys, size of the segment indexed and records it holds
+INDEX_HEADER = struct.Struct("<8s8sQQQQ")
+INDEX_MAGIC = b"WCPIDX02"
+# hash of the key and offset of its latest record plus one, zero for an empty slot
+SLOT = struct.Struct("<QQ")
+
+
+def key_hash(key: bytes) -> int:
+    """
+    :param key: The key.
+    :return: A non-zero 64-bit hash of the key.
+    """
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), "little") or 1
+
+
+class PageStore:
+    """
+    Append-only store of values by key. Storing a key again appends a new record, older
+    records are dropped by compact, which runs on its own once PAGE_STORE_COMPACT_RATIO
+    of the records are superseded.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, path: str | None = PAGE_STORE_PATH):
+        """
+        :param path: The directory of the store, the store is disabled when None.
+        """
+        if not hasattr(self, "path"):
+            self.path = path
+            self._lock_fd = None
+            self._segment_fd = None
+            self._segment_ino = None
+            self._index_fd = None
+            self._index_ino = None
+            self._index = None
+            self._executor = None
+
+    @property
+    def is_open(self) -> bool:
+        """
+        :return: True if the store is enabled and open.
+        """
+        return self._lock_fd is not None
+
+    def __enter__(self):
+        if self.path and not self.is_open:
+            self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def segment_path(self) -> str:
+        """
+        :return: The path of the file records are appended to.
+        """
+        return os.path.join(self.path, "pages.seg")
+
+    @property
+    def index_path(self) -> str:
+        """
+        :return: The path of the memory-mapped index.
+        """
+        return os.path.join(self.path, "pages.idx")
+
+    def open(self):
+        """
+        Open the store, creating it if needed. Records appended after the index was last
+        written, by a process which died, are indexed again.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        self._lock_fd = os.open(
+            os.path.join(self.path, "pages.lock"), os.O_RDWR | os.O_CREAT
+        )
+        with self._locked(fcntl.LOCK_EX):
+            pass
+        # a single thread, the files and the index are not shared between threads
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="page-store"
+        )
+        logger.info(f"Page store opened at {self.path}.")
+
+    def close(self):
+        """
+        Close the files of the store.
+        """
+        if not self.is_open:
+            return
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+        self._close_files()
+        os.close(self._lock_fd)
+        self._lock_fd = None
+        logger.info("Page store closed.")
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Run a method of the store on its thread, or inline when the store is closed.
+
+        :param func: The method to run, such as get or put.
+        :param args: Arguments of the method.
+        :return: The result of the method.
+        """
+        if self._executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, func, *args
+        )
+
+    def _close_files(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+        for fd in (self._segment_fd, self._index_fd):
+            if fd is not None:
+                os.close(fd)
+        self._segment_fd = self._index_fd = None
+        self._segment_ino = self._index_ino = None
+
+    @contextmanager
+    def _locked(self, operation: int):
+        """
+        Hold the file lock, reopening files another process replaced.
+
+        :param operation: fcntl.LOCK_SH to read or fcntl.LOCK_EX to write.
+        """
+        fcntl.flock(self._lock_fd, operation)
+        try:
+            if self._is_stale():
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+                self._reopen()
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _inode(path: str) -> int | None:
+        try:
+            return os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def _is_stale(self) -> bool:
+        return (
+            self._index is None
+            or self._inode(self.segment_path) != self._segment_ino
+            or self._inode(self.index_path) != self._index_ino
+        )
+
+    def _reopen(self):
+        self._close_files()
+        if not os.path.exists(self.segment_path):
+            self._write_file(
+                self.segment_path, SEGMENT_HEADER.pack(SEGMENT_MAGIC, os.urandom(8))
+            )
+        self._segment_fd = os.open(self.segment_path, os.O_RDWR | os.O_APPEND)
+        self._segment_ino = os.fstat(self._segment_fd).st_ino
+        magic, segment_id = SEGMENT_HEADER.unpack(
+            os.pread(self._segment_fd, SEGMENT_HEADER.size, 0)
+        )
+        if magic != SEGMENT_MAGIC:
+            raise ValueError(f"{self.segment_path} is not a page store segment")
+        if not self._map_index(segment_id):
+            if os.path.exists(self.index_path):
+                logger.warning(
+                    "Page store index does not match its segment, rebuilding."
+                )
+            self._write_index(
+                self.index_path, segment_id, PAGE_STORE_INDEX_CAPACITY, []
+            )
+            self._map_index(segment_id)
+        self._index_tail()
+
+    @staticmethod
+    def _write_file(path: str, content: bytes):
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(content)
+        os.replace(temporary, path)
+
+    def _map_index(self, segment_id: bytes) -> bool:
+        """
+        :return: False if the index is missing or was written for another segment.
+        """
+        if not os.path.exists(self.index_path):
+            return False
+        self._index_fd = os.open(self.index_path, os.O_RDWR)
+        self._index_ino = os.fstat(self._index_fd).st_ino
+        self._index = mmap.mmap(self._index_fd, 0)
+        magic, indexed_segment, capacity, *_ = INDEX_HEADER.unpack_from(self._index)
+        if (
+            magic == INDEX_MAGIC
+            and indexed_segment == segment_id
+            and len(self._index) == INDEX_HEADER.size + capacity * SLOT.size
+        ):
+            return True
+        self._index.close()
+        os.close(self._index_fd)
+        self._index = self._index_fd = self._index_ino = None
+        return False
+
+    def _write_index(
+        self,
+        path: str,
+        segment_id: bytes,
+        capacity: int,
+        entries: List[Tuple[int, int]],
+        indexed_size: int = SEGMENT_HEADER.size,
+        records: int | None = None,
+    ):
+        """
+        Write an index holding the entries, without duplicate hashes.
+
+        :param capacity: The slots of the index, a power of two.
+        :param entries: Hashes and record offsets plus one.
+        :param indexed_size: The size of the segment the entries cover.
+        :param records: The records of that part of the segment, one per entry if None.
+        """
+        slots = bytearray(capacity * SLOT.size)
+        mask = capacity - 1
+        for entry_hash, offset in entries:
+            slot = entry_hash & mask
+            while SLOT.unpack_from(slots, slot * SLOT.size)[0]:
+                slot = (slot + 1) & mask
+            SLOT.pack_into(slots, slot * SLOT.size, entry_hash, offset)
+        records = len(entries) if records is None else records
+        header = INDEX_HEADER.pack(
+            INDEX_MAGIC, segment_id, capacity, len(entries), indexed_size, records
+        )
+        self._write_file(path, header + slots)
+
+    def _header(self) -> Tuple[bytes, int, int, int]:
+        _, segment_id, capacity, count, indexed_size, _ = INDEX_HEADER.unpack_from(
+            self._index
+        )
+        return segment_id, capacity, count, indexed_size
+
+    def _records(self) -> int:
+        return INDEX_HEADER.unpack_from(self._index)[5]
+
+    def _set_header(self, count: int, indexed_size: int, records: int | None = None):
+        segment_id, capacity, _, _ = self._header()
+        records = self._records() if records is None else records
+        INDEX_HEADER.pack_into(
+            self._index,
+            0,
+            INDEX_MAGIC,
+            segment_id,
+            capacity,
+            count,
+            indexed_size,
+            records,
+        )
+
+    def _dead_ratio(self) -> float:
+        """
+        :return: The share of the records superseded by a later one of their key.
+        """
+        records = self._records()
+        return 1 - self._header()[2] / records if records else 0.0
+
+    def _index_tail(self):
+        """
+        Index the records appended past the indexed size, a torn record is cut off.
+        """
+        offset = self._header()[3]
+        size = os.fstat(self._segment_fd).st_size
+        while offset < size:
+            record = self._read_record(offset)
+            if record is None:
+                logger.warning(f"Page store segment is torn at {offset}, truncating.")
+                os.truncate(self.segment_path, offset)
+                break
+            key, _, _, record_size = record
+            self._insert(key, offset)
+            offset += record_size
+        _, _, count, _ = self._header()
+        self._set_header(count, offset)
+
+    def _read_record(self, offset: int) -> Tuple[bytes, bytes, float, int] | None:
+        """
+        :return: The key, value, time stored and size of the record, None if it is torn.
+        """
+        header = os.pread(self._segment_fd, RECORD_HEADER.size, offset)
+        if len(header) < RECORD_HEADER.size:
+            return None
+        crc, _, key_size, value_size, stored_at = RECORD_HEADER.unpack(header)
+        body = os.pread(
+            self._segment_fd, key_size + value_size, offset + RECORD_HEADER.size
+        )
+        if len(body) < key_size + value_size or crc != zlib.crc32(header[4:] + body):
+            return None
+        size = RECORD_HEADER.size + key_size + value_size
+        return body[:key_size], body[key_size:], stored_at, size
+
+    def _read_key(self, offset: int) -> bytes:
+        """
+        :return: The key of the record, without reading its value.
+        """
+        header = os.pread(self._segment_fd, RECORD_HEADER.size, offset)
+        key_size = RECORD_HEADER.unpack(header)[2]
+        return os.pread(self._segment_fd, key_size, offset + RECORD_HEADER.size)
+
+    def _find(self, key: bytes, entry_hash: int) -> Tuple[int, int]:
+        """
+        :return: The slot of the key or the empty slot it would take, and its offset plus
+            one, zero if the key is missing.
+        """
+        _, capacity, _, _ = self._header()
+        mask = capacity - 1
+        slot = entry_hash & mask
+        while True:
+            slot_hash, offset = SLOT.unpack_from(
+                self._index, INDEX_HEADER.size + slot * SLOT.size
+            )
+            if not slot_hash:
+                return slot, 0
+            if slot_hash == entry_hash and self._read_key(offset - 1) == key:
+                # hashes of different keys may collide, the key of the record decides
+                return slot, offset
+            slot = (slot + 1) & mask
+
+    def _insert(self, key: bytes, offset: int):
+        segment_id, capacity, count, _ = self._header()
+        if count + 1 > capacity * PAGE_STORE_MAX_LOAD:
+            self._grow(segment_id, capacity * 2)
+        entry_hash = key_hash(key)
+        slot, previous = self._find(key, entry_hash)
+        SLOT.pack_into(
+            self._index, INDEX_HEADER.size + slot * SLOT.size, entry_hash, offset + 1
+        )
+        _, _, count, indexed_size = self._header()
+        self._set_header(
+            count if previous else count + 1, indexed_size, self._records() + 1
+        )
+
+    def _entries(self) -> List[Tuple[int, int]]:
+        _, capacity, _, _ = self._header()
+        entries = []
+        for slot in range(capacity):
+            entry = SLOT.unpack_from(self._index, INDEX_HEADER.size + slot * SLOT.size)
+            if entry[0]:
+                entries.append(entry)
+        return entries
+
+    def _grow(self, segment_id: bytes, capacity: int):
+        """
+        Rehash the index into one of the capacity, hashes are kept so records are not read.
+        """
+        _, _, _, indexed_size = self._header()
+        records = self._records()
+        self._write_index(
+            self.index_path, segment_id, capacity, self._entries(), records=records
+        )
+        self._index.close()
+        os.close(self._index_fd)
+        self._map_index(segment_id)
+        _, _, count, _ = self._header()
+        self._set_header(count, indexed_size, records)
+
+    def get(self, key: str) -> Tuple[bytes, float] | None:
+        """
+        :param key: The key.
+        :return: The latest value of the key and the time it was stored, None if missing.
+        """
+        if not self.is_open:
+            return None
+        encoded = key.encode("utf-8")
+        with self._locked(fcntl.LOCK_SH):
+            _, offset = self._find(encoded, key_hash(encoded))
+            if not offset:
+                return None
+            record = self._read_record(offset - 1)
+        if record is None:
+            return None
+        return record[1], record[2]
+
+    def get_many(self, keys: List[str]) -> List[Tuple[bytes, float] | None]:
+        """
+        :param keys: The keys.
+        :return: The latest value of every key and the time it was stored, in the order
+            of the keys, None for every missing key.
+        """
+        if not self.is_open:
+            return [None] * len(keys)
+        values = []
+        with self._locked(fcntl.LOCK_SH):
+            for key in keys:
+                encoded = key.encode("utf-8")
+                _, offset = self._find(encoded, key_hash(encoded))
+                record = self._read_record(offset - 1) if offset else None
+                values.append(None if record is None else (record[1], record[2]))
+        return values
+
+    def put(self, key: str, value: bytes, stored_at: float | None = None):
+        """
+        :param key: The key.
+        :param value: The value.
+        :param stored_at: The time the value was learned, defaults to now.
+        """
+        if not self.is_open:
+            return
+        encoded = key.encode("utf-8")
+        stored_at = time.time() if stored_at is None else stored_at
+        header = RECORD_HEADER.pack(
+            0, key_hash(encoded), len(encoded), len(value), stored_at
+        )
+        crc = zlib.crc32(header[4:] + encoded + value)
+        record = struct.pack("<I", crc) + header[4:] + encoded + value
+        with self._locked(fcntl.LOCK_EX):
+            self._index_tail()
+            offset = os.fstat(self._segment_fd).st_size
+            os.write(self._segment_fd, record)
+            self._insert(encoded, offset)
+            _, _, count, _ = self._header()
+            self._set_header(count, offset + len(record))
+            wasteful = (
+                self._records() >= PAGE_STORE_COMPACT_MIN_RECORDS
+                and self._dead_ratio() >= PAGE_STORE_COMPACT_RATIO
+            )
+        if wasteful:
+            self.compact(PAGE_STORE_COMPACT_RATIO)
+
+    def items(self, prefix: str = "") -> Iterator[Tuple[str, bytes, float]]:
+        """
+        The latest record of every key, in the order they were stored. Records stored
+        while iterating may be missed.
+
+        :param prefix: Only keys starting with it are returned.
+        :return: An iterator of keys, values and the time they were stored.
+        """
+        if not self.is_open:
+            return
+        with self._locked(fcntl.LOCK_SH):
+            offsets = sorted(offset - 1 for _, offset in self._entries())
+            # records of a segment replaced meanwhile stay readable through its fd
+            segment_fd = os.dup(self._segment_fd)
+        encoded_prefix = prefix.encode("utf-8")
+        try:
+            for offset in offsets:
+                header = os.pread(segment_fd, RECORD_HEADER.size, offset)
+                _, _, key_size, value_size, stored_at = RECORD_HEADER.unpack(header)
+                key = os.pread(segment_fd, key_size, offset + RECORD_HEADER.size)
+                if not key.startswith(encoded_prefix):
+                    continue
+                value = os.pread(
+                    segment_fd, value_size, offset + RECORD_HEADER.size + key_size
+                )
+                yield key.decode("utf-8"), value, stored_at
+        finally:
+            os.close(segment_fd)
+
+    def compact(self, min_dead_ratio: float = 0.0):
+        """
+        Rewrite the segment with the latest record of every key only.
+
+        :param min_dead_ratio: Skip it unless this share of the records is superseded,
+            another process may have compacted the store meanwhile.
+        """
+        if not self.is_open:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            self._index_tail()
+            if min_dead_ratio and self._dead_ratio() < min_dead_ratio:
+                return
+            segment_id = os.urandom(8)
+            entries = []
+            temporary = f"{self.segment_path}.tmp"
+            with open(temporary, "wb") as segment:
+                segment.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, segment_id))
+                for entry_hash, offset in sorted(self._entries(), key=lambda e: e[1]):
+                    record = self._read_record(offset - 1)
+                    if record is None:
+                        continue
+                    entries.append((entry_hash, segment.tell() + 1))
+                    segment.write(os.pread(self._segment_fd, record[3], offset - 1))
+                size = segment.tell()
+            _, capacity, _, _ = self._header()
+            self._write_index(
+                f"{self.index_path}.new", segment_id, capacity, entries, size
+            )
+            os.replace(temporary, self.segment_path)
+            # a crash here leaves an index of another segment, it is then rebuilt
+            os.replace(f"{self.index_path}.new", self.index_path)
+            self._reopen()
+            logger.info(f"Page store compacted to {len(entries)} records.")
@@ -0,0 +1,93 @@
+"""
+Module to manage the executor CPU bound parsing is offloaded to, keeping the event loop free.
+"""
+
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from config.constants import PARSE_EXECUTOR, PARSE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+class ParseExecutor:
+    """
+    Helper class holding the thread or process pool used for parsing pages.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __init__(self, kind: str = PARSE_EXECUTOR, workers: int | None = PARSE_WORKERS):
+        """
+        :param kind: One of "inline", "thread" or "process".
+        :param workers: Size of the pool, defaults to the number of cores.
+        """
+        if not hasattr(self, "executor"):
+            self.kind = kind
+            self.workers = workers or os.cpu_count() or 1
+            self.executor: Executor | None = None
+
+    def start(self):
+        """
+        Create the pool if parsing is not done inline.
+        """
+        if self.executor is not None or self.kind == "inline":
+            return
+        if self.kind == "process":
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="parser"
+            )
+        logger.info(f"Started {self.kind} parse executor with {self.workers} workers.")
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Shut the pool down, waiting for running jobs.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+            logger.info("Parse executor shut down.")
+
+    @property
+    def is_inline(self) -> bool:
+        """
+        :return: True if parsing happens on the event loop.
+        """
+        return self.executor is None
+
+    @property
+    def is_process_pool(self) -> bool:
+        """
+        :return: True if parsing happens in other processes, arguments have to be picklable.
+        """
+        return isinstance(self.executor, ProcessPoolExecutor)
+
+    async def run(self, func, *args):
+        """
+        Run the function on the pool, or inline when no pool is running.
+
+        :param func: The function to run.
+        :param args: Arguments of the function.
+        :return: The result of the function.
+        """
+        if self.executor is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, func, *args
+        )
@@ -0,0 +1,276 @@
+"""
+Module holding a crawl frontier kept in Redis, shared by the workers of every pod.
+"""
+
+import json
+import logging
+from typing import Dict, List, Set
+
+from config.constants import (
+    FRONTIER_EXPIRY,
+    FRONTIER_HEARTBEAT_TIMEOUT,
+    FRONTIER_LEASE_TIMEOUT,
+)
+from helper.redis_helper import RedisHelper
+
+logger = logging.getLogger(__name__)
+
+# ids of the active crawls scored by the last heartbeat of their coordinator, older
+# versions kept them in a set without expiry at "frontier:active"
+ACTIVE_CRAWLS_KEY = "frontier:active-crawls"
+
+# KEYS: active | ARGV: crawl id
+HEARTBEAT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+return redis.call('ZADD', KEYS[1], now, ARGV[1])
+"""
+
+# KEYS: active | ARGV: heartbeat timeout
+# drop the crawls whose coordinator is gone then list the others
+ACTIVE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[1]))
+return redis.call('ZRANGE', KEYS[1], 0, -1)
+"""
+
+# KEYS: active | ARGV: heartbeat timeout, crawl id
+IS_ACTIVE_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local heartbeat = redis.call('ZSCORE', KEYS[1], ARGV[2])
+if heartbeat and tonumber(heartbeat) > now - tonumber(ARGV[1]) then
+    return 1
+end
+return 0
+"""
+
+# KEYS: active | ARGV: crawl id
+STOP_SCRIPT = """
+return redis.call('ZREM', KEYS[1], ARGV[1])
+"""
+
+# KEYS: active, visited, queue | ARGV: crawl id, ttl, urls...
+# enqueue the urls which were never seen before, unless the crawl stopped
+ADD_SCRIPT = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    -- keys of a stopped crawl may be cleared already, they are not created again
+    return 0
+end
+local added = 0
+for i = 3, #ARGV do
+    if redis.call('SADD', KEYS[2], ARGV[i]) == 1 then
+        redis.call('RPUSH', KEYS[3], ARGV[i])
+        added = added + 1
+    end
+end
+redis.call('EXPIRE', KEYS[2], ARGV[2])
+if added > 0 then
+    redis.call('EXPIRE', KEYS[3], ARGV[2])
+end
+return added
+"""
+
+# KEYS: queue, leases | ARGV: lease timeout
+# requeue urls whose lease expired then lease the next url of the queue
+CLAIM_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)
+for _, url in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], url)
+    redis.call('RPUSH', KEYS[1], url)
+end
+local url = redis.call('LPOP', KEYS[1])
+if url then
+    redis.call('ZADD', KEYS[2], now + tonumber(ARGV[1]), url)
+end
+return url
+"""
+
+# KEYS: active, leases, links, errors | ARGV: crawl id, ttl, url, links, error
+# release the lease of a url recording its links or its error, unless the crawl stopped
+COMPLETE_SCRIPT = """
+if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 0
+end
+if redis.call('ZREM', KEYS[2], ARGV[3]) == 0 then
+    -- lease expired and the url is handled by another worker
+    return 0
+end
+local key, value = KEYS[3], ARGV[4]
+if ARGV[5] ~= '' then
+    key, value = KEYS[4], ARGV[5]
+end
+redis.call('HSET', key, ARGV[3], value)
+redis.call('EXPIRE', key, ARGV[2])
+return 1
+"""
+
+# KEYS: queue, leases
+# count of urls waiting or being crawled
+PENDING_SCRIPT = """
+return redis.call('LLEN', KEYS[1]) + redis.call('ZCARD', KEYS[2])
+"""
+
+
+class RedisFrontier:
+    """
+    Queue of urls to crawl along with the visited set, both stored in Redis.
+    A claimed url is leased to its worker, the lease expires if the worker gets stuck
+    and the url is handed to another worker. The coordinator of the crawl heartbeats, a
+    crawl without a heartbeat for FRONTIER_HEARTBEAT_TIMEOUT is no longer active.
+    """
+
+    def __init__(self, crawl_id: str, redis_helper: RedisHelper | None = None):
+        """
+        :param crawl_id: The id of the crawl the frontier belongs to.
+        :param redis_helper: The redis helper, defaults to the shared one.
+        """
+        self.crawl_id = crawl_id
+        self.redis_helper = redis_helper or RedisHelper()
+        prefix = f"frontier:{crawl_id}"
+        self.meta_key = f"{prefix}:meta"
+        self.visited_key = f"{prefix}:visited"
+        self.queue_key = f"{prefix}:queue"
+        self.leases_key = f"{prefix}:leases"
+        self.links_key = f"{prefix}:links"
+        self.errors_key = f"{prefix}:errors"
+
+    @classmethod
+    async def active_crawl_ids(cls, redis_helper: RedisHelper) -> Set[str]:
+        """
+        :param redis_helper: The redis helper.
+        :return: The ids of the crawls workers may pull urls from.
+        """
+        crawl_ids = await redis_helper.run_script(
+            ACTIVE_SCRIPT, [ACTIVE_CRAWLS_KEY], [FRONTIER_HEARTBEAT_TIMEOUT]
+        )
+        return set(crawl_ids)
+
+    async def start(self, url: str, meta: Dict[str, str]):
+        """
+        Register the crawl, making it visible to the workers of every pod.
+
+        :param url: The root url.
+        :param meta: Options of the crawl shared with the workers.
+        """
+        await self.redis_helper.set_hash(self.meta_key, meta, FRONTIER_EXPIRY)
+        # urls are only added to active crawls
+        await self.heartbeat()
+        await self.add([url])
+
+    async def heartbeat(self):
+        """
+        Keep the crawl active, called by its coordinator while it waits for the crawl.
+        """
+        await self.redis_helper.run_script(
+            HEARTBEAT_SCRIPT, [ACTIVE_CRAWLS_KEY], [self.crawl_id]
+        )
+
+    async def stop(self):
+        """
+        Unregister the crawl, workers stop pulling urls from it.
+        """
+        await self.redis_helper.run_script(
+            STOP_SCRIPT, [ACTIVE_CRAWLS_KEY], [self.crawl_id]
+        )
+
+    async def is_active(self) -> bool:
+        """
+        :return: False once the crawl finished, was stopped by its coordinator or its
+            coordinator is gone.
+        """
+        active = await self.redis_helper.run_script(
+            IS_ACTIVE_SCRIPT,
+            [ACTIVE_CRAWLS_KEY],
+            [FRONTIER_HEARTBEAT_TIMEOUT, self.crawl_id],
+        )
+        return bool(active)
+
+    async def get_meta(self) -> Dict[str, str]:
+        """
+        :return: Options of the crawl, empty if the crawl expired.
+        """
+        return await self.redis_helper.get_hash(self.meta_key)
+
+    async def add(self, urls: List[str]) -> int:
+        """
+        Enqueue the urls which were never visited, nothing is enqueued once the crawl
+        stopped.
+
+        :param urls: The urls.
+        :return: The number of urls enqueued.
+        """
+        if not urls:
+            return 0
+        return await self.redis_helper.run_script(
+            ADD_SCRIPT,
+            [ACTIVE_CRAWLS_KEY, self.visited_key, self.queue_key],
+            [self.crawl_id, FRONTIER_EXPIRY, *urls],
+        )
+
+    async def claim(self) -> str | None:
+        """
+        Lease the next url of the queue.
+
+        :return: The url or None if the queue is empty.
+        """
+        return await self.redis_helper.run_script(
+            CLAIM_SCRIPT, [self.queue_key, self.leases_key], [FRONTIER_LEASE_TIMEOUT]
+        )
+
+    async def complete(
+        self, url: str, links: List[str] | None = None, error: str | None = None
+    ) -> bool:
+        """
+        Release the lease of a crawled url, recording its links or its error.
+
+        :param url: The url.
+        :param links: The links of the url.
+        :param error: The error if the url could not be crawled.
+        :return: False if the lease had already expired or the crawl stopped.
+        """
+        completed = await self.redis_helper.run_script(
+            COMPLETE_SCRIPT,
+            [ACTIVE_CRAWLS_KEY, self.leases_key, self.links_key, self.errors_key],
+            [
+                self.crawl_id,
+                FRONTIER_EXPIRY,
+                url,
+                json.dumps(links or [], separators=(",", ":")),
+                error or "",
+            ],
+        )
+        return bool(completed)
+
+    async def pending(self) -> int:
+        """
+        :return: The number of urls waiting in the queue or being crawled.
+        """
+        return await self.redis_helper.run_script(
+            PENDING_SCRIPT, [self.queue_key, self.leases_key], []
+        )
+
+    async def results(self) -> tuple[Dict[str, List[str]], Dict[str, str]]:
+        """
+        :return: The links of the crawled urls and the errors of the failed ones.
+        """
+        links = await self.redis_helper.get_hash(self.links_key)
+        errors = await self.redis_helper.get_hash(self.errors_key)
+        return {url: json.loads(value) for url, value in links.items()}, errors
+
+    async def clear(self):
+        """
+        Remove every key of the crawl.
+        """
+        for key in (
+            self.meta_key,
+            self.visited_key,
+            self.queue_key,
+            self.leases_key,
+            self.links_key,
+            self.errors_key,
+        ):
+            await self.redis_helper.remove_key(key)
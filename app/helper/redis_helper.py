@@ -2,12 +2,28 @@
 Module to manage Redis cache and provide an abstraction to its core functionalities.
 """
 
+import asyncio
 import logging
-from typing import List, Set, Union
+import time
+from itertools import islice
+from typing import Any, AsyncIterator, Dict, List, Set, Union
+from uuid import uuid4
 
 import redis.asyncio as redis
 
-from config.constants import CACHE_EXPIRY, REDIS_URL
+from config.constants import (
+    CACHE_EXPIRY,
+    LOCAL_CACHE_CHANNEL,
+    LOCAL_CACHE_INVALIDATION,
+    LOCAL_CACHE_SIZE,
+    LOCAL_CACHE_TTL,
+    READ_LEGACY_LINKS,
+    REDIS_URL,
+)
+from helper.cache_codec import LinksCodec, decode_links, encode_links, get_codec
+from helper.local_cache import LocalCache
+from helper.metrics import CACHE_LOOKUPS, REDIS_SECONDS, observe_redis
+from helper.page_store import PageStore
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +46,18 @@ class RedisHelper:
         """
         if not hasattr(self, "conn"):
             self.conn = None
+            # binary values such as encoded links are read without decoding
+            self.raw_conn = None
+            self.codec: LinksCodec = get_codec()
+            # links of hot pages are served without a round-trip to redis
+            self.local_cache = LocalCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+            self.redis_hits = self.redis_misses = 0
+            # pages past their expiry in redis, when PAGE_STORE_PATH is set
+            self.page_store = PageStore()
+            self.store_hits = self.store_misses = 0
+            # invalidations published by this process are ignored by it
+            self.instance_id = uuid4().hex
+            self._scripts = {}
 
     async def connect(self):
         """
@@ -39,6 +67,11 @@ class RedisHelper:
             self.conn = await redis.Redis.from_url(
                 REDIS_URL, encoding="utf-8", decode_responses=True
             )
+            self.raw_conn = await redis.Redis.from_url(REDIS_URL)
+            # invalidations published while disconnected were missed
+            self.local_cache.clear()
+            # scripts are registered against a connection
+            self._scripts = {}
             logger.info("Connected to Redis successfully.")
         except redis.RedisError as ex:
             logger.error(f"Error connecting to Redis: {ex}")
@@ -63,7 +96,9 @@ class RedisHelper:
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         if self.conn:
             await self.conn.close()
+            await self.raw_conn.close()
             self.conn = None
+            self.raw_conn = None
             logger.info("Redis connection closed.")
 
     async def close(self):
@@ -75,7 +110,11 @@ class RedisHelper:
         logger.info("Redis connection closed.")
 
     async def push_list_to_key(
-        self, key: str, values: List[str], ttl: int | None = CACHE_EXPIRY
+        self,
+        key: str,
+        values: List[str],
+        ttl: int | None = CACHE_EXPIRY,
+        replace: bool = False,
     ) -> None:
         """
         Store a list of values in a Redis list at the specified key and set TTL if provided.
@@ -83,15 +122,49 @@ class RedisHelper:
         :param key: The Redis key.
         :param values: A list of values to store.
         :param ttl: Optional time-to-live (TTL) in seconds. Defaults to CACHE_EXPIRY.
+        :param replace: Replace the existing list instead of appending to it.
         """
-        if not isinstance(values, list):
+        await self.push_lists_to_keys({key: values}, ttl, replace)
+
+    @observe_redis
+    async def push_lists_to_keys(
+        self,
+        mapping: Dict[str, List[str]],
+        ttl: int | None = CACHE_EXPIRY,
+        replace: bool = False,
+    ) -> None:
+        """
+        Store several lists and their TTL in a single transaction (one round-trip).
+
+        :param mapping: A dictionary of Redis key to the list of values to store.
+        :param ttl: Optional time-to-live (TTL) in seconds. Defaults to CACHE_EXPIRY.
+        :param replace: Replace the existing lists instead of appending to them.
+        """
+        if not all(isinstance(values, list) for values in mapping.values()):
             logger.error("Values must be a list.")
             return
-        await self.conn.rpush(key, *values)
-        await self.set_key_expiry(key, ttl)
-
+        if ttl is not None and ttl <= 0:
+            logger.error("TTL must be a positive integer.")
+            return
+        async with self.conn.pipeline(transaction=True) as pipe:
+            for key, values in mapping.items():
+                if replace:
+                    pipe.delete(key)
+                if not values:
+                    # redis can not hold an empty list
+                    continue
+                pipe.rpush(key, *values)
+                if ttl is not None:
+                    pipe.expire(key, ttl)
+            await pipe.execute()
+
+    @observe_redis
     async def set_key_value(
-        self, key: str, value: str, ttl: int | None = CACHE_EXPIRY
+        self,
+        key: str,
+        value: str,
+        ttl: int | None = CACHE_EXPIRY,
+        persist: bool = False,
     ) -> None:
         """
         Store a single value in Redis with the specified key and set TTL if provided.
@@ -99,10 +172,34 @@ class RedisHelper:
         :param key: The Redis key.
         :param value: The value to store.
         :param ttl: Optional time-to-live (TTL) in seconds. Defaults to CACHE_EXPIRY.
+        :param persist: Also keep the value in the page store, without expiry.
         """
-        await self.conn.set(key, value)
-        await self.set_key_expiry(key, ttl)
+        if ttl is not None and ttl <= 0:
+            logger.error("TTL must be a positive integer.")
+            return
+        await self.conn.set(key, value, ex=ttl)
+        if persist:
+            await self.page_store.run(self.page_store.put, key, value.encode("utf-8"))
+
+    @observe_redis
+    async def set_key_if_absent(
+        self, key: str, value: str, ttl: int | None = CACHE_EXPIRY
+    ) -> str | None:
+        """
+        Store a single value unless the key already exists, in a single round-trip.
+
+        :param key: The Redis key.
+        :param value: The value to store.
+        :param ttl: Optional time-to-live (TTL) in seconds. Defaults to CACHE_EXPIRY.
+        :return: The value held by the key afterwards, equal to value if it was stored.
+        """
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.set(key, value, ex=ttl, nx=True)
+            pipe.get(key)
+            _, current = await pipe.execute()
+        return current
 
+    @observe_redis
     async def set_key_expiry(self, key: str, ttl: int | None = None) -> None:
         """
         Set a time-to-live (TTL) for the specified key.
@@ -116,25 +213,280 @@ class RedisHelper:
                 return
             await self.conn.expire(key, ttl)
 
-    async def get_value_by_key(self, key: str) -> str | None:
+    @observe_redis
+    async def get_value_by_key(self, key: str, persist: bool = False) -> str | None:
         """
         Retrieve the value associated with the specified key.
 
         :param key: The Redis key.
+        :param persist: Fall back to the page store for values stored with persist.
         :return: The value as a string, or None if the key does not exist.
         """
-        return await self.conn.get(key)
+        value = await self.conn.get(key)
+        if value is None and persist:
+            record = await self.page_store.run(self.page_store.get, key)
+            if record is not None:
+                value = record[0].decode("utf-8")
+        return value
 
-    async def get_list_from_key(self, key: str) -> List[str]:
+    @observe_redis
+    async def get_list_from_key(
+        self, key: str, start: int = 0, end: int = -1
+    ) -> List[str]:
         """
         Retrieve the list of values stored at the specified key.
 
         :param key: The Redis key.
+        :param start: Index of the first value to retrieve. Defaults to the head of the list.
+        :param end: Index of the last value to retrieve (inclusive). Defaults to the tail.
         :return: A list of values as strings. Returns an empty list if the key does not exist.
         """
-        cached_list = await self.conn.lrange(key, 0, -1)
+        cached_list = await self.conn.lrange(key, start, end)
         return list(cached_list)
 
+    @observe_redis
+    async def get_list_length(self, key: str) -> int:
+        """
+        Retrieve the length of the list stored at the specified key.
+
+        :param key: The Redis key.
+        :return: The length of the list, 0 if the key does not exist.
+        """
+        return await self.conn.llen(key)
+
+    @observe_redis
+    async def get_lists_from_keys(self, keys: List[str]) -> List[List[str]]:
+        """
+        Retrieve the lists stored at several keys in a single pipelined round-trip.
+
+        :param keys: The Redis keys.
+        :return: The lists in the order of the keys, an empty list for every missing key.
+        """
+        if not keys:
+            return []
+        async with self.conn.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.lrange(key, 0, -1)
+            return [list(cached_list) for cached_list in await pipe.execute()]
+
+    @observe_redis
+    async def set_links(
+        self,
+        key: str,
+        page_url: str,
+        links: List[str],
+        ttl: int | None = CACHE_EXPIRY,
+    ) -> None:
+        """
+        Store the links of a page as a single value encoded by the cache codec, replacing
+        a list stored by older versions. Copies held by other processes are invalidated.
+        The links are also appended to the page store.
+
+        :param key: The Redis key.
+        :param page_url: The url of the page, links on its origin are stored as paths.
+        :param links: The links of the page.
+        :param ttl: Optional time-to-live (TTL) in seconds. Defaults to CACHE_EXPIRY.
+        """
+        if ttl is not None and ttl <= 0:
+            logger.error("TTL must be a positive integer.")
+            return
+        value = encode_links(page_url, links, self.codec)
+        async with self.raw_conn.pipeline(transaction=True) as pipe:
+            pipe.set(key, value, ex=ttl)
+            if LOCAL_CACHE_INVALIDATION:
+                pipe.publish(LOCAL_CACHE_CHANNEL, f"{self.instance_id} {key}")
+            await pipe.execute()
+        # reads of the previous links still in flight do not store them
+        self.local_cache.invalidate([key])
+        self.local_cache.set(key, tuple(links), ttl)
+        await self.page_store.run(self.page_store.put, key, value)
+
+    async def get_links(self, key: str, page_url: str) -> List[str] | None:
+        """
+        Retrieve the links of a page stored by set_links.
+
+        :param key: The Redis key.
+        :param page_url: The url of the page.
+        :return: The links, or None if they are not cached.
+        """
+        return (await self.get_links_from_keys([key], [page_url]))[0]
+
+    async def get_links_from_keys(
+        self, keys: List[str], page_urls: List[str]
+    ) -> List[List[str] | None]:
+        """
+        Retrieve the links of several pages, from the local cache or in a single
+        round-trip. Links cached as a list by older versions are read in a second one
+        when READ_LEGACY_LINKS is set. Links missing from Redis are looked up in the page
+        store, those stored less than CACHE_EXPIRY ago are served and cached again.
+
+        :param keys: The Redis keys.
+        :param page_urls: The urls of the pages, in the order of the keys.
+        :return: The links in the order of the keys, None for every missing key.
+        """
+        # values invalidated while they are read are not stored in the local cache
+        generation = self.local_cache.generation
+        links = []
+        missing = []
+        for index, key in enumerate(keys):
+            cached_links = self.local_cache.get(key)
+            links.append(None if cached_links is None else list(cached_links))
+            if cached_links is None:
+                missing.append(index)
+        CACHE_LOOKUPS.labels(tier="local", result="hit").inc(len(keys) - len(missing))
+        CACHE_LOOKUPS.labels(tier="local", result="miss").inc(len(missing))
+        if not missing:
+            return links
+        fetched = [keys[index] for index in missing]
+        # MGET answers nil for keys holding a list rather than failing
+        with REDIS_SECONDS.labels(op="get_links_from_keys").time():
+            values = await self.raw_conn.mget(fetched)
+        for index, value in zip(missing, values):
+            try:
+                if value is not None:
+                    links[index] = decode_links(page_urls[index], value)
+            except Exception as ex:
+                logger.error(
+                    f"Failed to decode cached links of {page_urls[index]}: {ex}"
+                )
+        legacy = [index for index in missing if links[index] is None]
+        if READ_LEGACY_LINKS and legacy:
+            cached_lists = await self.get_lists_from_keys([keys[i] for i in legacy])
+            for index, cached_list in zip(legacy, cached_lists):
+                links[index] = cached_list or None
+        stored = []
+        for index in missing:
+            if links[index] is None:
+                self.redis_misses += 1
+                CACHE_LOOKUPS.labels(tier="redis", result="miss").inc()
+                stored.append(index)
+            else:
+                self.redis_hits += 1
+                CACHE_LOOKUPS.labels(tier="redis", result="hit").inc()
+                self.local_cache.set(
+                    keys[index], tuple(links[index]), generation=generation
+                )
+        if self.page_store.is_open and stored:
+            await self._get_stored_links(keys, page_urls, links, stored, generation)
+        return links
+
+    async def _get_stored_links(
+        self,
+        keys: List[str],
+        page_urls: List[str],
+        links: List[List[str] | None],
+        indexes: List[int],
+        generation: int,
+    ) -> None:
+        """
+        Fill the links missing from Redis with those of the page store which did not
+        expire yet, and cache them again for the rest of their expiry.
+
+        :param indexes: The indexes of the keys missing from Redis.
+        :param generation: The generation of the local cache when the read started.
+        """
+        found = {}
+        records = await self.page_store.run(
+            self.page_store.get_many, [keys[index] for index in indexes]
+        )
+        for index, record in zip(indexes, records):
+            ttl = (
+                None if record is None else int(record[1] + CACHE_EXPIRY - time.time())
+            )
+            if ttl is None or ttl <= 0:
+                self.store_misses += 1
+                CACHE_LOOKUPS.labels(tier="store", result="miss").inc()
+                continue
+            try:
+                links[index] = decode_links(page_urls[index], record[0])
+            except Exception as ex:
+                logger.error(
+                    f"Failed to decode stored links of {page_urls[index]}: {ex}"
+                )
+                continue
+            self.store_hits += 1
+            CACHE_LOOKUPS.labels(tier="store", result="hit").inc()
+            self.local_cache.set(keys[index], tuple(links[index]), ttl, generation)
+            found[keys[index]] = (record[0], ttl)
+        if found:
+            async with self.raw_conn.pipeline(transaction=False) as pipe:
+                for key, (value, ttl) in found.items():
+                    pipe.set(key, value, ex=ttl)
+                await pipe.execute()
+
+    async def export_links(self, url_prefix: str = "") -> AsyncIterator[dict]:
+        """
+        Links of every page in the page store, however old, as of their latest fetch.
+
+        :param url_prefix: Only pages whose url starts with it are exported.
+        :return: Records of the url, links and fetch time of the pages.
+        """
+        prefix = "sitemap:"
+        records = self.page_store.items(prefix + url_prefix)
+        try:
+            while True:
+                # records are read on the thread of the store, a hundred at a time
+                batch = await self.page_store.run(list, islice(records, 100))
+                if not batch:
+                    return
+                for key, value, stored_at in batch:
+                    url = key[len(prefix) :]
+                    try:
+                        links = decode_links(url, value)
+                    except Exception as ex:
+                        logger.error(f"Failed to decode stored links of {url}: {ex}")
+                        continue
+                    yield {"url": url, "links": links, "fetched_at": stored_at}
+        finally:
+            # a client gone mid-export leaves the segment open otherwise
+            records.close()
+
+    def cache_stats(self) -> Dict[str, Dict[str, int | float]]:
+        """
+        Hit rates of the cached links of pages since the process started.
+
+        :return: Statistics of the local cache, of the lookups reaching Redis and of
+            those reaching the page store when it is enabled.
+        """
+        stats = {"local": self.local_cache.stats()}
+        tiers = {"redis": (self.redis_hits, self.redis_misses)}
+        if self.page_store.is_open:
+            tiers["store"] = (self.store_hits, self.store_misses)
+        for tier, (hits, misses) in tiers.items():
+            lookups = hits + misses
+            stats[tier] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+        return stats
+
+    async def listen_for_invalidations(self):
+        """
+        Drop the links other processes replaced from the local cache, runs for the
+        lifetime of the app. The local cache is cleared whenever the subscription is
+        (re)established since invalidations may have been missed.
+        """
+        while True:
+            try:
+                pubsub = self.conn.pubsub()
+                await pubsub.subscribe(LOCAL_CACHE_CHANNEL)
+                self.local_cache.clear()
+                try:
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        sender, _, key = message["data"].partition(" ")
+                        if sender != self.instance_id:
+                            self.local_cache.invalidate([key])
+                finally:
+                    await pubsub.aclose()
+            except redis.RedisError as ex:
+                logger.error(f"Lost the cache invalidation channel: {ex}")
+                self.local_cache.clear()
+                await asyncio.sleep(1)
+
+    @observe_redis
     async def add_values_to_set(
         self, key: str, values: Union[str, List[str]], ttl: int | None = CACHE_EXPIRY
     ) -> None:
@@ -151,6 +503,22 @@ class RedisHelper:
             await self.conn.sadd(key, values)
         await self.set_key_expiry(key, ttl)
 
+    @observe_redis
+    async def remove_values_from_set(
+        self, key: str, values: Union[str, List[str]]
+    ) -> None:
+        """
+        Remove one or more values from a Redis set at the specified key.
+
+        :param key: The Redis key.
+        :param values: A single value or a list of values to remove.
+        """
+        if isinstance(values, list):
+            await self.conn.srem(key, *values)
+        else:
+            await self.conn.srem(key, values)
+
+    @observe_redis
     async def get_set_members(self, key: str) -> Set[str]:
         """
         Retrieve all members of a Redis set stored at the specified key.
@@ -161,6 +529,7 @@ class RedisHelper:
         cached_set = await self.conn.smembers(key)
         return set(cached_set)
 
+    @observe_redis
     async def is_set_members(self, key: str, value: str) -> bool:
         """
         Retrieve all members of a Redis set stored at the specified key.
@@ -171,6 +540,7 @@ class RedisHelper:
         """
         return await self.conn.sismember(key, value)
 
+    @observe_redis
     async def set_hash(
         self, key: str, mapping: dict, ttl: int | None = CACHE_EXPIRY
     ) -> None:
@@ -189,9 +559,13 @@ class RedisHelper:
         ):
             logger.error("Both keys and values in the dictionary must be strings.")
             return
-        await self.conn.hset(key, mapping)
-        await self.set_key_expiry(key, ttl)
+        async with self.conn.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            if ttl is not None:
+                pipe.expire(key, ttl)
+            await pipe.execute()
 
+    @observe_redis
     async def get_hash(self, key: str) -> dict:
         """
         Retrieve all fields and values of the hash stored at the specified key.
@@ -203,6 +577,35 @@ class RedisHelper:
         cached_dict = await self.conn.hgetall(key)
         return dict(cached_dict)
 
+    @observe_redis
+    async def remove_hash_fields(self, key: str, fields: List[str]) -> None:
+        """
+        Remove fields of the hash stored at the specified key.
+
+        :param key: The Redis key.
+        :param fields: The fields to remove.
+        """
+        await self.conn.hdel(key, *fields)
+
+    @observe_redis
+    async def increment_hash_fields(
+        self, key: str, mapping: Dict[str, int], ttl: int | None = CACHE_EXPIRY
+    ) -> None:
+        """
+        Increment several integer fields of a hash and set TTL in a single transaction.
+
+        :param key: The Redis key.
+        :param mapping: A dictionary of field to the amount it is incremented by.
+        :param ttl: Optional time-to-live (TTL) in seconds. Defaults to CACHE_EXPIRY.
+        """
+        async with self.conn.pipeline(transaction=True) as pipe:
+            for name, amount in mapping.items():
+                pipe.hincrby(key, name, amount)
+            if ttl is not None:
+                pipe.expire(key, ttl)
+            await pipe.execute()
+
+    @observe_redis
     async def remove_key(self, key: str) -> None:
         """
         Remove the specified key from Redis.
@@ -210,7 +613,9 @@ class RedisHelper:
         :param key: The Redis key.
         """
         await self.conn.delete(key)
+        self.local_cache.invalidate([key])
 
+    @observe_redis
     async def exists(self, key: str) -> bool:
         """
         Check if the specified key exists in Redis.
@@ -219,3 +624,17 @@ class RedisHelper:
         :return: True if the key exists, False otherwise.
         """
         return await self.conn.exists(key)
+
+    @observe_redis
+    async def run_script(self, script: str, keys: List[str], args: List) -> Any:
+        """
+        Run a Lua script atomically, it is sent once and invoked by its SHA afterwards.
+
+        :param script: The Lua script.
+        :param keys: The Redis keys the script accesses.
+        :param args: The arguments of the script.
+        :return: The value returned by the script.
+        """
+        if script not in self._scripts:
+            self._scripts[script] = self.conn.register_script(script)
+        return await self._scripts[script](keys=keys, args=args)
@@ -0,0 +1,52 @@
+"""
+Module to serialize api responses. Sitemaps run to millions of strings, they are
+serialized with orjson rather than walked by jsonable_encoder and json.dumps, and
+may be sent in a compact form naming every url once.
+"""
+
+from typing import Any, Dict, List
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def dumps(content: Any) -> bytes:
+    """
+    :param content: A value made of dicts, lists, strings, numbers, booleans and None.
+    :return: The value as compact UTF-8 JSON.
+    """
+    return orjson.dumps(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response serialized by dumps. Returned by a route it skips the
+    jsonable_encoder pass of FastAPI, so content must already be JSON types.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def compact_sitemap(sitemap: Dict[str, List[str]]) -> Dict[str, list]:
+    """
+    Sitemap as a table of urls, crawled pages first, with the links of every page as
+    indexes into it. Every url is sent once however many pages link to it.
+
+    :param sitemap: The links of every crawled page.
+    :return: {"urls": [...], "links": [[...], ...]} where links[i] are the links of
+        urls[i], urls past len(links) were linked to but not crawled.
+    """
+    ids = {page: index for index, page in enumerate(sitemap)}
+    urls = list(sitemap)
+    links = []
+    for page_links in sitemap.values():
+        indexes = []
+        for link in page_links:
+            index = ids.get(link)
+            if index is None:
+                index = ids[link] = len(urls)
+                urls.append(link)
+            indexes.append(index)
+        links.append(indexes)
+    return {"urls": urls, "links": links}
@@ -0,0 +1,270 @@
+"""
+Module retrying fetches which failed for transient reasons, and failing fast on hosts
+which are down.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, TypeVar
+from urllib.parse import urlparse
+
+import aiohttp
+
+from config.constants import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    FETCH_RETRIES,
+    HOST_CACHE_SIZE,
+    RETRY_BACKOFF,
+    RETRY_BUDGET_BURST,
+    RETRY_BUDGET_RATIO,
+    RETRY_MAX_BACKOFF,
+    RETRYABLE_STATUSES,
+)
+from helper.http_helper import FetchError, HttpStatusError
+from helper.metrics import CIRCUIT_REJECTIONS, RETRIES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(FetchError):
+    """Raised instead of fetching from a host which is down"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Timeouts, connection failures (refused, reset, DNS) and server errors are transient,
+    other failures would fail again.
+
+    :param error: The error raised by a fetch.
+    :return: Whether the fetch may succeed if tried again.
+    """
+    if isinstance(error, HttpStatusError):
+        return error.status in RETRYABLE_STATUSES
+    return isinstance(
+        error,
+        (
+            asyncio.TimeoutError,
+            aiohttp.ClientConnectionError,
+            aiohttp.ClientPayloadError,
+        ),
+    )
+
+
+def backoff_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter, so that failed requests do not retry in step.
+
+    :param attempt: The number of retries done so far.
+    :return: The seconds to wait before the next retry.
+    """
+    return random.uniform(0, min(RETRY_MAX_BACKOFF, RETRY_BACKOFF * 2**attempt))
+
+
+class RetryBudget:
+    """
+    Caps retries to a share of the requests sent to a host, so that retries do not
+    multiply the load of a struggling host. Every request earns a fraction of a retry.
+    """
+
+    def __init__(
+        self, ratio: float = RETRY_BUDGET_RATIO, burst: float = RETRY_BUDGET_BURST
+    ):
+        """
+        :param ratio: The retries earned by every request.
+        :param burst: The retries which may be saved up.
+        """
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self):
+        """
+        Earn a fraction of a retry for a request.
+        """
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    @property
+    def is_full(self) -> bool:
+        """
+        :return: True if no retry is missing from the burst.
+        """
+        return self.tokens >= self.burst
+
+    def withdraw(self) -> bool:
+        """
+        :return: Whether a retry may be sent, it is then spent.
+        """
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Tracks whether a host is up. The circuit opens after consecutive transient failures,
+    requests then fail fast until the reset timeout passes, after which a single trial
+    request is let through (half-open): its success closes the circuit and its failure
+    opens it again.
+    """
+
+    def __init__(
+        self,
+        threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT,
+    ):
+        """
+        :param threshold: The consecutive failures opening the circuit.
+        :param reset_timeout: The seconds the circuit stays open.
+        """
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        """
+        :return: "closed", "open" or "half_open".
+        """
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    @property
+    def is_reset(self) -> bool:
+        """
+        :return: True if the circuit is closed and no failure is counted.
+        """
+        return self.opened_at is None and not self.failures and not self.trial_running
+
+    def allow(self) -> bool:
+        """
+        :return: Whether a request may be sent, a half-open circuit admits a single one.
+        """
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        """
+        The host answered, the circuit is closed.
+        """
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self):
+        """
+        The host failed transiently, the circuit opens past the threshold or when the
+        trial request failed.
+        """
+        self.failures += 1
+        if self.trial_running or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+
+class RetryPolicy:
+    """
+    Runs fetches with retries and a circuit breaker per host, shared by every crawl of
+    the process.
+    """
+
+    # breakers and budgets of the hosts seen by this process, least recently used first,
+    # shared by every instance
+    _hosts: OrderedDict[str, tuple[CircuitBreaker, RetryBudget]] = OrderedDict()
+
+    def host_state(self, url: str) -> tuple[CircuitBreaker, RetryBudget]:
+        """
+        :param url: The url about to be fetched.
+        :return: The circuit breaker and retry budget of its host.
+        """
+        host = urlparse(url).netloc
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = (CircuitBreaker(), RetryBudget())
+            self._evict()
+        else:
+            self._hosts.move_to_end(host)
+        return state
+
+    def _evict(self):
+        """
+        Forget healthy hosts, least recently used first, while there are too many.
+        A host is recreated as it was when its circuit is reset and its budget is full.
+        """
+        excess = len(self._hosts) - HOST_CACHE_SIZE
+        if excess <= 0:
+            return
+        healthy = []
+        for host, (breaker, budget) in self._hosts.items():
+            if len(healthy) == excess:
+                break
+            if breaker.is_reset and budget.is_full:
+                healthy.append(host)
+        for host in healthy:
+            del self._hosts[host]
+
+    async def run(self, url: str, fetch: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run the fetch, again after a backoff while it fails transiently and both the
+        retries and the budget of the host allow it.
+
+        :param url: The url fetched.
+        :param fetch: Fetches the url.
+        :return: The result of the fetch.
+        :raises CircuitOpenError: If the host is down.
+        """
+        breaker, budget = self.host_state(url)
+        attempt = 0
+        while True:
+            trial_running = breaker.trial_running
+            if not breaker.allow():
+                CIRCUIT_REJECTIONS.inc()
+                raise CircuitOpenError(
+                    f"Host {urlparse(url).netloc} is down, not fetched"
+                )
+            is_trial = breaker.trial_running and not trial_running
+            budget.deposit()
+            try:
+                result = await fetch()
+            except asyncio.CancelledError:
+                # a trial request which never completed says nothing about the host,
+                # another one may be let through
+                if is_trial:
+                    breaker.trial_running = False
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # the host answered, the page itself is broken
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if (
+                    attempt >= FETCH_RETRIES
+                    or breaker.state != "closed"
+                    or not budget.withdraw()
+                ):
+                    raise
+                delay = backoff_delay(attempt)
+                attempt += 1
+                RETRIES.inc()
+                logger.info(f"Retrying {url} in {delay:.2f}s after: {e!r}")
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
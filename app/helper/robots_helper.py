@@ -0,0 +1,230 @@
+"""
+Module to fetch, parse and cache the robots.txt rules of a host.
+"""
+
+import json
+import logging
+import re
+from typing import Dict, List
+from urllib.parse import urljoin, urlparse
+
+from config.constants import (
+    ROBOTS_ERROR_EXPIRY,
+    ROBOTS_EXPIRY,
+    ROBOTS_MAX_SIZE,
+    USER_AGENT,
+)
+from helper.http_helper import HttpHelper
+from helper.link_extractor import read_chunks
+from helper.redis_helper import RedisHelper
+
+logger = logging.getLogger(__name__)
+
+
+def pattern_to_regex(pattern: str) -> re.Pattern:
+    """
+    Compile a robots.txt path pattern, "*" matches any sequence and a trailing "$"
+    anchors the pattern at the end of the path.
+
+    :param pattern: The path pattern.
+    :return: The compiled pattern, matched from the start of the path.
+    """
+    anchored = pattern.endswith("$")
+    if anchored:
+        pattern = pattern[:-1]
+    regex = ".*".join(re.escape(part) for part in pattern.split("*"))
+    return re.compile(regex + ("$" if anchored else ""))
+
+
+class RobotsRules:
+    """
+    Rules of robots.txt applying to this crawler, a path is allowed unless its longest
+    matching rule is a disallow one.
+    """
+
+    def __init__(
+        self,
+        allow: List[str] | None = None,
+        disallow: List[str] | None = None,
+        sitemaps: List[str] | None = None,
+        crawl_delay: float | None = None,
+    ):
+        """
+        :param allow: The allowed path patterns.
+        :param disallow: The disallowed path patterns.
+        :param sitemaps: The urls of the sitemaps listed by the host.
+        :param crawl_delay: The seconds to wait between requests asked by the host.
+        """
+        self.allow = allow or []
+        self.disallow = disallow or []
+        self.sitemaps = sitemaps or []
+        self.crawl_delay = crawl_delay
+        self._rules = sorted(
+            [(len(pattern), True, pattern_to_regex(pattern)) for pattern in self.allow]
+            + [
+                (len(pattern), False, pattern_to_regex(pattern))
+                for pattern in self.disallow
+            ],
+            # longest pattern first, allow wins a tie
+            key=lambda rule: (-rule[0], not rule[1]),
+        )
+
+    @classmethod
+    def disallow_all(cls) -> "RobotsRules":
+        """
+        :return: Rules of a host whose robots.txt is unreachable.
+        """
+        return cls(disallow=["/"])
+
+    def allowed(self, url: str) -> bool:
+        """
+        :param url: The url.
+        :return: Whether the url may be crawled.
+        """
+        parsed = urlparse(url)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += f"?{parsed.query}"
+        if path == "/robots.txt":
+            return True
+        for _, allow, regex in self._rules:
+            if regex.match(path):
+                return allow
+        return True
+
+    def to_dict(self) -> Dict:
+        """
+        :return: The rules as a JSON serializable dict.
+        """
+        return {
+            "allow": self.allow,
+            "disallow": self.disallow,
+            "sitemaps": self.sitemaps,
+            "crawl_delay": self.crawl_delay,
+        }
+
+
+def allowed_by_host(rules: Dict[str, RobotsRules], url: str) -> bool:
+    """
+    :param rules: The rules of the hosts seen so far, by network location.
+    :param url: A canonical url.
+    :return: Whether the rules of its host allow the url, every url of a host whose
+        rules are not known is allowed.
+    """
+    host_rules = rules.get(urlparse(url).netloc)
+    return host_rules is None or host_rules.allowed(url)
+
+
+def parse_robots(text: str, user_agent: str = USER_AGENT) -> RobotsRules:
+    """
+    Parse a robots.txt, keeping the groups of the user agent or the "*" ones if the user
+    agent has none.
+
+    :param text: The content of robots.txt.
+    :param user_agent: The product token of the crawler.
+    :return: The rules applying to the user agent.
+    """
+    user_agent = user_agent.lower()
+    groups = {"agent": [], "any": []}
+    sitemaps = []
+    # consecutive user-agent lines share the rules following them
+    rules, in_rules = None, False
+    for line in text.splitlines():
+        line = line.partition("#")[0].strip()
+        name, separator, value = line.partition(":")
+        if not separator:
+            continue
+        name, value = name.strip().lower(), value.strip()
+        if name == "sitemap":
+            if value:
+                sitemaps.append(value)
+        elif name == "user-agent":
+            if rules is None or in_rules:
+                rules = {"allow": [], "disallow": [], "crawl_delay": None}
+                in_rules = False
+            agent = value.lower()
+            if agent == user_agent:
+                groups["agent"].append(rules)
+            elif agent == "*":
+                groups["any"].append(rules)
+        elif name in ("allow", "disallow", "crawl-delay") and rules is not None:
+            in_rules = True
+            if name == "crawl-delay":
+                try:
+                    rules["crawl_delay"] = float(value)
+                except ValueError:
+                    pass
+            elif value:
+                rules[name].append(value)
+    matched = groups["agent"] or groups["any"]
+    delays = [group["crawl_delay"] for group in matched if group["crawl_delay"]]
+    return RobotsRules(
+        allow=[pattern for group in matched for pattern in group["allow"]],
+        disallow=[pattern for group in matched for pattern in group["disallow"]],
+        sitemaps=sitemaps,
+        crawl_delay=max(delays, default=None),
+    )
+
+
+class RobotsHelper:
+    """
+    Fetches the robots.txt of hosts, the parsed rules are cached in redis.
+    """
+
+    def __init__(
+        self,
+        redis_helper: RedisHelper | None = None,
+        http_helper: HttpHelper | None = None,
+    ):
+        """
+        :param redis_helper: The redis helper, defaults to the shared one.
+        :param http_helper: The http helper, defaults to the shared one.
+        """
+        self.redis_helper = redis_helper or RedisHelper()
+        self.http_helper = http_helper or HttpHelper()
+
+    async def get_rules(self, url: str) -> RobotsRules:
+        """
+        :param url: Any url of the host.
+        :return: The robots.txt rules of the host.
+        """
+        rules_key = f"robots:{urlparse(url).netloc}"
+        cached_rules = await self.redis_helper.get_value_by_key(rules_key)
+        if cached_rules:
+            return RobotsRules(**json.loads(cached_rules))
+        rules, ttl = await self.fetch_rules(url)
+        await self.redis_helper.set_key_value(
+            rules_key, json.dumps(rules.to_dict(), separators=(",", ":")), ttl
+        )
+        return rules
+
+    async def fetch_rules(self, url: str) -> tuple[RobotsRules, int]:
+        """
+        Fetch and parse the robots.txt of the host. A missing robots.txt allows every
+        page while an unreachable one disallows every page for a short while.
+
+        :param url: Any url of the host.
+        :return: The rules and the seconds they may be cached for.
+        """
+        robots_url = urljoin(url, "/robots.txt")
+        try:
+            async with self.http_helper.get(robots_url) as response:
+                if 400 <= response.status < 500:
+                    return RobotsRules(), ROBOTS_EXPIRY
+                if response.status != 200:
+                    logger.warning(
+                        f"robots.txt of {robots_url} failed with {response.status}"
+                    )
+                    return RobotsRules.disallow_all(), ROBOTS_ERROR_EXPIRY
+                body = b"".join(
+                    [
+                        chunk
+                        async for chunk in read_chunks(
+                            response, robots_url, ROBOTS_MAX_SIZE
+                        )
+                    ]
+                )
+        except Exception as e:
+            logger.warning(f"Failed to fetch {robots_url}: {e}")
+            return RobotsRules.disallow_all(), ROBOTS_ERROR_EXPIRY
+        return parse_robots(body.decode("utf-8", errors="replace")), ROBOTS_EXPIRY
@@ -0,0 +1,133 @@
+"""
+Module holding a crawl frontier kept in memory and shared by the crawls of a batch, so
+that a single pool of workers crawls every root.
+"""
+
+import asyncio
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Set, Tuple
+
+from config.constants import BATCH_DOMAIN_CONCURRENCY
+
+if TYPE_CHECKING:
+    from helper.crawl_state import CrawlState
+
+
+class RootFrontier:
+    """
+    Frontier of a single crawl of a batch, with the interface of the asyncio.Queue of a
+    crawl running its own workers. Its pages are queued on the shared frontier.
+    """
+
+    def __init__(self, shared: "SharedFrontier", state: "CrawlState"):
+        """
+        :param shared: The frontier of the batch.
+        :param state: The state of the crawl.
+        """
+        self.shared = shared
+        self.state = state
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def put_nowait(self, item: Tuple[str, int]):
+        """
+        :param item: The url of a page and its depth.
+        """
+        self._unfinished += 1
+        self._finished.clear()
+        self.shared.put(self.state, *item)
+
+    def task_done(self):
+        """
+        A page taken from the frontier was crawled.
+        """
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._finished.set()
+
+    async def join(self):
+        """
+        Wait until every page put is crawled.
+        """
+        await self._finished.wait()
+
+    def qsize(self) -> int:
+        """
+        :return: The pages put and not crawled yet.
+        """
+        return self._unfinished
+
+
+class SharedFrontier:
+    """
+    Pages of every crawl of a batch, handed out round-robin over their domains. A domain
+    has at most domain_concurrency pages out at once, the rest wait here rather than
+    hold a worker, so that a slow or large site takes no more than its share.
+    """
+
+    def __init__(self, domain_concurrency: int = BATCH_DOMAIN_CONCURRENCY):
+        """
+        :param domain_concurrency: The pages of a domain crawled at once.
+        """
+        self.domain_concurrency = domain_concurrency
+        self._queues: Dict[str, Deque[Tuple["CrawlState", str, int]]] = {}
+        self._active: Dict[str, int] = {}
+        # domains with pages which may be handed out, in turn
+        self._ready: Deque[str] = deque()
+        self._scheduled: Set[str] = set()
+        self._changed = asyncio.Event()
+
+    def attach(self, state: "CrawlState") -> RootFrontier:
+        """
+        :param state: The state of a crawl of the batch.
+        :return: The frontier of the crawl.
+        """
+        return RootFrontier(self, state)
+
+    def _schedule(self, domain: str):
+        if (
+            domain not in self._scheduled
+            and self._queues.get(domain)
+            and self._active.get(domain, 0) < self.domain_concurrency
+        ):
+            self._scheduled.add(domain)
+            self._ready.append(domain)
+            self._changed.set()
+
+    def put(self, state: "CrawlState", url: str, depth: int):
+        """
+        :param state: The state of the crawl the page belongs to.
+        :param url: The url of the page.
+        :param depth: Links followed from the root to reach the page.
+        """
+        self._queues.setdefault(state.domain, deque()).append((state, url, depth))
+        self._schedule(state.domain)
+
+    async def get(self) -> Tuple["CrawlState", str, int]:
+        """
+        :return: The state of a crawl, the url of its next page and its depth.
+        """
+        while not self._ready:
+            self._changed.clear()
+            await self._changed.wait()
+        domain = self._ready.popleft()
+        self._scheduled.discard(domain)
+        queue = self._queues[domain]
+        item = queue.popleft()
+        if not queue:
+            del self._queues[domain]
+        self._active[domain] = self._active.get(domain, 0) + 1
+        self._schedule(domain)
+        return item
+
+    def task_done(self, state: "CrawlState"):
+        """
+        :param state: The state of the crawl whose page was crawled.
+        """
+        domain = state.domain
+        self._active[domain] -= 1
+        if not self._active[domain]:
+            del self._active[domain]
+        self._schedule(domain)
+        state.frontier.task_done()
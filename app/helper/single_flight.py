@@ -0,0 +1,176 @@
+"""
+Module to coalesce concurrent executions of the same work, within the process and across pods.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+from uuid import uuid4
+
+from config.constants import INFLIGHT_LOCK_TIMEOUT, INFLIGHT_POLL_INTERVAL
+from helper.http_helper import FetchError
+from helper.redis_helper import RedisHelper
+
+logger = logging.getLogger(__name__)
+
+# takes the lock, or registers a waiter and returns the token of the holder
+# KEYS: lock, waiters | ARGV: token, ttl
+ACQUIRE_SCRIPT = """
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+    return ARGV[1]
+end
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[2])
+return redis.call('GET', KEYS[1])
+"""
+
+# releases the lock unless a waiter has to be handed the result first
+# KEYS: lock, waiters | ARGV: token
+RELEASE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 0
+end
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+# publishes the result for the waiters, then releases the lock
+# KEYS: lock, waiters, result | ARGV: token, result, ttl
+PUBLISH_SCRIPT = """
+redis.call('SET', KEYS[3], ARGV[2], 'EX', ARGV[3])
+redis.call('DEL', KEYS[2])
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return 1
+"""
+
+
+class SingleFlight:
+    """
+    Runs the work of a key once for all of its concurrent callers.
+    Callers of this process share an in-flight task, other pods are kept out by a redis
+    lock and wait for the result published by the lock holder. The result is only
+    published when another pod registered as a waiter, an uncontended run costs the
+    round-trips taking and releasing the lock.
+    """
+
+    # in-flight tasks of this process, shared by every instance
+    _in_flight: Dict[str, asyncio.Task] = {}
+
+    def __init__(self, redis_helper: RedisHelper | None = None):
+        """
+        :param redis_helper: The redis helper, defaults to the shared one.
+        """
+        self.redis_helper = redis_helper or RedisHelper()
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run the work of the key unless it is already in flight, then wait for its result.
+
+        :param key: The key identifying the work.
+        :param func: The work, its result has to be JSON serializable.
+        :return: The result of the work.
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self.run_across_pods(key, func))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # a cancelled caller must not cancel the work other callers wait for
+        return await asyncio.shield(task)
+
+    async def run_across_pods(
+        self, key: str, func: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Run the work while holding the lock of the key, or wait for the pod holding it.
+
+        :param key: The key identifying the work.
+        :param func: The work, its result has to be JSON serializable.
+        :return: The result of the work.
+        """
+        lock_key, result_key = f"inflight:{key}", f"inflight-result:{key}"
+        waiters_key = f"inflight-waiters:{key}"
+        token = uuid4().hex
+        holder = await self.redis_helper.run_script(
+            ACQUIRE_SCRIPT, [lock_key, waiters_key], [token, INFLIGHT_LOCK_TIMEOUT]
+        )
+        if holder != token:
+            logger.debug(f"Waiting for another pod working on {key}")
+            result = await self.wait_for_result(lock_key, result_key, holder)
+            if result is not None:
+                if "error" in result:
+                    raise FetchError(result["error"])
+                return result["value"]
+            # lock holder is gone without a result
+            return await func()
+        result = None
+        try:
+            value = await func()
+            result = {"value": value}
+            return value
+        except FetchError as e:
+            result = {"error": str(e)}
+            raise
+        finally:
+            await self.release(token, lock_key, waiters_key, result_key, result)
+
+    async def release(
+        self,
+        token: str,
+        lock_key: str,
+        waiters_key: str,
+        result_key: str,
+        result: dict | None,
+    ):
+        """
+        Release the lock, publishing the result first if another pod waits for it.
+
+        :param token: The token the lock is held with.
+        :param lock_key: The redis key of the lock.
+        :param waiters_key: The redis key set by waiting pods.
+        :param result_key: The redis key the result is published at.
+        :param result: The value or error of the work, None if it failed otherwise.
+        """
+        keys = [lock_key, waiters_key]
+        if await self.redis_helper.run_script(RELEASE_SCRIPT, keys, [token]):
+            return
+        # waiters run the work themselves when the lock is released without a result
+        published = ""
+        if result is not None:
+            published = json.dumps(result | {"token": token}, separators=(",", ":"))
+        await self.redis_helper.run_script(
+            PUBLISH_SCRIPT,
+            keys + [result_key],
+            [token, published, INFLIGHT_LOCK_TIMEOUT],
+        )
+
+    async def wait_for_result(
+        self, lock_key: str, result_key: str, holder: str | None
+    ) -> dict | None:
+        """
+        Poll for the result published by the holder of the lock.
+
+        :param lock_key: The redis key of the lock.
+        :param result_key: The redis key the result is published at.
+        :param holder: The token of the lock holder.
+        :return: The result or None if the lock was released or expired without one.
+        """
+        deadline = time.monotonic() + INFLIGHT_LOCK_TIMEOUT
+        while holder and time.monotonic() < deadline:
+            await asyncio.sleep(INFLIGHT_POLL_INTERVAL)
+            # the result is published before the lock is released, read them the other way
+            current_holder = await self.redis_helper.get_value_by_key(lock_key)
+            result = await self.redis_helper.get_value_by_key(result_key)
+            if result:
+                result = json.loads(result)
+                # results of earlier runs are ignored
+                if result.get("token") == holder:
+                    return result
+            if current_holder != holder:
+                return None
+        return None
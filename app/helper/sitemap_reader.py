@@ -0,0 +1,118 @@
+"""
+Module to stream the page urls listed by the sitemap.xml files of a site.
+"""
+
+import logging
+import zlib
+from collections import deque
+from typing import AsyncIterator, List
+from xml.etree.ElementTree import ParseError, XMLPullParser
+
+from config.constants import SITEMAP_MAX_FILES, SITEMAP_MAX_SIZE, SITEMAP_MAX_URLS
+from helper.http_helper import HttpHelper
+from helper.link_extractor import read_chunks
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def local_name(tag: str) -> str:
+    """
+    :param tag: The tag of an element, qualified by its namespace.
+    :return: The tag without its namespace.
+    """
+    return tag.rpartition("}")[2]
+
+
+async def read_sitemap_urls(
+    sitemap_urls: List[str], http_helper: HttpHelper | None = None
+) -> AsyncIterator[str]:
+    """
+    Stream the page urls of sitemaps, following sitemap indexes. Every file is parsed
+    while it downloads, gzip files are decompressed on the fly.
+
+    :param sitemap_urls: The urls of the sitemaps.
+    :param http_helper: The http helper, defaults to the shared one.
+    :return: An async iterator of page urls, at most SITEMAP_MAX_URLS of them.
+    """
+    http_helper = http_helper or HttpHelper()
+    queue = deque(sitemap_urls)
+    seen = set(sitemap_urls)
+    files = urls = 0
+    while queue and files < SITEMAP_MAX_FILES:
+        sitemap_url = queue.popleft()
+        files += 1
+        try:
+            async for kind, loc in read_sitemap(sitemap_url, http_helper):
+                if kind == "sitemap":
+                    if loc not in seen:
+                        seen.add(loc)
+                        queue.append(loc)
+                    continue
+                yield loc
+                urls += 1
+                if urls >= SITEMAP_MAX_URLS:
+                    logger.warning(f"Sitemaps list more than {urls} urls, truncated")
+                    return
+        except Exception as e:
+            # sitemaps only seed the crawl, a broken one must not fail it
+            logger.warning(f"Failed to read sitemap {sitemap_url}: {e}")
+
+
+async def read_sitemap(
+    sitemap_url: str, http_helper: HttpHelper
+) -> AsyncIterator[tuple[str, str]]:
+    """
+    Stream the entries of a single sitemap or sitemap index.
+
+    :param sitemap_url: The url of the sitemap.
+    :param http_helper: The http helper.
+    :return: An async iterator of ("url", page url) or ("sitemap", sitemap url) pairs.
+    """
+    async with http_helper.get(sitemap_url) as response:
+        if response.status != 200:
+            logger.warning(f"Sitemap {sitemap_url} failed with {response.status}")
+            return
+        parser = XMLPullParser(events=("start", "end"))
+        decompressor = None
+        root = None
+        size = 0
+        first = True
+        async for chunk in read_chunks(response, sitemap_url, SITEMAP_MAX_SIZE):
+            if first:
+                first = False
+                # sitemap.xml.gz is served as is, unlike a gzip content-encoding
+                if chunk.startswith(GZIP_MAGIC):
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            if decompressor:
+                # bound the output so a small archive can not expand without limit
+                chunk = decompressor.decompress(chunk, SITEMAP_MAX_SIZE - size + 1)
+            size += len(chunk)
+            if size > SITEMAP_MAX_SIZE:
+                logger.warning(f"Sitemap {sitemap_url} is too large, truncated")
+                break
+            try:
+                parser.feed(chunk)
+            except ParseError as e:
+                logger.warning(f"Sitemap {sitemap_url} is not valid XML: {e}")
+                break
+            for event, element in parser.read_events():
+                if event == "start":
+                    root = root if root is not None else element
+                    continue
+                tag = local_name(element.tag)
+                if tag not in ("url", "sitemap"):
+                    continue
+                loc = next(
+                    (
+                        child.text.strip()
+                        for child in element
+                        if local_name(child.tag) == "loc" and child.text
+                    ),
+                    None,
+                )
+                if loc:
+                    yield tag, loc
+                # entries are not needed once read, keep the tree empty
+                root.clear()
@@ -0,0 +1,176 @@
+"""
+Module to canonicalize urls so that variants of a page are crawled once, along with a
+fast check of the domain a url lies in.
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+from urllib.parse import quote, urlsplit, urlunsplit
+
+from config.constants import (
+    DOMAIN_MATCH_MODE,
+    INDEX_FILES,
+    STRIP_TRAILING_SLASH,
+    UNIFY_SCHEME,
+    URL_CACHE_SIZE,
+)
+
+DEFAULT_PORTS = {"http": "80", "https": "443"}
+UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~"
+)
+# characters kept as is, "%" keeps escapes already present
+PATH_SAFE = "/:@!$&'()*+,;=%"
+QUERY_SAFE = PATH_SAFE + "?"
+ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+
+
+def _normalize_escape(match: re.Match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else f"%{match.group(1).upper()}"
+
+
+def normalize_percent_encoding(value: str, safe: str) -> str:
+    """
+    Decode escaped unreserved characters, upper-case the other escapes and escape
+    characters which are not allowed.
+
+    :param value: The path or query.
+    :param safe: The characters not to escape.
+    :return: The normalized value.
+    """
+    return quote(ESCAPE.sub(_normalize_escape, value), safe=safe)
+
+
+def remove_dot_segments(path: str) -> str:
+    """
+    Resolve "." and ".." segments of an absolute path (RFC 3986 section 5.2.4).
+
+    :param path: The path.
+    :return: The path without dot segments.
+    """
+    segments = path.split("/")
+    output = []
+    for segment in segments[1:]:
+        if segment == "..":
+            if output:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        output.append("")
+    return "/" + "/".join(output)
+
+
+def normalize_netloc(netloc: str, scheme: str) -> str:
+    """
+    :param netloc: The network location of the url.
+    :param scheme: The lower-cased scheme of the url.
+    :return: The location lower-cased, without a trailing dot or default port.
+    """
+    userinfo, at, hostport = netloc.rpartition("@")
+    hostport = hostport.lower()
+    host, port = hostport, ""
+    if not hostport.endswith("]") and ":" in hostport:
+        host, _, port = hostport.rpartition(":")
+    host = host.rstrip(".")
+    if port == DEFAULT_PORTS.get(scheme) or not port:
+        return f"{userinfo}{at}{host}"
+    return f"{userinfo}{at}{host}:{port}"
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def canonicalize(url: str) -> str:
+    """
+    Canonical form of an absolute http(s) url. Scheme and host are lower-cased, default
+    ports, fragments, dot segments and index files are removed and percent-encoding is
+    normalized. Other urls are returned as they are.
+
+    :param url: The url.
+    :return: The canonical url.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.netloc:
+        return url
+    path = remove_dot_segments(normalize_percent_encoding(parts.path or "/", PATH_SAFE))
+    directory, _, name = path.rpartition("/")
+    if name in INDEX_FILES:
+        path = f"{directory}/"
+    if STRIP_TRAILING_SLASH and len(path) > 1 and path.endswith("/"):
+        path = path[:-1]
+    return urlunsplit(
+        (
+            scheme,
+            normalize_netloc(parts.netloc, scheme),
+            path,
+            normalize_percent_encoding(parts.query, QUERY_SAFE),
+            "",
+        )
+    )
+
+
+@lru_cache(maxsize=URL_CACHE_SIZE)
+def split_canonical(url: str) -> tuple[str, str, str]:
+    """
+    :param url: The url.
+    :return: The scheme, network location and rest of its canonical form.
+    """
+    canonical = canonicalize(url)
+    scheme, separator, rest = canonical.partition("://")
+    if not separator:
+        return "", "", canonical
+    netloc, slash, rest = rest.partition("/")
+    return scheme, netloc, slash + rest
+
+
+class DomainMatcher:
+    """
+    Checks whether urls lie within the domain of a crawl. The mode is "exact" for the
+    host of the root only, "subdomain" to also match its subdomains or "suffix" to match
+    any host ending with it.
+    """
+
+    def __init__(self, url: str, mode: str = DOMAIN_MATCH_MODE):
+        """
+        :param url: The root url of the crawl.
+        :param mode: One of "exact", "subdomain" or "suffix".
+        """
+        self.scheme, self.domain, _ = split_canonical(url)
+        self.mode = mode
+        self._subdomain_suffix = f".{self.domain}"
+
+    def matches_netloc(self, netloc: str) -> bool:
+        """
+        :param netloc: The canonical network location of a url.
+        :return: Whether it lies within the domain.
+        """
+        if netloc == self.domain:
+            return True
+        if self.mode == "subdomain":
+            return netloc.endswith(self._subdomain_suffix)
+        if self.mode == "suffix":
+            return netloc.endswith(self.domain)
+        return False
+
+    def resolve(self, url: str) -> str | None:
+        """
+        :param url: The url.
+        :return: The canonical url, on the scheme of the root when UNIFY_SCHEME is set,
+            or None if it lies outside the domain.
+        """
+        scheme, netloc, rest = split_canonical(url)
+        if not scheme or not self.matches_netloc(netloc):
+            return None
+        if UNIFY_SCHEME and scheme != self.scheme:
+            scheme = self.scheme
+        return f"{scheme}://{netloc}{rest}"
+
+    def filter(self, urls: List[str]) -> List[str]:
+        """
+        :param urls: The urls.
+        :return: The canonical urls lying within the domain, without duplicates.
+        """
+        resolved = (self.resolve(url) for url in urls)
+        return list(dict.fromkeys(url for url in resolved if url))
@@ -1,9 +1,11 @@
 """Main module starts the server"""
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware import Middleware
 
 from api import router as api_router
+from helper.metrics import render_metrics
+from middlewares.compression_middleware import CompressionMiddleware
 from middlewares.time_taken_middleware import TimeTakenMiddleware
 from middlewares.uuid_middleware import UUIDMiddleware
 from setup import lifespan
@@ -11,6 +13,7 @@ from setup import lifespan
 middlewares = [
     Middleware(UUIDMiddleware),
     Middleware(TimeTakenMiddleware),
+    Middleware(CompressionMiddleware),
 ]
 
 app = FastAPI(docs_url="/", middleware=middlewares, lifespan=lifespan)
@@ -23,3 +26,11 @@ async def health():
     # required for k8 to check whether pod is alive or not
     # docs api can also be used
     return {"status": "healthy"}
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Prometheus metrics api"""
+    # scraped by prometheus, also drives the autoscaler through the metrics adapter
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
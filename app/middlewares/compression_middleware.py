@@ -0,0 +1,184 @@
+"""Compression middleware"""
+
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple, Type
+
+import brotli
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+
+from config.constants import (
+    COMPRESSIBLE_CONTENT_TYPES,
+    COMPRESSION_LEVELS,
+    COMPRESSION_MIN_SIZE,
+    RESPONSE_ENCODINGS,
+)
+
+
+class Compressor(ABC):
+    """
+    Compresses the body of a response, message by message.
+    """
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """
+        :param data: A part of the body.
+        :return: Its compressed data, flushed so that the client can decode it at once.
+        """
+
+    @abstractmethod
+    def finish(self, data: bytes) -> bytes:
+        """
+        :param data: The last part of the body.
+        :return: The rest of the compressed body.
+        """
+
+
+class GzipCompressor(Compressor):
+    """gzip"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(
+            COMPRESSION_LEVELS["gzip"], zlib.DEFLATED, zlib.MAX_WBITS | 16
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_SYNC_FLUSH
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliCompressor(Compressor):
+    """brotli"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=COMPRESSION_LEVELS["br"])
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class ZstdCompressor(Compressor):
+    """zstd"""
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(
+            level=COMPRESSION_LEVELS["zstd"]
+        ).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+COMPRESSORS: Dict[str, Type[Compressor]] = {
+    "gzip": GzipCompressor,
+    "br": BrotliCompressor,
+    "zstd": ZstdCompressor,
+}
+
+
+def negotiate_encoding(accept_encoding: str, encodings: Tuple[str, ...]) -> str | None:
+    """
+    :param accept_encoding: The Accept-Encoding header of the request.
+    :param encodings: The encodings available, in order of preference.
+    :return: The encoding the client prefers, ties going to the first available one.
+    """
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressionMiddleware:
+    # pylint: disable=too-few-public-methods
+    """
+    Compresses responses with the encoding negotiated from Accept-Encoding. Streamed
+    responses are compressed message by message and flushed, so that records still
+    reach the client as soon as they are sent.
+    """
+
+    def __init__(self, app, encodings: Tuple[str, ...] = RESPONSE_ENCODINGS):
+        self.app = app
+        self.encodings = encodings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                # held until the first part of the body tells whether to compress
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                if (
+                    "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(
+                        COMPRESSIBLE_CONTENT_TYPES
+                    )
+                    and (more_body or len(body) >= COMPRESSION_MIN_SIZE)
+                ):
+                    compressor = COMPRESSORS[encoding]()
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    if more_body:
+                        if "content-length" in headers:
+                            del headers["content-length"]
+                    else:
+                        body = compressor.finish(body)
+                        headers["Content-Length"] = str(len(body))
+                        compressor = None
+                    message = {**message, "body": body}
+                await send(start)
+                start = None
+            if compressor is None:
+                await send(message)
+                return
+            body = compressor.compress(body) if more_body else compressor.finish(body)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -3,18 +3,52 @@
 import logging
 import time
 
+from helper.metrics import IN_FLIGHT, REQUEST_SECONDS
+
 logger = logging.getLogger(__name__)
 
 
 class TimeTakenMiddleware:
     # pylint: disable=too-few-public-methods
-    """Time taken to serve request"""
+    """Time taken to serve request, also recorded for the metrics of api requests"""
 
     def __init__(self, app):
         self.app = app
 
     async def __call__(self, scope, receive, send):
-        start_time = time.time()
-        await self.app(scope, receive, send)
-        end_time = time.time()
-        logger.info(f"Time taken: {end_time - start_time}")
+        if scope["type"] != "http":
+            await self.timed(scope, receive, send)
+            return
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with IN_FLIGHT.labels(kind="api").track_inprogress():
+            time_taken = await self.timed(scope, receive, send_status)
+        # templated path, ids of jobs would make every request a series of its own
+        route = scope.get("route")
+        REQUEST_SECONDS.labels(
+            method=scope["method"],
+            route=route.path if route else "unmatched",
+            status=status,
+        ).observe(time_taken)
+
+    async def timed(self, scope, receive, send) -> float:
+        """
+        Serve the request and log the time taken
+        :param scope:
+        :param receive:
+        :param send:
+        :return: seconds taken
+        """
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            time_taken = time.perf_counter() - start_time
+            logger.info(f"Time taken: {time_taken}")
+        return time_taken
@@ -1,6 +1,8 @@
 """Crawl request schema"""
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+from helper.crawl_state import CrawlBudget
 
 
 class CrawlRequest(BaseModel):
@@ -8,3 +10,66 @@ class CrawlRequest(BaseModel):
 
     # pylint: disable=too-few-public-methods
     url: str = Field(..., pattern="^https?://")
+    # revalidate every page with the origin instead of serving cached results
+    refresh: bool = False
+    # share the crawl with the workers of every pod
+    distributed: bool = False
+    # also crawl the pages listed by the sitemaps named in robots.txt or /sitemap.xml
+    seed_sitemaps: bool = False
+    # skip the pages disallowed by robots.txt and honor its crawl-delay
+    respect_robots: bool = False
+    # limits of the crawl, a partial result is returned once one is hit
+    max_depth: int | None = Field(None, ge=0)
+    max_pages: int | None = Field(None, ge=1)
+    max_total_bytes: int | None = Field(None, ge=1)
+    max_page_bytes: int | None = Field(None, ge=1)
+    # seconds the crawl may take
+    max_duration: float | None = Field(None, gt=0)
+
+    @model_validator(mode="after")
+    def check_distributed_budget(self):
+        """
+        Distributed crawls are only limited in time
+        :return:
+        """
+        limits = self.budget()
+        limits.max_duration = None
+        if self.distributed and limits.is_limited:
+            raise ValueError("distributed crawls only support max_duration")
+        return self
+
+    def budget(self) -> CrawlBudget:
+        """
+        :return: limits of the crawl
+        """
+        return CrawlBudget(
+            max_depth=self.max_depth,
+            max_pages=self.max_pages,
+            max_total_bytes=self.max_total_bytes,
+            max_page_bytes=self.max_page_bytes,
+            max_duration=self.max_duration,
+        )
+
+
+class LocalCrawlRequest(CrawlRequest):
+    """A crawl served by the workers of the pod it was sent to, as streams, jobs and batches are"""
+
+    # pylint: disable=too-few-public-methods
+
+    @model_validator(mode="after")
+    def check_not_distributed(self):
+        """
+        Only crawls answered as a whole are shared with other pods
+        :return:
+        """
+        if self.distributed:
+            raise ValueError("only POST /crawl/ crawls can be distributed")
+        return self
+
+
+class BatchCrawlRequest(LocalCrawlRequest):
+    """A line of a batch crawl, results of the root are tagged with its request_id"""
+
+    # pylint: disable=too-few-public-methods
+    # defaults to the line number of the request, counted from 1
+    request_id: str | None = None
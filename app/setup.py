@@ -1,10 +1,17 @@
 """Sets up the logger"""
 
+import asyncio
 import contextlib
 import logging
 
+from config.constants import LOCAL_CACHE_INVALIDATION
+from controllers.distributed_crawl_controller import DistributedCrawlController
+from controllers.job_controller import JobController
 from filters.health_check_filter import HealthCheckFilter
 from filters.op_filter import OpFilter
+from helper.http_helper import HttpHelper
+from helper.page_store import PageStore
+from helper.parse_executor import ParseExecutor
 from helper.redis_helper import RedisHelper
 
 logging.basicConfig(level=logging.INFO)
@@ -16,9 +23,25 @@ logger = logging.getLogger(__name__)
 async def lifespan(_app):
     """lifespan event"""
     setup_logger()
-    async with RedisHelper() as redis:
-        logger.info(id(redis))
-        yield
+    with ParseExecutor(), PageStore():
+        async with RedisHelper() as redis, HttpHelper() as http:
+            logger.info(id(redis))
+            logger.info(id(http))
+            # take part in distributed crawls started by any pod
+            distributed_crawls = asyncio.create_task(
+                DistributedCrawlController().serve()
+            )
+            invalidations = None
+            if LOCAL_CACHE_INVALIDATION:
+                # keep the local cache coherent with the other pods
+                invalidations = asyncio.create_task(redis.listen_for_invalidations())
+            yield
+            # jobs record their progress while redis is still connected, another pod
+            # resumes them
+            await JobController.interrupt_jobs()
+            distributed_crawls.cancel()
+            if invalidations:
+                invalidations.cancel()
 
 
 def setup_logger():
@@ -0,0 +1 @@
+"""Benchmarks of the crawler against synthetic sites"""
@@ -0,0 +1,324 @@
+"""
+Crawls a synthetic site with a cold, a warm and a hot cache and reports the throughput,
+latency, memory and redis usage of every run as JSON.
+
+    python -m benchmarks.run_benchmark --pages 2000 --latency 0.01 --output result.json
+    python -m benchmarks.run_benchmark --baseline result.json
+
+Runs against the redis of config.constants unless --fake-redis is given, only the keys of
+the synthetic site are removed from it.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+# pylint: disable=wrong-import-position
+from config.constants import HOST_MAX_CONCURRENCY
+from controllers.crawl_controller import CrawlController
+from helper.http_helper import HttpHelper
+from helper.metrics import REDIS_SECONDS
+from helper.parse_executor import ParseExecutor
+from helper.redis_helper import RedisHelper
+
+from benchmarks.synthetic_site import SiteSpec, SyntheticSite
+
+# cold: nothing is cached, warm: pages are cached in redis, hot: also in memory
+MODES = ("cold", "warm", "hot")
+# compared with the baseline, higher is better for the first and lower for the others
+COMPARED = {
+    "pages_per_sec": 1,
+    "latency_p50_ms": -1,
+    "latency_p99_ms": -1,
+    "peak_rss_mb": -1,
+    "redis_ops_per_page": -1,
+}
+
+
+class TimedCrawlController(CrawlController):
+    """Crawl controller recording how long every page fetched took"""
+
+    def __init__(self):
+        super().__init__()
+        self.latencies = []
+
+    async def crawl_page(self, url, state):
+        started = time.perf_counter()
+        try:
+            return await super().crawl_page(url, state)
+        finally:
+            self.latencies.append(time.perf_counter() - started)
+
+
+class RssSampler:
+    """Samples the resident memory of the process to find its peak during a run"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self._task = None
+
+    @staticmethod
+    def current() -> int:
+        """
+        :return: The resident memory in bytes, the peak of the process without procfs.
+        """
+        try:
+            with open("/proc/self/statm", encoding="ascii") as statm:
+                return int(statm.read().split()[1]) * resource.getpagesize()
+        except OSError:
+            # kilobytes on linux, bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    async def _sample(self):
+        while True:
+            self.peak = max(self.peak, self.current())
+            await asyncio.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._task = asyncio.create_task(self._sample())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._task.cancel()
+        self.peak = max(self.peak, self.current())
+
+
+def redis_ops() -> int:
+    """
+    :return: The redis operations issued through RedisHelper so far, pipelines count once.
+    """
+    return int(
+        sum(
+            sample.value
+            for metric in REDIS_SECONDS.collect()
+            for sample in metric.samples
+            if sample.name.endswith("_count")
+        )
+    )
+
+
+def percentile_ms(values, percentile: int) -> float | None:
+    """
+    :param values: The durations in seconds.
+    :param percentile: The percentile, from 1 to 99.
+    :return: The percentile in milliseconds, None without values.
+    """
+    if not values:
+        return None
+    if len(values) == 1:
+        return round(values[0] * 1000, 3)
+    return round(statistics.quantiles(values, n=100)[percentile - 1] * 1000, 3)
+
+
+async def reset_cache(redis_helper: RedisHelper, site: SyntheticSite, mode: str):
+    """
+    Drops what the mode does not keep cached: whole crawl results always, pages of the
+    site in redis for a cold run and pages in memory for cold and warm runs.
+    """
+    pattern = f"*127.0.0.1:{site.port}*" if mode == "cold" else f"crawl:*:{site.port}*"
+    keys = [key async for key in redis_helper.conn.scan_iter(match=pattern)]
+    if keys:
+        await redis_helper.conn.delete(*keys)
+    if mode != "hot":
+        redis_helper.local_cache.clear()
+
+
+async def run(site: SyntheticSite, mode: str, polite: bool) -> dict:
+    """
+    :param site: The site served.
+    :param mode: One of MODES.
+    :param polite: Keep the per host pacing, otherwise requests are only capped by the pool.
+    :return: Measures of the crawl.
+    """
+    controller = TimedCrawlController()
+    await reset_cache(controller.redis_helper, site, mode)
+    if not polite:
+        limiter = controller.host_scheduler.limiter(site.root_url)
+        limiter.rate = limiter.burst = limiter.tokens = 1e9
+        limiter.limit = HOST_MAX_CONCURRENCY
+    ops = redis_ops()
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        sitemap, errors, _ = await controller.crawl(site.root_url)
+        seconds = time.perf_counter() - started
+    pages = len(sitemap) + len(errors)
+    return {
+        "mode": mode,
+        "pages": len(sitemap),
+        "errors": len(errors),
+        "fetched": len(controller.latencies),
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(pages / seconds, 2),
+        "latency_p50_ms": percentile_ms(controller.latencies, 50),
+        "latency_p99_ms": percentile_ms(controller.latencies, 99),
+        "peak_rss_mb": round(rss.peak / 1024**2, 2),
+        "redis_ops_per_page": round((redis_ops() - ops) / pages, 3) if pages else None,
+    }
+
+
+async def connect_fake_redis(redis_helper: RedisHelper):
+    """
+    Points the redis helper at an in-process fakeredis server.
+    """
+    try:
+        import fakeredis  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        sys.exit("--fake-redis needs fakeredis, pip install -r dev-requirements.txt")
+    server = fakeredis.FakeServer()
+    redis_helper.local_cache.clear()
+    redis_helper.conn = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    redis_helper.raw_conn = fakeredis.FakeAsyncRedis(server=server)
+
+
+async def benchmark(spec: SiteSpec, repeat: int, fake_redis: bool, polite: bool):
+    """
+    :return: Runs of every mode, repeated.
+    """
+    runs = []
+    redis_helper = RedisHelper()
+    if fake_redis:
+        # a live connection is kept by the helper
+        await connect_fake_redis(redis_helper)
+    with ParseExecutor(), SyntheticSite(spec) as site:
+        async with redis_helper, HttpHelper():
+            for _ in range(repeat):
+                for mode in MODES:
+                    runs.append(await run(site, mode, polite))
+    return runs
+
+
+def git_revision() -> str | None:
+    """
+    :return: The commit being measured, None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(runs) -> dict:
+    """
+    :return: The median of every compared measure by mode.
+    """
+    summary = {}
+    for mode in MODES:
+        mode_runs = [run for run in runs if run["mode"] == mode]
+        summary[mode] = {}
+        for name in COMPARED:
+            values = [run[name] for run in mode_runs if run[name] is not None]
+            summary[mode][name] = (
+                round(statistics.median(values), 3) if values else None
+            )
+    return summary
+
+
+def compare(summary: dict, baseline: dict, tolerance: float) -> list:
+    """
+    :param summary: The summary of this version.
+    :param baseline: The summary of the version compared with.
+    :param tolerance: Relative change allowed before a measure is reported.
+    :return: The measures which got worse past the tolerance.
+    """
+    regressions = []
+    for mode, measures in summary.items():
+        for name, direction in COMPARED.items():
+            value, base = measures.get(name), baseline.get(mode, {}).get(name)
+            if not value or not base:
+                continue
+            change = (value - base) / base
+            if change * direction < -tolerance:
+                regressions.append(
+                    {"mode": mode, "measure": name, "baseline": base, "value": value}
+                )
+    return regressions
+
+
+def parse_args():
+    """
+    :return: The command line arguments.
+    """
+    defaults = SiteSpec()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--pages", type=int, default=defaults.pages)
+    parser.add_argument("--fan-out", type=int, default=defaults.fan_out)
+    parser.add_argument("--depth", type=int, default=defaults.depth)
+    parser.add_argument("--cross-links", type=int, default=defaults.cross_links)
+    parser.add_argument("--page-size", type=int, default=defaults.page_size)
+    parser.add_argument("--latency", type=float, default=defaults.latency)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of every mode")
+    parser.add_argument("--fake-redis", action="store_true")
+    parser.add_argument(
+        "--polite", action="store_true", help="keep the per host rate limit"
+    )
+    parser.add_argument("--output", help="file the results are written to")
+    parser.add_argument("--baseline", help="results of an earlier version")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="relative change of a measure reported as a regression",
+    )
+    return parser.parse_args()
+
+
+def main():
+    """runs the benchmark, exits with 1 on a regression from the baseline"""
+    args = parse_args()
+    spec = SiteSpec(
+        pages=args.pages,
+        fan_out=args.fan_out,
+        depth=args.depth,
+        cross_links=args.cross_links,
+        page_size=args.page_size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    runs = asyncio.run(benchmark(spec, args.repeat, args.fake_redis, args.polite))
+    result = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spec": spec.to_dict(),
+        "fake_redis": args.fake_redis,
+        "polite": args.polite,
+        "runs": runs,
+        "summary": summarize(runs),
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            result["regressions"] = compare(
+                result["summary"], json.load(baseline)["summary"], args.tolerance
+            )
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    print(output)
+    if result.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Synthetic sites crawled by the benchmarks. A site is fully determined by its spec, so
+that every version of the crawler is measured against the same pages.
+"""
+
+import asyncio
+import multiprocessing
+import random
+from dataclasses import asdict, dataclass
+from typing import Dict, List
+
+from aiohttp import web
+
+
+@dataclass
+class SiteSpec:
+    """Shape of a synthetic site"""
+
+    # pages of the site, "/p/0" is the root
+    pages: int = 1000
+    # child pages linked by every page, the site is a tree of this fan-out
+    fan_out: int = 5
+    # levels below the root, pages beyond it are not generated
+    depth: int | None = None
+    # random links to any page of the site, on top of the children
+    cross_links: int = 2
+    # bytes of every page, padded with text
+    page_size: int = 4096
+    # mean seconds taken to answer a page, every page is given its own latency
+    latency: float = 0.0
+    # share of the pages answering with a 500
+    error_rate: float = 0.0
+    seed: int = 0
+
+    def to_dict(self) -> dict:
+        """
+        :return: The spec, as recorded with the results.
+        """
+        return asdict(self)
+
+
+@dataclass
+class Page:
+    """A page of a synthetic site"""
+
+    body: bytes
+    latency: float
+    status: int = 200
+
+
+def page_count(spec: SiteSpec) -> int:
+    """
+    :param spec: The spec of the site.
+    :return: The number of pages generated, capped by the depth.
+    """
+    if spec.depth is None:
+        return spec.pages
+    total, level = 0, 1
+    for _ in range(spec.depth + 1):
+        total += level
+        level *= spec.fan_out
+    return min(spec.pages, total)
+
+
+def build_site(spec: SiteSpec) -> Dict[str, Page]:
+    """
+    :param spec: The spec of the site.
+    :return: The pages of the site by path.
+    """
+    rng = random.Random(spec.seed)
+    count = page_count(spec)
+    failing = set(rng.sample(range(1, count), int((count - 1) * spec.error_rate)))
+    pages = {}
+    for index in range(count):
+        first_child = index * spec.fan_out + 1
+        links: List[int] = list(
+            range(first_child, min(first_child + spec.fan_out, count))
+        )
+        links += [rng.randrange(count) for _ in range(spec.cross_links)]
+        html = "<html><body>" + "".join(
+            f'<a href="/p/{link}">page {link}</a>' for link in links
+        )
+        html += "<p>"
+        closing = "</p></body></html>"
+        html += "x" * max(0, spec.page_size - len(html) - len(closing)) + closing
+        latency = spec.latency * (0.5 + rng.random())
+        status = 500 if index in failing else 200
+        pages[f"/p/{index}"] = Page(html.encode("utf-8"), latency, status)
+    return pages
+
+
+def make_app(spec: SiteSpec) -> web.Application:
+    """
+    :param spec: The spec of the site.
+    :return: The application serving the site.
+    """
+    pages = build_site(spec)
+
+    async def serve_page(request: web.Request) -> web.Response:
+        page = pages.get(request.path)
+        if page is None:
+            return web.Response(status=404)
+        if page.latency:
+            await asyncio.sleep(page.latency)
+        if page.status != 200:
+            return web.Response(status=page.status)
+        return web.Response(body=page.body, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/p/{index}", serve_page)
+    return app
+
+
+def _serve(spec: SiteSpec, connection):
+    async def serve():
+        runner = web.AppRunner(make_app(spec), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        connection.send(runner.addresses[0][1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+class SyntheticSite:
+    """
+    Serves a synthetic site from another process, so that serving pages does not take
+    time from the crawler being measured.
+    """
+
+    def __init__(self, spec: SiteSpec):
+        """
+        :param spec: The spec of the site.
+        """
+        self.spec = spec
+        self.process = None
+        self.port = None
+
+    @property
+    def root_url(self) -> str:
+        """
+        :return: The url the crawl starts from.
+        """
+        return f"http://127.0.0.1:{self.port}/p/0"
+
+    def __enter__(self):
+        # a forked child would inherit the running event loop of the crawler
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self.process = context.Process(
+            target=_serve, args=(self.spec, sender), daemon=True
+        )
+        self.process.start()
+        if not receiver.poll(30):
+            self.process.terminate()
+            raise RuntimeError("Synthetic site did not start")
+        self.port = receiver.recv()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.process.terminate()
+        self.process.join()
@@ -1,29 +1,136 @@
 """Client for sending request to server"""
 import argparse
+import json
 import sys
 
 import requests
 
+try:
+    import orjson
+except ImportError:  # optional, parses large sitemaps faster
+    orjson = None
 
-def main(url):
-    """sends request to server"""
-    response = requests.post('http://localhost:8001/api/v1/crawl/', json={'url': url})
+# requests already asks for gzip, and for br/zstd when brotli/zstandard are installed,
+# and decodes the response
+loads = orjson.loads if orjson is not None else json.loads
+
+
+def main(url, compact=False):
+    """sends request to server, a compact sitemap names every url once"""
+    response = requests.post(
+        'http://localhost:8001/api/v1/crawl/',
+        json={'url': url},
+        params={'format': 'compact' if compact else 'json'},
+    )
     if response.status_code == 200:
-        print_sitemap(response.json(), url)
+        print_sitemap(read_sitemap(loads(response.content), compact), url)
     elif response.status_code == 404:
         print_error(f"Error in the URL: {url}")
         sys.exit(1)
     elif response.status_code == 207:
-        resp = response.json()
-        print_sitemap(resp.get("sitemap"), url)
-        print_error("----- ERROR ------")
-        print_errors(resp.get("errors"))
+        resp = loads(response.content)
+        print_sitemap(read_sitemap(resp.get("sitemap"), compact), url)
+        if resp.get("truncated"):
+            print_error(f"Crawl truncated by {resp['truncated']}")
+        if resp.get("errors"):
+            print_error("----- ERROR ------")
+            print_errors(resp.get("errors"))
         sys.exit(2)
     else:
         print_error("Something went wrong, check the server/client logs")
         sys.exit(3)
 
 
+def stream(url):
+    """streams the sitemap from server, printing pages as soon as they are crawled"""
+    response = requests.post(
+        'http://localhost:8001/api/v1/crawl/stream', json={'url': url}, stream=True
+    )
+    if response.status_code != 200:
+        print_error("Something went wrong, check the server/client logs")
+        sys.exit(3)
+    errors = 0
+    for line in response.iter_lines():
+        if not line:
+            continue
+        record = loads(line)
+        if "links" in record:
+            print_page(record["page"], record["links"])
+        elif "page" in record:
+            errors += 1
+            print_error(f"{record['page']} caused due to {record['error']}")
+        elif record.get("truncated"):
+            print_error(f"Crawl truncated by {record['truncated']}")
+        elif record.get("status") == "failed":
+            print_error(f"Crawl failed due to {record.get('error')}")
+            sys.exit(3)
+    if errors:
+        sys.exit(2)
+
+
+def batch(path):
+    """
+    crawls every root of a JSONL file of crawl requests, "-" reads stdin, printing pages
+    tagged with the request_id of their root (or its line number) as soon as they are crawled
+    """
+    file = sys.stdin.buffer if path == '-' else open(path, 'rb')
+    with file:
+        response = requests.post(
+            'http://localhost:8001/api/v1/crawl/batch',
+            # streamed from the file rather than read into memory, the server crawls once it
+            # received the whole batch
+            data=iter(lambda: file.read(64 * 1024), b''),
+            headers={'Content-Type': 'application/x-ndjson'},
+            stream=True,
+        )
+    if response.status_code != 200:
+        print_error("Something went wrong, check the server/client logs")
+        sys.exit(3)
+    failed = False
+    for line in response.iter_lines():
+        if not line:
+            continue
+        record = loads(line)
+        root = record.get('root')
+        if "links" in record:
+            print_page(f"[{root}] {record['page']}", record["links"])
+        elif "page" in record:
+            failed = True
+            print_error(f"[{root}] {record['page']} caused due to {record['error']}")
+        elif root is None:
+            print_error(
+                f"{record['roots']} roots crawled: {record['pages']} pages, "
+                f"{record['errors']} errors"
+            )
+        elif record.get("status") == "failed":
+            failed = True
+            print_error(f"[{root}] Crawl failed due to {record.get('error')}")
+        elif record.get("truncated"):
+            print_error(f"[{root}] Crawl truncated by {record['truncated']}")
+    if failed:
+        sys.exit(2)
+
+
+def read_sitemap(sitemap, compact):
+    """links of every page of a sitemap, compact ones hold indexes into a table of urls"""
+    if not compact:
+        return sitemap
+    urls = sitemap['urls']
+    return {
+        urls[page]: [urls[link] for link in links]
+        for page, links in enumerate(sitemap['links'])
+    }
+
+
+def print_page(page, links):
+    """prints a page with the links found on it"""
+    print(page)
+    for link in links:
+        print(' ' * 2 + link)
+    # flush so that the page is shown while the crawl goes on
+    sys.stdout.flush()
+
+
 def print_sitemap(sitemap, root, indent=0):
     """recursively prints sitemap"""
     print(' ' * indent + root)
@@ -44,7 +151,32 @@ def print_error(message):
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Web Crawler Client')
-    parser.add_argument('url', type=str, help='The URL to start crawling from')
+    parser.add_argument(
+        'url',
+        type=str,
+        nargs='?',
+        help='The URL to start crawling from',
+    )
+    parser.add_argument(
+        '--stream', action='store_true', help='print pages as soon as they are crawled'
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='receive the sitemap as a table of urls, smaller for large sites',
+    )
+    parser.add_argument(
+        '--batch',
+        metavar='FILE',
+        help='crawl every root of a JSONL file of crawl requests, "-" reads stdin',
+    )
     args = parser.parse_args()
+    if (args.url is None) == (args.batch is None):
+        parser.error('give either a URL or --batch')
 
-    main(args.url)
+    if args.batch:
+        batch(args.batch)
+    elif args.stream:
+        stream(args.url)
+    else:
+        main(args.url, compact=args.compact)
@@ -8,3 +8,7 @@ set -o nounset
 # replace the celery constants from the env variables
 sed -i "/CACHE_EXPIRY =/ c CACHE_EXPIRY = ${CACHE_EXPIRY}" /app/config/constants.py
 sed -i '/REDIS_HOST =/ c REDIS_HOST = \"'${REDIS_HOST}'\"' /app/config/constants.py
+
+# metrics of the workers of an earlier run are stale
+rm -rf "${PROMETHEUS_MULTIPROC_DIR}"
+mkdir -p "${PROMETHEUS_MULTIPROC_DIR}"
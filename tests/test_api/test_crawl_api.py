@@ -0,0 +1,57 @@
+"""Tests crawl api"""
+
+import json
+
+import pytest
+from pydantic import ValidationError
+from pytest_mock import MockerFixture
+
+from api.v1.crawl_api import CrawlAPI
+from schemas.crawl_request import BatchCrawlRequest, CrawlRequest, LocalCrawlRequest
+
+
+class TestCrawlAPI:
+    """Test Crawl API"""
+
+    @pytest.mark.asyncio
+    async def test_compact_errors(self, mocker: MockerFixture):
+        """
+        Tests a compact crawl which crawled no page fails like a json one
+        :param mocker:
+        :return:
+        """
+        errors = {"https://foo.com/": "Failed"}
+        crawl_api = CrawlAPI()
+        crawl_api.crawl_controller = mocker.MagicMock()
+        crawl_api.crawl_controller.crawl = mocker.AsyncMock(
+            return_value=({}, errors, None)
+        )
+        request = CrawlRequest(url="https://foo.com/")
+        for fmt in ("json", "compact"):
+            response = await crawl_api.crawl(request, fmt=fmt)
+            assert response.status_code == 400
+            assert json.loads(response.body) == {
+                "status": "failure",
+                "errors": errors,
+                "truncated": None,
+            }
+
+        sitemap = {"https://foo.com/": ["https://foo.com/a"]}
+        crawl_api.crawl_controller.crawl.return_value = (sitemap, errors, None)
+        response = await crawl_api.crawl(request, fmt="compact")
+        assert response.status_code == 207
+        assert json.loads(response.body)["sitemap"] == {
+            "urls": ["https://foo.com/", "https://foo.com/a"],
+            "links": [[1]],
+        }
+
+    def test_local_requests(self):
+        """
+        Tests jobs, streams and batches reject distributed crawls instead of ignoring
+        them
+        :return:
+        """
+        for request_type in (LocalCrawlRequest, BatchCrawlRequest):
+            with pytest.raises(ValidationError):
+                request_type(url="https://foo.com/", distributed=True)
+            assert not request_type(url="https://foo.com/").distributed
@@ -0,0 +1,20 @@
+"""Tests synthetic site"""
+
+from benchmarks.synthetic_site import SiteSpec, build_site
+
+
+class TestSyntheticSite:
+    """Test Synthetic Site"""
+
+    def test_build_site(self):
+        """
+        Tests sites are generated the same for a spec
+        :return:
+        """
+        spec = SiteSpec(pages=100, fan_out=3, depth=2, page_size=512, error_rate=0.25)
+        site = build_site(spec)
+        assert len(site) == 13
+        assert sum(page.status == 500 for page in site.values()) == 3
+        assert all(len(page.body) >= 512 for page in site.values())
+        assert b'href="/p/1"' in site["/p/0"].body
+        assert site == build_site(spec)
@@ -0,0 +1,85 @@
+"""Tests batch crawls"""
+
+import contextlib
+
+import pytest
+from pytest_mock import MockerFixture
+
+from controllers.batch_controller import BatchController
+from helper.http_helper import HttpHelper
+from helper.redis_helper import RedisHelper
+from schemas.crawl_request import BatchCrawlRequest
+from tests.test_controllers.test_crawl_controller import mock_html_response
+
+PAGES = {
+    "https://foo.org/": '<a href="/a">a</a><a href="/b">b</a>',
+    "https://foo.org/a": '<a href="/">home</a>',
+    "https://foo.org/b": "",
+    "https://bar.org/": '<a href="/c">c</a><a href="https://foo.org/a">foo</a>',
+}
+
+
+class TestBatchController:
+    """Test Batch Controller"""
+
+    @pytest.mark.asyncio
+    async def test_stream(self, mocker: MockerFixture):
+        """
+        Tests roots of a batch are crawled on a shared frontier and reported separately
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+
+        @contextlib.asynccontextmanager
+        async def mock_get(url, **_kwargs):
+            """
+            mock the async request
+            :param url:
+            :param _kwargs: request options like headers
+            :return:
+            """
+            if url in PAGES:
+                yield mock_html_response(mocker, PAGES[url], url=url)
+            else:
+                yield mock_html_response(mocker, "", status=404, url=url)
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get)
+
+        async def requests():
+            """
+            roots of the batch, the second line is invalid
+            :return:
+            """
+            yield "foo", BatchCrawlRequest(url="https://foo.org/", refresh=True)
+            yield "2", "url: Field required"
+            yield "bar", BatchCrawlRequest(url="https://bar.org/", refresh=True)
+
+        records = [record async for record in BatchController().stream(requests())]
+        pages = {
+            (record["root"], record["page"]) for record in records if "links" in record
+        }
+        assert pages == {
+            ("foo", "https://foo.org/"),
+            ("foo", "https://foo.org/a"),
+            ("foo", "https://foo.org/b"),
+            ("bar", "https://bar.org/"),
+        }
+        summaries = {
+            record["root"]: record for record in records[:-1] if "status" in record
+        }
+        assert summaries["foo"]["status"] == "completed"
+        assert summaries["foo"]["pages"] == 3
+        assert summaries["2"] == {
+            "root": "2",
+            "status": "failed",
+            "error": "url: Field required",
+        }
+        assert (summaries["bar"]["pages"], summaries["bar"]["errors"]) == (1, 1)
+        assert records[-1] == {
+            "status": "completed",
+            "roots": 3,
+            "pages": 4,
+            "errors": 1,
+        }
@@ -1,16 +1,46 @@
 """Tests crawl"""
 
+import asyncio
 import contextlib
 import os
-from unittest.mock import AsyncMock
+from collections import Counter
 
 import pytest
 from pytest_mock import MockerFixture
 
 from controllers.crawl_controller import CrawlController
+from helper.crawl_state import CrawlBudget
+from helper.http_helper import HttpHelper
 from helper.redis_helper import RedisHelper
 
 
+def mock_html_response(
+    mocker: MockerFixture, html: str, status=200, headers=None, url=""
+):
+    """
+    mock a response streaming the html
+    :param mocker:
+    :param html:
+    :param status:
+    :param headers:
+    :param url: the url of the page, links are resolved against it
+    :return:
+    """
+
+    async def iter_chunked(_size):
+        yield html.encode("utf-8")
+
+    response = mocker.MagicMock()
+    response.status = status
+    response.url = url
+    response.headers = headers or {}
+    response.charset = "utf-8"
+    response.content_length = len(html.encode("utf-8"))
+    response.content.total_bytes = response.content_length
+    response.content.iter_chunked = iter_chunked
+    return response
+
+
 class TestCrawlController:
     """Test Crawl Controller"""
 
@@ -37,7 +67,8 @@ class TestCrawlController:
                 "/",
                 "https://fonts.googleapis.com/css2",
                 "https://fonts.googleapis.com/icon",
-                "external-links-only",
+                # resolved against <base href="/">
+                "/external-links-only",
             ]
 
             links = self.crawl_controller.extract_links(test_str, "www.foo.bar.com/")
@@ -45,7 +76,8 @@ class TestCrawlController:
                 "/",
                 "https://fonts.googleapis.com/css2",
                 "https://fonts.googleapis.com/icon",
-                "www.foo.bar.com/external-links-only",
+                # resolved against <base href="/">
+                "/external-links-only",
             ]
 
     @pytest.mark.asyncio
@@ -57,28 +89,33 @@ class TestCrawlController:
         """
         # connect redis client
         await RedisHelper().connect()
+        # create the shared http session
+        await HttpHelper().connect()
         current_dir = os.path.dirname(__file__)
         file_path = os.path.join(
             current_dir, "html", "external-and-internal-links.html"
         )
 
         # Create mock responses for different URLs
-        mock_response_1 = mocker.MagicMock()
-        mock_response_1.status = 200
         with open(file_path, mode="r", encoding="utf-8") as file:
-            mock_response_1.text = AsyncMock(return_value=file.read())
+            mock_response_1 = mock_html_response(
+                mocker,
+                file.read(),
+                url="https://foo.com/external-and-internal-links",
+            )
 
         file_path = os.path.join(current_dir, "html", "external-links-only.html")
-        mock_response_2 = mocker.MagicMock()
-        mock_response_2.status = 200
         with open(file_path, mode="r", encoding="utf-8") as file:
-            mock_response_2.text = AsyncMock(return_value=file.read())
+            mock_response_2 = mock_html_response(
+                mocker, file.read(), url="https://foo.com/external-links-only"
+            )
 
         @contextlib.asynccontextmanager
-        async def mock_get_side_effect(url):
+        async def mock_get_side_effect(url, **_kwargs):
             """
             mock the async request
             :param url:
+            :param _kwargs: request options like headers
             :return:
             """
             if url == "https://foo.com/external-and-internal-links":
@@ -89,7 +126,7 @@ class TestCrawlController:
                 yield mocker.MagicMock()  # Default mock
 
         mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
-        sitemap, errors = await self.crawl_controller.crawl(
+        sitemap, errors, truncated = await self.crawl_controller.crawl(
             "https://foo.com/external-and-internal-links"
         )
         assert sitemap == {
@@ -101,3 +138,247 @@ class TestCrawlController:
         }
         # since home page is unreachable as status code is undefined
         assert len(errors) == 1
+        assert truncated is None
+        # the failed page is crawled again instead of replayed from the cache
+        assert (
+            await RedisHelper().get_value_by_key(
+                "crawl:https://foo.com/external-and-internal-links"
+            )
+            is None
+        )
+
+    @pytest.mark.asyncio
+    async def test_crawl_concurrency(self, mocker: MockerFixture):
+        """
+        Tests pages are crawled concurrently by CRAWL_CONCURRENCY workers, each page once
+        however many pages link to it
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+        mocker.patch("controllers.crawl_controller.CRAWL_CONCURRENCY", 3)
+        url = "https://pool.qux.com/"
+        # hosts of their own, so that pacing per host does not serialize the fetches
+        hosts = [f"https://{name}.pool.qux.com/" for name in "abcdef"]
+        html = "".join(f'<a href="{page}"></a>' for page in [url, *hosts])
+        fetched = Counter()
+        in_flight = max_in_flight = 0
+
+        @contextlib.asynccontextmanager
+        async def mock_get_side_effect(request_url, **_kwargs):
+            """
+            mock the async request, every page links to every other page
+            :param request_url:
+            :param _kwargs: request options like headers
+            :return:
+            """
+            nonlocal in_flight, max_in_flight
+            fetched[request_url] += 1
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            try:
+                await asyncio.sleep(0.05)
+                yield mock_html_response(mocker, html, url=request_url)
+            finally:
+                in_flight -= 1
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
+        sitemap, errors, _ = await self.crawl_controller.crawl(url, refresh=True)
+        assert set(sitemap) == {url, *hosts}
+        assert not errors
+        assert fetched == Counter([url, *hosts])
+        assert 1 < max_in_flight <= 3
+
+    @pytest.mark.asyncio
+    async def test_crawl_revalidation(self, mocker: MockerFixture):
+        """
+        Tests a refreshed crawl revalidates pages and reuses links of unmodified pages
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+        url = "https://bar.com/"
+        await RedisHelper().remove_key(f"page:{url}")
+        mock_response = mock_html_response(
+            mocker, '<a href="/about"></a>', headers={"ETag": '"v1"'}, url=url
+        )
+        not_modified = mocker.MagicMock()
+        not_modified.status = 304
+        not_modified.headers = {}
+        requests_headers = []
+
+        @contextlib.asynccontextmanager
+        async def mock_get_side_effect(request_url, headers=None):
+            """
+            mock the async request
+            :param request_url:
+            :param headers:
+            :return:
+            """
+            if request_url == url:
+                requests_headers.append(headers)
+                yield not_modified if headers else mock_response
+            else:
+                yield mocker.MagicMock()
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
+        sitemap, _, _ = await self.crawl_controller.crawl(url, refresh=True)
+        assert sitemap == {url: ["https://bar.com/about"]}
+
+        sitemap, _, _ = await self.crawl_controller.crawl(url, refresh=True)
+        assert sitemap == {url: ["https://bar.com/about"]}
+        assert requests_headers == [{}, {"If-None-Match": '"v1"'}]
+
+    @pytest.mark.asyncio
+    async def test_crawl_throttled(self, mocker: MockerFixture):
+        """
+        Tests a throttled page is fetched again once the host resumes
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+        url = "https://baz.com/"
+        throttled = mock_html_response(
+            mocker, "", status=429, headers={"Retry-After": "0"}
+        )
+        responses = [
+            throttled,
+            mock_html_response(mocker, '<a href="/about"></a>', url=url),
+        ]
+
+        @contextlib.asynccontextmanager
+        async def mock_get_side_effect(request_url, **_kwargs):
+            """
+            mock the async request
+            :param request_url:
+            :param _kwargs: request options like headers
+            :return:
+            """
+            yield responses.pop(0) if request_url == url else mocker.MagicMock()
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
+        sitemap, _, _ = await self.crawl_controller.crawl(url, refresh=True)
+        assert sitemap == {url: ["https://baz.com/about"]}
+        assert not responses
+
+    @pytest.mark.asyncio
+    async def test_crawl_budget(self, mocker: MockerFixture):
+        """
+        Tests a crawl stops at its limits and reports why it was truncated
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+        url = "https://qux.com/"
+
+        @contextlib.asynccontextmanager
+        async def mock_get_side_effect(request_url, **_kwargs):
+            """
+            mock the async request, every page links to two deeper pages
+            :param request_url:
+            :param _kwargs: request options like headers
+            :return:
+            """
+            page = request_url.rstrip("/")
+            yield mock_html_response(
+                mocker,
+                f'<a href="{page}/a"></a><a href="{page}/b"></a>',
+                url=request_url,
+            )
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
+        sitemap, _, truncated = await self.crawl_controller.crawl(
+            url, refresh=True, budget=CrawlBudget(max_depth=1)
+        )
+        assert len(sitemap) == 3
+        assert truncated == "max_depth"
+
+        sitemap, _, truncated = await self.crawl_controller.crawl(
+            url, refresh=True, budget=CrawlBudget(max_pages=5)
+        )
+        assert len(sitemap) == 5
+        assert truncated == "max_pages"
+
+    @pytest.mark.asyncio
+    async def test_crawl_robots_per_host(self, mocker: MockerFixture):
+        """
+        Tests links are checked against the robots.txt of their own host, whose
+        crawl-delay paces it
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+        url = "https://robots.qux.com/"
+        sub = "https://sub.robots.qux.com/"
+        pages = {
+            f"{url}robots.txt": "User-agent: *\nDisallow: /root-private",
+            f"{sub}robots.txt": "User-agent: *\nDisallow: /private\nCrawl-delay: 0.01",
+            url: f'<a href="/private"></a><a href="{sub}"></a>',
+            f"{url}private": "",
+            sub: '<a href="/private"></a><a href="/public"></a>',
+            f"{sub}public": "",
+        }
+
+        @contextlib.asynccontextmanager
+        async def mock_get_side_effect(request_url, **_kwargs):
+            """
+            mock the async request, the subdomain disallows its /private page
+            :param request_url:
+            :param _kwargs: request options like headers
+            :return:
+            """
+            yield mock_html_response(mocker, pages[request_url], url=request_url)
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
+        sitemap, errors, _ = await self.crawl_controller.crawl(
+            url, refresh=True, respect_robots=True
+        )
+        assert set(sitemap) == {url, f"{url}private", sub, f"{sub}public"}
+        assert not errors
+        limiter = self.crawl_controller.host_scheduler.limiter(sub)
+        assert limiter.crawl_delay_until is not None
+
+    @pytest.mark.asyncio
+    async def test_crawl_depth_of_shortest_path(self, mocker: MockerFixture):
+        """
+        Tests a page beyond max_depth on a fast long path is still crawled once a slow
+        short path reaches it
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        await HttpHelper().connect()
+        url = "https://depth.qux.com/"
+        pages = {
+            url: '<a href="/fast"></a><a href="/slow"></a>',
+            f"{url}fast": '<a href="/fast/deeper"></a>',
+            f"{url}fast/deeper": '<a href="/target"></a>',
+            f"{url}slow": '<a href="/target"></a>',
+            f"{url}target": "",
+        }
+
+        @contextlib.asynccontextmanager
+        async def mock_get_side_effect(request_url, **_kwargs):
+            """
+            mock the async request, the slow page answers after the deeper one
+            :param request_url:
+            :param _kwargs: request options like headers
+            :return:
+            """
+            if request_url.endswith("/slow"):
+                await asyncio.sleep(0.2)
+            yield mock_html_response(mocker, pages[request_url], url=request_url)
+
+        mocker.patch("aiohttp.ClientSession.get", wraps=mock_get_side_effect)
+        sitemap, errors, truncated = await self.crawl_controller.crawl(
+            url, refresh=True, budget=CrawlBudget(max_depth=2)
+        )
+        assert f"{url}target" in sitemap
+        assert len(sitemap) == 5
+        assert not errors
+        assert truncated == "max_depth"
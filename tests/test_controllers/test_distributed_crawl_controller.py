@@ -0,0 +1,95 @@
+"""Tests distributed crawls"""
+
+import asyncio
+from collections import Counter
+
+import pytest
+from pytest_mock import MockerFixture
+
+from controllers.distributed_crawl_controller import DistributedCrawlController
+from helper.redis_frontier import RedisFrontier
+from helper.redis_helper import RedisHelper
+
+SITE = {
+    "https://dist.org/": ["https://dist.org/a", "https://dist.org/b"],
+    "https://dist.org/a": ["https://dist.org/", "https://dist.org/c"],
+    "https://dist.org/b": ["https://dist.org/c", "https://dist.org/d"],
+    "https://dist.org/c": [],
+    "https://dist.org/d": ["https://dist.org/a"],
+}
+
+
+def mock_crawl_controller(mocker: MockerFixture, crawled: Counter):
+    """
+    mock a crawl controller crawling SITE, counting the pages it crawls
+    :param mocker:
+    :param crawled:
+    :return:
+    """
+
+    async def resolve_domain_links(url, _matcher, _refresh):
+        crawled[url] += 1
+        await asyncio.sleep(0.01)
+        return SITE[url]
+
+    crawl_controller = mocker.MagicMock()
+    crawl_controller.resolve_domain_links = resolve_domain_links
+    return crawl_controller
+
+
+class TestDistributedCrawlController:
+    """Test Distributed Crawl Controller"""
+
+    @pytest.mark.asyncio
+    async def test_crawl_shared(self, mocker: MockerFixture):
+        """
+        Tests the workers of two pods share a crawl, crawling every page once
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        mocker.patch(
+            "controllers.distributed_crawl_controller.DISTRIBUTED_POLL_INTERVAL", 0.01
+        )
+        mocker.patch("controllers.distributed_crawl_controller.DISTRIBUTED_WORKERS", 1)
+        mocker.patch.object(DistributedCrawlController, "_local_workers", {})
+        coordinator_pages, other_pages = Counter(), Counter()
+        coordinator = DistributedCrawlController(
+            mock_crawl_controller(mocker, coordinator_pages)
+        )
+        other = DistributedCrawlController(mock_crawl_controller(mocker, other_pages))
+        crawl = asyncio.create_task(coordinator.crawl("https://dist.org/"))
+        while not (crawl_ids := await RedisFrontier.active_crawl_ids(RedisHelper())):
+            await asyncio.sleep(0.001)
+        # the other pod, joined to the crawl as serve would
+        other_worker = asyncio.create_task(other.crawl_worker(crawl_ids.pop()))
+        sitemap, errors, truncated = await crawl
+        await other_worker
+        assert sitemap == SITE
+        assert not errors and truncated is None
+        assert coordinator_pages and other_pages
+        assert coordinator_pages + other_pages == Counter(list(SITE))
+
+    @pytest.mark.asyncio
+    async def test_coordinator_gone(self, mocker: MockerFixture):
+        """
+        Tests the workers of a crawl whose coordinator died stop and the crawl is not
+        joined again
+        :param mocker:
+        :return:
+        """
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        mocker.patch("helper.redis_frontier.FRONTIER_HEARTBEAT_TIMEOUT", 0.1)
+        crawled = Counter()
+        controller = DistributedCrawlController(mock_crawl_controller(mocker, crawled))
+        frontier = RedisFrontier("test-orphan")
+        await frontier.start(
+            "https://dist.org/", {"url": "https://dist.org/", "refresh": "0"}
+        )
+        # the coordinator died right after starting the crawl
+        await asyncio.sleep(0.2)
+        assert "test-orphan" not in await RedisFrontier.active_crawl_ids(redis_helper)
+        await asyncio.wait_for(controller.crawl_worker("test-orphan"), 1)
+        assert not crawled
+        await frontier.clear()
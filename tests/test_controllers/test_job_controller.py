@@ -0,0 +1,122 @@
+"""Tests crawl jobs"""
+
+import asyncio
+
+import pytest
+from pytest_mock import MockerFixture
+
+from controllers.job_controller import JobController
+from helper.redis_helper import RedisHelper
+from schemas.crawl_request import CrawlRequest
+
+
+class TestJobController:
+    """Test Job Controller"""
+
+    @pytest.mark.asyncio
+    async def test_job(self, mocker: MockerFixture):
+        """
+        Tests a job stores its status and results in redis
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+
+        async def mock_crawl(_url, on_result=None, **_kwargs):
+            """
+            mock the crawl reporting a page and an error
+            :param _url:
+            :param on_result:
+            :param _kwargs: crawl options
+            :return:
+            """
+            await on_result(
+                {"page": "https://foo.com/", "links": ["https://foo.com/a"]}
+            )
+            await on_result({"page": "https://foo.com/a", "error": "Failed"})
+            return {}, {}, None
+
+        crawl_controller = mocker.MagicMock()
+        crawl_controller.crawl = mock_crawl
+        job_controller = JobController(crawl_controller)
+        job_id = await job_controller.create_job(CrawlRequest(url="https://foo.com/"))
+        await asyncio.gather(*JobController._running_jobs)
+
+        job = await job_controller.get_job(job_id)
+        assert job["status"] == "completed"
+        assert (job["pages"], job["errors"]) == ("1", "1")
+        results = await job_controller.get_results(job_id, "pages", 0, 10)
+        assert results["total"] == 1
+        assert results["pages"] == [
+            {"page": "https://foo.com/", "links": ["https://foo.com/a"]}
+        ]
+        assert await job_controller.get_job("unknown") is None
+
+    @pytest.mark.asyncio
+    async def test_resume(self, mocker: MockerFixture):
+        """
+        Tests an interrupted job resumes from its checkpoint
+        :param mocker:
+        :return:
+        """
+        await RedisHelper().connect()
+        mocker.patch("controllers.job_controller.JOB_FLUSH_SIZE", 1)
+        root, page_a, page_b = (
+            "https://foo.com/",
+            "https://foo.com/a",
+            "https://foo.com/b",
+        )
+        resumed_from = []
+        interrupted = asyncio.Event()
+
+        async def interrupted_crawl(_url, on_result=None, checkpoint=None, **_kwargs):
+            """
+            mock a crawl interrupted after discovering two pages and crawling one
+            :param _url:
+            :param on_result:
+            :param checkpoint:
+            :param _kwargs: crawl options
+            :return:
+            """
+            checkpoint.discover(root, 0)
+            await on_result({"page": root, "links": [page_a, page_b]})
+            checkpoint.discover(page_a, 1)
+            checkpoint.discover(page_b, 1)
+            await on_result({"page": page_a, "links": []})
+            checkpoint.total_bytes = 10
+            interrupted.set()
+            await asyncio.Event().wait()
+
+        async def resumed_crawl(_url, on_result=None, checkpoint=None, **_kwargs):
+            """
+            mock the crawl of the pending page
+            :param _url:
+            :param on_result:
+            :param checkpoint:
+            :param _kwargs: crawl options
+            :return:
+            """
+            resumed_from.append(
+                (checkpoint.visited, checkpoint.pending, checkpoint.total_bytes)
+            )
+            await on_result({"page": page_b, "links": []})
+            return {}, {}, None
+
+        crawl_controller = mocker.MagicMock()
+        crawl_controller.crawl = interrupted_crawl
+        job_controller = JobController(crawl_controller)
+        job_id = await job_controller.create_job(CrawlRequest(url=root))
+        await interrupted.wait()
+        assert await job_controller.resume_job(job_id) == "running"
+        await JobController.interrupt_jobs()
+        job = await job_controller.get_job(job_id)
+        assert (job["status"], job["pages"], job["bytes"]) == ("interrupted", "2", "10")
+
+        crawl_controller.crawl = resumed_crawl
+        assert await job_controller.resume_job(job_id) == "queued"
+        await asyncio.gather(*JobController._running_jobs)
+        assert resumed_from == [([root, page_a, page_b], [(page_b, 1)], 10)]
+        job = await job_controller.get_job(job_id)
+        assert (job["status"], job["pages"]) == ("completed", "3")
+        assert await job_controller.resume_job(job_id) == "completed"
+        assert await job_controller.resume_job("unknown") is None
@@ -0,0 +1,27 @@
+"""Tests content filter"""
+
+from helper.content_filter import is_allowed_content_type, is_allowed_extension
+
+
+class TestContentFilter:
+    """Test Content Filter"""
+
+    def test_is_allowed_extension(self):
+        """
+        Tests links to binaries are filtered by extension
+        :return:
+        """
+        assert is_allowed_extension("https://foo.com/about")
+        assert is_allowed_extension("https://foo.com/index.html")
+        assert not is_allowed_extension("https://foo.com/report.PDF")
+        assert not is_allowed_extension("https://foo.com/static/app.js")
+
+    def test_is_allowed_content_type(self):
+        """
+        Tests only HTML responses are parsed
+        :return:
+        """
+        assert is_allowed_content_type("text/html; charset=utf-8")
+        assert is_allowed_content_type(None)
+        assert not is_allowed_content_type("application/pdf")
+        assert not is_allowed_content_type("image/png")
@@ -0,0 +1,63 @@
+"""Tests crawl state"""
+
+import pytest
+
+from helper.bloom_filter import BloomFilter
+from helper.crawl_state import CrawlBudget, CrawlCheckpoint, CrawlState
+
+
+class TestCrawlState:
+    """Test Crawl State"""
+
+    @pytest.mark.asyncio
+    async def test_sitemap(self):
+        """
+        Tests interned pages are expanded back into urls and visited only once
+        :return:
+        """
+        state = CrawlState("https://foo.com/")
+        assert state.visit("https://foo.com/")
+        await state.add_page("https://foo.com/", ["https://foo.com/a"])
+        await state.add_error("https://foo.com/a", "Failed with status code 404")
+        assert state.visit("https://foo.com/a")
+        assert not state.visit("https://foo.com/a")
+        assert state.sitemap == {"https://foo.com/": ["https://foo.com/a"]}
+        assert state.errors == {"https://foo.com/a": "Failed with status code 404"}
+
+    def test_checkpoint(self):
+        """
+        Tests a resumed crawl skips visited pages, queues pending ones first and keeps
+        counting against the budget
+        :return:
+        """
+        checkpoint = CrawlCheckpoint(
+            ["https://foo.com/", "https://foo.com/a"], [("https://foo.com/a", 1)], 100
+        )
+        state = CrawlState(
+            "https://foo.com/",
+            keep_results=False,
+            budget=CrawlBudget(max_pages=3),
+            checkpoint=checkpoint,
+        )
+        assert state.frontier.get_nowait() == ("https://foo.com/a", 1)
+        assert not state.visit("https://foo.com/a")
+        assert state.visit("https://foo.com/b") and state.admit(1)
+        state.discover("https://foo.com/b", 1)
+        assert not state.admit(1)
+        state.add_bytes(5)
+        assert checkpoint.drain() == [("https://foo.com/b", 1)]
+        assert (checkpoint.admitted, checkpoint.total_bytes) == (3, 105)
+        assert checkpoint.drain() == []
+
+    def test_bloom_filter(self):
+        """
+        Tests added values are always members
+        :return:
+        """
+        bloom = BloomFilter(1000, 0.01)
+        urls = [f"https://foo.com/{i}" for i in range(1000)]
+        assert all([bloom.add(url) for url in urls[:10]])
+        for url in urls:
+            bloom.add(url)
+        assert all(url in bloom for url in urls)
+        assert not bloom.add(urls[0])
@@ -0,0 +1,76 @@
+"""Tests host scheduler"""
+
+from collections import OrderedDict
+
+import pytest
+
+from config.constants import HOST_RATE_LIMIT
+from helper.host_scheduler import HostLimiter, HostScheduler, parse_retry_after
+
+
+class TestHostScheduler:
+    """Test Host Scheduler"""
+
+    def test_parse_retry_after(self):
+        """
+        Tests Retry-After given in seconds or as a date
+        :return:
+        """
+        assert parse_retry_after("120") == 120
+        assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+        assert parse_retry_after("soon") is None
+        assert parse_retry_after(None) is None
+
+    def test_observe(self):
+        """
+        Tests concurrency grows on fast responses and is halved on throttled ones
+        :return:
+        """
+        limiter = HostLimiter()
+        initial = limiter.limit
+        for _ in range(10):
+            assert limiter.observe(200, 0.1, None) == 0
+        assert limiter.limit > initial
+        grown = limiter.limit
+        assert limiter.observe(429, 0.1, "5") == 5
+        assert limiter.limit == grown / 2
+
+    @pytest.mark.asyncio
+    async def test_crawl_delay(self, mocker):
+        """
+        Tests the crawl delay of robots.txt is lifted once it expires or is removed
+        :return:
+        """
+        clock = mocker.patch("helper.host_scheduler.time.monotonic", return_value=0)
+        limiter = HostLimiter()
+        limiter.set_crawl_delay(2, ttl=10)
+        assert limiter.rate == 0.5
+        await limiter.acquire()
+        await limiter.release()
+        assert limiter.rate == 0.5
+        clock.return_value = 10
+        await limiter.acquire()
+        await limiter.release()
+        assert limiter.rate == HOST_RATE_LIMIT
+        limiter.set_crawl_delay(2)
+        limiter.set_crawl_delay(None)
+        assert limiter.rate == HOST_RATE_LIMIT and limiter.crawl_delay_until is None
+
+    @pytest.mark.asyncio
+    async def test_evict(self, mocker):
+        """
+        Tests the least recently used idle hosts are forgotten past the cache size
+        :return:
+        """
+        mocker.patch("helper.host_scheduler.HOST_CACHE_SIZE", 2)
+        mocker.patch.object(HostScheduler, "_hosts", OrderedDict())
+        scheduler = HostScheduler()
+        busy = scheduler.limiter("https://busy.com/")
+        await busy.acquire()
+        idle = scheduler.limiter("https://idle.com/")
+        scheduler.limiter("https://new.com/")
+        hosts = HostScheduler._hosts  # pylint: disable=protected-access
+        assert list(hosts) == ["busy.com", "new.com"]
+        assert scheduler.limiter("https://busy.com/a") is busy
+        assert scheduler.limiter("https://idle.com/") is not idle
+        await busy.release()
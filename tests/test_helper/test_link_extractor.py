@@ -0,0 +1,41 @@
+"""Tests link extractor"""
+
+from helper.link_extractor import extract_links
+
+
+class TestLinkExtractor:
+    """Test Link Extractor"""
+
+    def test_extract_links(self):
+        """
+        Tests links are resolved and links in scripts or comments are skipped
+        :return:
+        """
+        html = """
+        <html><head><base href="https://foo.com/docs/"></head>
+        <body>
+        <!-- <a href="/commented"></a> -->
+        <script>document.write('<a href="/scripted"></a>')</script>
+        <a href="intro?page=2#top">Intro</a>
+        <a HREF='../logo.png'>Logo</a>
+        </body></html>
+        """
+        assert extract_links(html, "https://foo.com/") == [
+            # canonical form of the base link
+            "https://foo.com/docs",
+            "https://foo.com/docs/intro",
+        ]
+
+    def test_extract_links_canonical(self):
+        """
+        Tests variants of a page are extracted in their canonical form
+        :return:
+        """
+        html = """
+        <a href="HTTPS://FOO.com:443/a/./b/../index.html"></a>
+        <a href="/%7Euser/"></a>
+        """
+        assert extract_links(html, "https://foo.com/") == [
+            "https://foo.com/a",
+            "https://foo.com/~user",
+        ]
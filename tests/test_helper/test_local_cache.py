@@ -0,0 +1,54 @@
+"""Tests local cache"""
+
+from helper.local_cache import LocalCache
+
+
+class TestLocalCache:
+    """Test Local Cache"""
+
+    def test_eviction(self, mocker):
+        """
+        Tests least recently used and expired values are dropped
+        :return:
+        """
+        clock = mocker.patch("helper.local_cache.time.monotonic", return_value=0)
+        cache = LocalCache(max_size=2, ttl=10)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        assert cache.get("a") == 1
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        cache.set("d", 4, ttl=1)
+        clock.return_value = 5
+        assert cache.get("d") is None
+        assert cache.get("c") == 3
+        cache.invalidate(["c", "missing"])
+        assert cache.get("c") is None
+        assert cache.stats() | {"size": 0} == {
+            "size": 0,
+            "max_size": 2,
+            "hits": 2,
+            "misses": 3,
+            "hit_rate": 0.4,
+            "evictions": 2,
+            "invalidations": 1,
+        }
+
+    def test_invalidated_read(self):
+        """
+        Tests a value read before its key was invalidated is not stored
+        :return:
+        """
+        cache = LocalCache(max_size=1, ttl=10)
+        generation = cache.generation
+        cache.invalidate(["a"])
+        cache.set("a", "stale", generation=generation)
+        assert cache.get("a") is None
+        cache.set("b", "fresh", generation=cache.generation)
+        assert cache.get("b") == "fresh"
+        # keys no longer tracked count as invalidated
+        generation = cache.generation
+        cache.invalidate(["b"])
+        cache.invalidate(["c"])
+        cache.set("b", "stale", generation=generation)
+        assert cache.get("b") is None
@@ -0,0 +1,27 @@
+"""Tests metrics"""
+
+import pytest
+
+from helper.metrics import observe_redis, render_metrics
+
+
+class TestMetrics:
+    """Test Metrics"""
+
+    @pytest.mark.asyncio
+    async def test_observe_redis(self):
+        """
+        Tests redis operations are timed under their name and exposed
+        :return:
+        """
+
+        @observe_redis
+        async def test_operation(value):
+            return value
+
+        assert await test_operation(1) == 1
+        content, media_type = render_metrics()
+        assert media_type.startswith("text/plain")
+        assert b'webcrawler_redis_duration_seconds_count{op="test_operation"} 1.0' in (
+            content
+        )
@@ -0,0 +1,109 @@
+"""Tests page store"""
+
+import os
+
+import pytest
+
+from helper.page_store import PageStore
+
+
+@pytest.fixture
+def store_path(tmp_path, mocker):
+    """
+    A store directory, with a tiny index so that it grows
+    :return:
+    """
+    mocker.patch("helper.page_store.PAGE_STORE_INDEX_CAPACITY", 4)
+    mocker.patch.object(PageStore, "_instance", None)
+    return str(tmp_path / "store")
+
+
+def reopen(path: str) -> PageStore:
+    """
+    A store opened again, as by a restarted process
+    :return:
+    """
+    PageStore._instance = None  # pylint: disable=protected-access
+    return PageStore(path).__enter__()
+
+
+class TestPageStore:
+    """Test Page Store"""
+
+    def test_put_get(self, store_path):
+        """
+        Tests values outlive the process, the latest of a key wins and the index grows
+        :return:
+        """
+        with PageStore(store_path) as store:
+            assert store.get("page:a") is None
+            for index in range(20):
+                store.put(f"page:{index}", str(index).encode(), stored_at=index)
+            store.put("page:3", b"again", stored_at=100)
+        assert not store.is_open and store.get("page:3") is None
+        store = reopen(store_path)
+        assert store.get("page:3") == (b"again", 100)
+        assert store.get("page:19") == (b"19", 19)
+        assert [key for key, _, _ in store.items("page:1")][:2] == [
+            "page:1",
+            "page:10",
+        ]
+        assert len(list(store.items())) == 20
+        store.close()
+
+    def test_torn_write(self, store_path):
+        """
+        Tests a record cut short by a crash is dropped and records past the index are
+        indexed again
+        :return:
+        """
+        with PageStore(store_path) as store:
+            store.put("page:a", b"a")
+            # the index of a process dying before updating it
+            store._set_header(0, os.path.getsize(store.segment_path))
+            store.put("page:b", b"b")
+            store.put("page:c", b"c" * 100)
+        with open(store.segment_path, "r+b") as segment:
+            segment.truncate(os.path.getsize(store.segment_path) - 10)
+        store = reopen(store_path)
+        assert store.get("page:b") == (b"b", pytest.approx(store.get("page:a")[1]))
+        assert store.get("page:c") is None
+        store.put("page:d", b"d")
+        assert store.get("page:d")[0] == b"d"
+        store.close()
+
+    def test_compact(self, store_path):
+        """
+        Tests compaction keeps the latest value of every key only
+        :return:
+        """
+        with PageStore(store_path) as store:
+            for value in range(10):
+                store.put("page:a", str(value).encode())
+            store.put("page:b", b"b")
+            size = os.path.getsize(store.segment_path)
+            store.compact()
+            assert os.path.getsize(store.segment_path) < size
+            assert store.get("page:a")[0] == b"9"
+            store.put("page:c", b"c")
+        store = reopen(store_path)
+        assert [value for _, value, _ in store.items()] == [b"9", b"b", b"c"]
+        store.close()
+
+    def test_auto_compact(self, store_path, mocker):
+        """
+        Tests the segment is compacted once most of its records are superseded
+        :return:
+        """
+        mocker.patch("helper.page_store.PAGE_STORE_COMPACT_MIN_RECORDS", 10)
+        with PageStore(store_path) as store:
+            for value in range(5):
+                store.put(f"page:{value}", b"x" * 100)
+            for value in range(4):
+                store.put("page:0", str(value).encode())
+            size = os.path.getsize(store.segment_path)
+            # the tenth record makes half of them superseded
+            store.put("page:0", b"latest")
+            assert os.path.getsize(store.segment_path) < size
+            assert store.get("page:0")[0] == b"latest"
+            assert len(list(store.items())) == 5
@@ -0,0 +1,72 @@
+"""Tests redis frontier"""
+
+import asyncio
+
+import pytest
+
+from helper.redis_frontier import RedisFrontier
+from helper.redis_helper import RedisHelper
+
+
+class TestRedisFrontier:
+    """Test Redis Frontier"""
+
+    @pytest.mark.asyncio
+    async def test_claim_complete(self, mocker):
+        """
+        Tests urls are enqueued once, leased to a worker and requeued once their lease
+        expires
+        :return:
+        """
+        await RedisHelper().connect()
+        frontier = RedisFrontier("test-claim")
+        await frontier.start("https://foo.com/", {"url": "https://foo.com/"})
+        assert await frontier.add(["https://foo.com/", "https://foo.com/a"]) == 1
+        assert await frontier.claim() == "https://foo.com/"
+        assert await frontier.pending() == 2
+        assert await frontier.complete("https://foo.com/", ["https://foo.com/a"])
+        # a worker stuck past its lease loses the url to another worker
+        mocker.patch("helper.redis_frontier.FRONTIER_LEASE_TIMEOUT", 0)
+        assert await frontier.claim() == "https://foo.com/a"
+        assert await frontier.claim() == "https://foo.com/a"
+        assert await frontier.complete("https://foo.com/a", error="Failed")
+        assert not await frontier.complete("https://foo.com/a")
+        assert await frontier.claim() is None
+        assert await frontier.pending() == 0
+        assert await frontier.results() == (
+            {"https://foo.com/": ["https://foo.com/a"]},
+            {"https://foo.com/a": "Failed"},
+        )
+        await frontier.stop()
+        assert not await frontier.is_active()
+        await frontier.clear()
+        # workers still crawling the stopped crawl do not create its keys again
+        assert await frontier.add(["https://foo.com/b"]) == 0
+        assert not await frontier.complete("https://foo.com/b", ["https://foo.com/"])
+        assert await frontier.results() == ({}, {})
+
+    @pytest.mark.asyncio
+    async def test_heartbeat(self, mocker):
+        """
+        Tests a crawl whose coordinator stopped heartbeating is dropped
+        :return:
+        """
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        mocker.patch("helper.redis_frontier.FRONTIER_HEARTBEAT_TIMEOUT", 0.2)
+        alive, dead = RedisFrontier("test-alive"), RedisFrontier("test-dead")
+        await alive.start("https://foo.com/", {"url": "https://foo.com/"})
+        await dead.start("https://bar.com/", {"url": "https://bar.com/"})
+        assert {"test-alive", "test-dead"} <= await RedisFrontier.active_crawl_ids(
+            redis_helper
+        )
+        await asyncio.sleep(0.15)
+        await alive.heartbeat()
+        await asyncio.sleep(0.1)
+        assert await alive.is_active()
+        assert not await dead.is_active()
+        active = await RedisFrontier.active_crawl_ids(redis_helper)
+        assert "test-alive" in active and "test-dead" not in active
+        for frontier in (alive, dead):
+            await frontier.stop()
+            await frontier.clear()
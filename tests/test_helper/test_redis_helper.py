@@ -0,0 +1,106 @@
+"""Tests redis helper"""
+
+import pytest
+
+from helper.page_store import PageStore
+from helper.redis_helper import RedisHelper
+
+
+class TestRedisHelper:
+    """Test Redis Helper"""
+
+    @pytest.mark.asyncio
+    async def test_batched_lists(self):
+        """
+        Tests lists are written and read back in a single round-trip
+        :return:
+        """
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        await redis_helper.push_lists_to_keys(
+            {"test:batch:1": ["a", "b"], "test:batch:2": ["c"], "test:batch:3": []},
+            ttl=10,
+        )
+        lists = await redis_helper.get_lists_from_keys(
+            ["test:batch:1", "test:batch:missing", "test:batch:2", "test:batch:3"]
+        )
+        assert lists == [["a", "b"], [], ["c"], []]
+        assert 0 < await redis_helper.conn.ttl("test:batch:1") <= 10
+        for key in ("test:batch:1", "test:batch:2"):
+            await redis_helper.remove_key(key)
+
+    @pytest.mark.asyncio
+    async def test_links(self):
+        """
+        Tests links are stored encoded and lists of older versions are still read
+        :return:
+        """
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        page = "https://foo.com/docs"
+        links = ["https://foo.com/", "https://foo.com/a?b=1", "https://bar.foo.com/c"]
+        await redis_helper.set_links("test:links:1", page, links, ttl=10)
+        await redis_helper.set_links("test:links:2", page, [], ttl=10)
+        await redis_helper.push_list_to_key("test:links:3", links, ttl=10)
+        cached = await redis_helper.get_links_from_keys(
+            ["test:links:1", "test:links:2", "test:links:3", "test:links:missing"],
+            [page] * 4,
+        )
+        assert cached == [links, [], links, None]
+        encoded = await redis_helper.raw_conn.get("test:links:1")
+        assert encoded[:1] == redis_helper.codec.tag
+        # a list is replaced by the encoded value
+        await redis_helper.set_links("test:links:3", page, links[:1], ttl=10)
+        assert await redis_helper.get_links("test:links:3", page) == links[:1]
+        for key in ("test:links:1", "test:links:2", "test:links:3"):
+            await redis_helper.remove_key(key)
+
+    @pytest.mark.asyncio
+    async def test_local_links(self):
+        """
+        Tests links read once are served from memory until they are replaced
+        :return:
+        """
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        page = "https://foo.com/local"
+        await redis_helper.set_links("test:local", page, ["https://foo.com/a"], ttl=10)
+        redis_helper.local_cache.clear()
+        assert await redis_helper.get_links("test:local", page) == ["https://foo.com/a"]
+        stats = redis_helper.cache_stats()
+        # written behind the back of the cache, it is not read again
+        await redis_helper.raw_conn.delete("test:local")
+        assert await redis_helper.get_links("test:local", page) == ["https://foo.com/a"]
+        assert redis_helper.cache_stats()["local"]["hits"] == stats["local"]["hits"] + 1
+        await redis_helper.remove_key("test:local")
+        assert await redis_helper.get_links("test:local", page) is None
+
+    @pytest.mark.asyncio
+    async def test_stored_links(self, tmp_path, mocker):
+        """
+        Tests links expired from redis are served from the page store until CACHE_EXPIRY
+        :return:
+        """
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        mocker.patch.object(PageStore, "_instance", None)
+        mocker.patch.object(redis_helper, "page_store", PageStore(str(tmp_path)))
+        page = "https://foo.com/stored"
+        with redis_helper.page_store:
+            await redis_helper.set_links("sitemap:" + page, page, ["https://foo.com/a"])
+            await redis_helper.remove_key("sitemap:" + page)
+            assert await redis_helper.get_links("sitemap:" + page, page) == [
+                "https://foo.com/a"
+            ]
+            assert await redis_helper.raw_conn.exists("sitemap:" + page)
+            assert [record async for record in redis_helper.export_links(page)] == [
+                {
+                    "url": page,
+                    "links": ["https://foo.com/a"],
+                    "fetched_at": mocker.ANY,
+                }
+            ]
+            await redis_helper.remove_key("sitemap:" + page)
+            mocker.patch("helper.redis_helper.time.time", return_value=2e10)
+            assert await redis_helper.get_links("sitemap:" + page, page) is None
+            assert redis_helper.cache_stats()["store"]["misses"] >= 1
@@ -0,0 +1,42 @@
+"""Tests response encoder"""
+
+import json
+
+from helper.response_encoder import FastJSONResponse, compact_sitemap
+
+
+class TestResponseEncoder:
+    """Test Response Encoder"""
+
+    def test_compact_sitemap(self):
+        """
+        Tests every url is named once and links point at their index
+        :return:
+        """
+        sitemap = {
+            "https://foo.com/": ["https://foo.com/a", "https://foo.com/b"],
+            "https://foo.com/a": ["https://foo.com/", "https://foo.com/b"],
+        }
+        compact = compact_sitemap(sitemap)
+        assert compact == {
+            "urls": ["https://foo.com/", "https://foo.com/a", "https://foo.com/b"],
+            "links": [[1, 2], [0, 2]],
+        }
+        urls = compact["urls"]
+        assert {
+            urls[page]: [urls[link] for link in links]
+            for page, links in enumerate(compact["links"])
+        } == sitemap
+        assert compact_sitemap({}) == {"urls": [], "links": []}
+
+    def test_fast_json_response(self):
+        """
+        Tests content is rendered as compact JSON
+        :return:
+        """
+        content = {"https://foo.com/é": ["https://foo.com/"], "truncated": None}
+        response = FastJSONResponse(status_code=207, content=content)
+        assert response.status_code == 207
+        assert response.media_type == "application/json"
+        assert json.loads(response.body) == content
+        assert b" " not in response.body
@@ -0,0 +1,124 @@
+"""Tests retry policy"""
+
+import asyncio
+from collections import OrderedDict
+
+import aiohttp
+import pytest
+
+from config.constants import CIRCUIT_FAILURE_THRESHOLD, FETCH_RETRIES
+from helper.http_helper import HttpStatusError
+from helper.retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class TestRetryPolicy:
+    """Test Retry Policy"""
+
+    @pytest.mark.asyncio
+    async def test_retries(self, mocker):
+        """
+        Tests transient failures are retried and others are not
+        :return:
+        """
+        mocker.patch("helper.retry_policy.asyncio.sleep")
+        policy = RetryPolicy()
+        fetch = mocker.AsyncMock(
+            side_effect=[aiohttp.ServerDisconnectedError(), HttpStatusError(502), "ok"]
+        )
+        assert await policy.run("https://retry.com/a", fetch) == "ok"
+        assert fetch.await_count == FETCH_RETRIES + 1
+        fetch = mocker.AsyncMock(side_effect=HttpStatusError(404))
+        with pytest.raises(HttpStatusError):
+            await policy.run("https://retry.com/b", fetch)
+        assert fetch.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker(self, mocker):
+        """
+        Tests a host failing repeatedly fails fast until a trial request succeeds
+        :return:
+        """
+        mocker.patch("helper.retry_policy.asyncio.sleep")
+        clock = mocker.patch("helper.retry_policy.time.monotonic", return_value=0)
+        policy = RetryPolicy()
+        fetch = mocker.AsyncMock(side_effect=TimeoutError())
+        breaker, _ = policy.host_state("https://down.com/")
+        while breaker.state == "closed":
+            with pytest.raises(TimeoutError):
+                await policy.run("https://down.com/a", fetch)
+        assert fetch.await_count == CIRCUIT_FAILURE_THRESHOLD
+        with pytest.raises(CircuitOpenError):
+            await policy.run("https://down.com/b", fetch)
+        assert fetch.await_count == CIRCUIT_FAILURE_THRESHOLD
+        clock.return_value = breaker.reset_timeout
+        assert breaker.allow()
+        # a single trial request while half-open
+        assert not breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_trial_failure(self):
+        """
+        Tests a failed trial request opens the circuit again
+        :return:
+        """
+        breaker = CircuitBreaker(threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        assert breaker.state == "half_open"
+        assert breaker.allow()
+        breaker.reset_timeout = 60
+        breaker.record_failure()
+        assert breaker.state == "open"
+
+    @pytest.mark.asyncio
+    async def test_cancel_during_trial(self, mocker):
+        """
+        Tests cancelling a request sent before the circuit opened keeps the trial
+        request the only one let through
+        :return:
+        """
+        clock = mocker.patch("helper.retry_policy.time.monotonic", return_value=0)
+        policy = RetryPolicy()
+        breaker, _ = policy.host_state("https://trial.com/")
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_fetch():
+            started.set()
+            await release.wait()
+            return "ok"
+
+        earlier = asyncio.create_task(policy.run("https://trial.com/a", slow_fetch))
+        await started.wait()
+        for _ in range(breaker.threshold):
+            breaker.record_failure()
+        clock.return_value = breaker.reset_timeout
+        started.clear()
+        trial = asyncio.create_task(policy.run("https://trial.com/b", slow_fetch))
+        await started.wait()
+        earlier.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await earlier
+        assert breaker.trial_running
+        with pytest.raises(CircuitOpenError):
+            await policy.run("https://trial.com/c", slow_fetch)
+        release.set()
+        assert await trial == "ok"
+        assert breaker.state == "closed"
+
+    def test_evict(self, mocker):
+        """
+        Tests the least recently used healthy hosts are forgotten past the cache size
+        :return:
+        """
+        mocker.patch("helper.retry_policy.HOST_CACHE_SIZE", 2)
+        mocker.patch.object(RetryPolicy, "_hosts", OrderedDict())
+        policy = RetryPolicy()
+        failing, _ = policy.host_state("https://failing.com/")
+        failing.record_failure()
+        healthy, _ = policy.host_state("https://healthy.com/")
+        policy.host_state("https://new.com/")
+        hosts = RetryPolicy._hosts  # pylint: disable=protected-access
+        assert list(hosts) == ["failing.com", "new.com"]
+        assert policy.host_state("https://failing.com/a")[0] is failing
+        assert policy.host_state("https://healthy.com/")[0] is not healthy
@@ -0,0 +1,43 @@
+"""Tests robots helper"""
+
+from helper.robots_helper import parse_robots
+
+ROBOTS_TXT = """
+# comments are ignored
+User-agent: *
+Disallow: /private
+Allow: /private/public$
+Crawl-delay: 2
+
+User-agent: other
+Disallow: /
+
+Sitemap: https://foo.com/sitemap_index.xml
+"""
+
+
+class TestRobotsHelper:
+    """Test Robots Helper"""
+
+    def test_parse_robots(self):
+        """
+        Tests the longest matching rule decides whether a url is allowed
+        :return:
+        """
+        rules = parse_robots(ROBOTS_TXT)
+        assert rules.sitemaps == ["https://foo.com/sitemap_index.xml"]
+        assert rules.crawl_delay == 2
+        assert rules.allowed("https://foo.com/")
+        assert not rules.allowed("https://foo.com/private/page")
+        assert rules.allowed("https://foo.com/private/public")
+        assert not rules.allowed("https://foo.com/private/public/page")
+        assert rules.allowed("https://foo.com/robots.txt")
+
+    def test_parse_robots_user_agent(self):
+        """
+        Tests the group of the user agent replaces the "*" group
+        :return:
+        """
+        rules = parse_robots(ROBOTS_TXT, user_agent="Other")
+        assert not rules.allowed("https://foo.com/")
+        assert rules.crawl_delay is None
@@ -0,0 +1,35 @@
+"""Tests shared frontier"""
+
+import pytest
+
+from helper.crawl_state import CrawlState
+from helper.shared_frontier import SharedFrontier
+
+
+class TestSharedFrontier:
+    """Test Shared Frontier"""
+
+    @pytest.mark.asyncio
+    async def test_round_robin(self):
+        """
+        Tests pages are handed out in turn over domains, each capped in pages out
+        :return:
+        """
+        frontier = SharedFrontier(domain_concurrency=1)
+        foo = CrawlState("https://foo.com/", frontier=frontier)
+        bar = CrawlState("https://bar.com/", frontier=frontier)
+        for page in ("a", "b"):
+            foo.frontier.put_nowait((f"https://foo.com/{page}", 1))
+        bar.frontier.put_nowait(("https://bar.com/a", 1))
+        assert (await frontier.get())[1] == "https://foo.com/a"
+        assert (await frontier.get())[1] == "https://bar.com/a"
+        # foo.com is at its concurrency until its page is done
+        assert not frontier._ready  # pylint: disable=protected-access
+        frontier.task_done(foo)
+        state, url, _ = await frontier.get()
+        assert (state, url) == (foo, "https://foo.com/b")
+        frontier.task_done(foo)
+        await foo.frontier.join()
+        assert bar.frontier.qsize() == 1
+        frontier.task_done(bar)
+        await bar.frontier.join()
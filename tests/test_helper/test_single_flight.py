@@ -0,0 +1,67 @@
+"""Tests single flight"""
+
+import asyncio
+
+import pytest
+
+from helper.redis_helper import RedisHelper
+from helper.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test Single Flight"""
+
+    @pytest.mark.asyncio
+    async def test_run(self):
+        """
+        Tests concurrent callers of a key share a single execution
+        :return:
+        """
+        await RedisHelper().connect()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return ["https://foo.com/"]
+
+        single_flight = SingleFlight()
+        results = await asyncio.gather(
+            *[single_flight.run("test:single-flight", work) for _ in range(5)]
+        )
+        assert results == [["https://foo.com/"]] * 5
+        assert len(calls) == 1
+
+        # once finished the work runs again
+        await single_flight.run("test:single-flight", work)
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_run_across_pods(self, mocker):
+        """
+        Tests a pod waiting for the lock gets the result of the holder, which is only
+        published when a pod waits
+        :return:
+        """
+        mocker.patch("helper.single_flight.INFLIGHT_POLL_INTERVAL", 0.01)
+        redis_helper = RedisHelper()
+        await redis_helper.connect()
+        key = "test:across-pods"
+        for prefix in ("inflight", "inflight-result", "inflight-waiters"):
+            await redis_helper.remove_key(f"{prefix}:{key}")
+        single_flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.1)
+            return ["https://foo.com/"]
+
+        waiter_work = mocker.AsyncMock()
+        assert await single_flight.run_across_pods(key, work) == ["https://foo.com/"]
+        assert not await redis_helper.exists(f"inflight-result:{key}")
+        holder = asyncio.create_task(single_flight.run_across_pods(key, work))
+        await asyncio.sleep(0.01)
+        # another pod, its in-flight task is its own
+        waiter = await single_flight.run_across_pods(key, waiter_work)
+        assert waiter == await holder == ["https://foo.com/"]
+        waiter_work.assert_not_awaited()
+        assert not await redis_helper.exists(f"inflight:{key}")
@@ -0,0 +1,45 @@
+"""Tests url normalizer"""
+
+from helper.url_normalizer import DomainMatcher, canonicalize
+
+
+class TestUrlNormalizer:
+    """Test Url Normalizer"""
+
+    def test_canonicalize(self):
+        """
+        Tests variants of a url share a canonical form
+        :return:
+        """
+        assert canonicalize("HTTP://Foo.COM:80/a/./b/../c/index.html#x") == (
+            "http://foo.com/a/c"
+        )
+        assert canonicalize("https://foo.com:443") == "https://foo.com/"
+        assert canonicalize("https://foo.com/a%7eb/%e2%82%ac x") == (
+            "https://foo.com/a~b/%E2%82%AC%20x"
+        )
+        assert canonicalize("mailto:someone@foo.com") == "mailto:someone@foo.com"
+
+    def test_domain_matcher(self):
+        """
+        Tests urls are matched against the domain of the root
+        :return:
+        """
+        matcher = DomainMatcher("https://foo.com/", mode="subdomain")
+        assert matcher.resolve("http://www.foo.com/a/") == "https://www.foo.com/a"
+        assert matcher.resolve("https://evilfoo.com/") is None
+        assert (
+            DomainMatcher("https://foo.com/", mode="exact").resolve(
+                "https://www.foo.com/"
+            )
+            is None
+        )
+        assert (
+            DomainMatcher("https://foo.com/", mode="suffix").resolve(
+                "https://evilfoo.com/"
+            )
+            == "https://evilfoo.com/"
+        )
+        assert matcher.filter(["https://foo.com/a", "http://FOO.com/a/"]) == [
+            "https://foo.com/a"
+        ]
@@ -0,0 +1,119 @@
+"""Tests compression middleware"""
+
+import gzip
+import zlib
+
+import pytest
+
+from middlewares.compression_middleware import (
+    CompressionMiddleware,
+    negotiate_encoding,
+)
+
+
+async def run_app(app, accept_encoding: str):
+    """
+    :param app: ASGI application wrapped with the middleware
+    :param accept_encoding: Accept-Encoding header of the request
+    :return: messages sent by the middleware
+    """
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    await CompressionMiddleware(app, encodings=("gzip",))(scope, receive, send)
+    return messages
+
+
+def response_app(content_type: bytes, *bodies: bytes):
+    """
+    :param content_type: Content-Type of the response
+    :param bodies: parts of the body, all but the last one sent with more_body
+    :return: ASGI application sending the response
+    """
+
+    async def app(_scope, _receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", content_type)],
+            }
+        )
+        for index, body in enumerate(bodies):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": body,
+                    "more_body": index < len(bodies) - 1,
+                }
+            )
+
+    return app
+
+
+class TestCompressionMiddleware:
+    """Test Compression Middleware"""
+
+    def test_negotiate_encoding(self):
+        """
+        Tests the encoding the client prefers is picked, ties going to the server
+        :return:
+        """
+        encodings = ("zstd", "br", "gzip")
+        assert negotiate_encoding("gzip, deflate, br, zstd", encodings) == "zstd"
+        assert negotiate_encoding("gzip;q=1.0, br;q=0.5", encodings) == "gzip"
+        assert negotiate_encoding("*;q=0.1, zstd;q=0", encodings) == "br"
+        assert negotiate_encoding("identity", encodings) is None
+        assert negotiate_encoding("", encodings) is None
+
+    @pytest.mark.asyncio
+    async def test_compress(self):
+        """
+        Tests large responses are compressed, small ones and other types are not
+        :return:
+        """
+        body = b'{"https://foo.com/":["https://foo.com/a"]}' * 100
+        start, message = await run_app(response_app(b"application/json", body), "gzip")
+        headers = dict(start["headers"])
+        assert headers[b"content-encoding"] == b"gzip"
+        assert headers[b"vary"] == b"Accept-Encoding"
+        assert int(headers[b"content-length"]) == len(message["body"])
+        assert gzip.decompress(message["body"]) == body
+
+        for app in (
+            response_app(b"application/json", b"{}"),
+            response_app(b"image/png", body),
+        ):
+            start, message = await run_app(app, "gzip")
+            assert b"content-encoding" not in dict(start["headers"])
+        start, message = await run_app(response_app(b"application/json", body), "br")
+        assert b"content-encoding" not in dict(start["headers"])
+        assert message["body"] == body
+
+    @pytest.mark.asyncio
+    async def test_compress_stream(self):
+        """
+        Tests every record of a stream can be decoded as soon as it is received
+        :return:
+        """
+        records = [b'{"page":"https://foo.com/%d"}\n' % i for i in range(3)]
+        start, *messages = await run_app(
+            response_app(b"application/x-ndjson", *records), "gzip"
+        )
+        assert dict(start["headers"])[b"content-encoding"] == b"gzip"
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        for record, message in zip(records, messages):
+            assert decompressor.decompress(message["body"]) == record
+        assert not messages[-1]["more_body"]
+        assert decompressor.eof